@@ -0,0 +1,121 @@
+import base64
+import json
+import os
+import time
+from decimal import Decimal
+
+import metrics
+
+# orjson is optional: several times faster than the json module when the
+# deployment package bundles it, equivalent JSON otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Request parsing and response building shared by every handler.
+#
+# parse_body() reads an API Gateway proxy body (plain or base64) or a direct
+# invocation's event in one pass, rejecting bodies over MAX_BODY_BYTES before
+# they are decoded. dumps() writes compact JSON and turns DynamoDB's Decimal
+# numbers into ints (or floats when they have a fraction), so handlers can
+# return items as read. Every response shares one read-only header map.
+# Time spent in both is reported to metrics.
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', str(1024 * 1024)))
+
+
+class FrozenDict(dict):
+    """A dict that cannot be changed once built, so it is safe to share"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('FrozenDict is read-only')
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+
+CORS_HEADERS = FrozenDict({
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS'
+})
+
+
+class BodyError(ValueError):
+    """A request body that cannot be used; status_code is the reply's status"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_json_dumps = json.JSONEncoder(default=_default, separators=(',', ':')).encode
+
+if orjson is not None:
+    def _dumps(value):
+        try:
+            return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson only encodes integers that fit in 64 bits; json takes
+            # any, and raises the same TypeError for a truly unencodable value
+            return _json_dumps(value)
+
+    loads = orjson.loads
+else:
+    _dumps = _json_dumps
+    loads = json.loads
+
+
+def dumps(value):
+    """Compact JSON for `value`, with Decimals as numbers"""
+    start = time.perf_counter()
+    text = _dumps(value)
+    metrics.record_serialize(time.perf_counter() - start)
+    return text
+
+
+def parse_body(event):
+    """The request fields of a Lambda event.
+
+    API Gateway proxy integrations wrap the request in a JSON string body;
+    direct invocations pass the fields on the event itself. Raises BodyError
+    for a body that is too large, is not JSON or is not a JSON object.
+    """
+    start = time.perf_counter()
+    fields = _fields(event)
+    metrics.record_parse(time.perf_counter() - start, fields)
+    return fields
+
+
+def _fields(event):
+    body = event.get('body')
+    if isinstance(body, dict):
+        return body
+    if not isinstance(body, str):
+        return event
+
+    # base64 grows a body by a third, so check the limit before decoding
+    encoded = event.get('isBase64Encoded')
+    if len(body) > (MAX_BODY_BYTES * 4 // 3 + 4 if encoded else MAX_BODY_BYTES):
+        raise BodyError('Request body too large', 413)
+    try:
+        fields = loads(base64.b64decode(body) if encoded else body)
+    except ValueError:
+        raise BodyError('Request body is not valid JSON') from None
+    if not isinstance(fields, dict):
+        raise BodyError('Request body must be a JSON object')
+    return fields
+
+
+def response(status_code, body, headers=CORS_HEADERS):
+    """An API Gateway proxy response with a JSON body"""
+    return {'statusCode': status_code, 'headers': headers, 'body': dumps(body)}
@@ -1,21 +1,32 @@
-import json
-import boto3
+import os
 import time
-from boto3.dynamodb.conditions import Key
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+import api_codec
+import aws_clients
+import metrics
+import passwords
+import player_shards
+import session_tokens
+import structured_logging as log
+
+# DynamoDB table, created on first use and shared by warm invocations
 table_name = 'ArcadeUsers'
-table = dynamodb.Table(table_name)
 
+# last_login is only rewritten once it is this many seconds old, so players
+# logging in again and again cost one read rather than a read and a write
+LAST_LOGIN_INTERVAL = int(os.environ.get('LAST_LOGIN_INTERVAL', str(15 * 60)))  # seconds
+
+ACTIONS = ('register', 'login')
+
+@metrics.instrument(actions=ACTIONS)
 def lambda_handler(event, context):
-    print("Received event:", json.dumps(event))
+    log.debug("Received event", event=event)
     
     # Parse the body
-    if 'body' in event and isinstance(event['body'], str):
-        body = json.loads(event['body'])
-    else:
-        body = event
+    try:
+        body = api_codec.parse_body(event)
+    except api_codec.BodyError as e:
+        return create_response(e.status_code, {'error': str(e)})
     
     action = body.get('action')
     username = body.get('username')
@@ -24,6 +35,8 @@ def lambda_handler(event, context):
     # Basic validation
     if not action or not username or not password:
         return create_response(400, {'error': 'Missing required fields'})
+    if not isinstance(username, str) or not isinstance(password, str):
+        return create_response(400, {'error': 'Username and password must be strings'})
     
     if action == 'register':
         return register_user(username, password)
@@ -33,24 +46,33 @@ def lambda_handler(event, context):
         return create_response(400, {'error': 'Invalid action'})
 
 def register_user(username, password):
+    # Usernames become player ids, which must not name the score tables'
+    # bookkeeping items
     try:
-        # Check if user already exists
-        response = table.get_item(Key={'username': username})
-        if 'Item' in response:
-            return create_response(409, {'error': 'Username already exists'})
-        
-        # Create new user
-        # In a production app, password should be hashed!
+        player_shards.validate_player_id(username)
+    except ValueError:
+        return create_response(400, {'error': 'Invalid username'})
+
+    try:
+        # Create new user, unless the username is already taken: one
+        # conditional write, so two registrations of a name cannot both win
+        table = aws_clients.table(table_name)
         timestamp = int(time.time())
-        table.put_item(
-            Item={
-                'username': username,
-                'password': password, # Storing plaintext for this simple demo
-                'created_at': timestamp,
-                'last_login': timestamp,
-                'campaign_progress': 0 # Level 0
-            }
-        )
+        try:
+            table.put_item(
+                Item={
+                    'username': username,
+                    'password': passwords.hash_password(password),
+                    'created_at': timestamp,
+                    'last_login': timestamp,
+                    'campaign_progress': 0 # Level 0
+                },
+                ConditionExpression='attribute_not_exists(username)'
+            )
+        except Exception as e:
+            if aws_clients.is_condition_failure(e):
+                return create_response(409, {'error': 'Username already exists'})
+            raise
         
         return create_response(200, {
             'message': 'User registered successfully',
@@ -58,46 +80,71 @@ def register_user(username, password):
         })
         
     except Exception as e:
-        print(f"Error registering user: {str(e)}")
+        log.error("Error registering user", error=str(e))
         return create_response(500, {'error': 'Internal server error'})
 
 def login_user(username, password):
     try:
+        table = aws_clients.table(table_name)
         response = table.get_item(Key={'username': username})
         
         if 'Item' not in response:
+            # Spend the same hashing time as a real user's wrong password
+            passwords.verify(password, passwords.dummy_hash())
             return create_response(401, {'error': 'Invalid username or password'})
         
         user = response['Item']
         
-        # Verify password (plaintext comparison for demo)
-        if user.get('password') != password:
+        # Verify password (constant-time; legacy plaintext is still accepted)
+        matches, needs_rehash = passwords.verify(password, user.get('password', ''))
+        if not matches:
             return create_response(401, {'error': 'Invalid username or password'})
         
-        # Update last login
-        table.update_item(
-            Key={'username': username},
-            UpdateExpression='SET last_login = :val',
-            ExpressionAttributeValues={':val': int(time.time())}
-        )
+        # Update last login once it is LAST_LOGIN_INTERVAL old; the condition
+        # keeps concurrent logins from all writing it. A plaintext or
+        # under-cost password is rehashed in the same write, conditional on
+        # the stored value not having changed since it was read.
+        now = int(time.time())
+        if needs_rehash:
+            update = {
+                'UpdateExpression': 'SET last_login = :val, password = :hash',
+                'ConditionExpression': 'password = :old',
+                'ExpressionAttributeValues': {
+                    ':val': now, ':hash': passwords.hash_password(password), ':old': user['password']
+                }
+            }
+        elif now - int(user.get('last_login', 0)) >= LAST_LOGIN_INTERVAL:
+            update = {
+                'UpdateExpression': 'SET last_login = :val',
+                'ConditionExpression': 'attribute_not_exists(last_login) OR last_login <= :cutoff',
+                'ExpressionAttributeValues': {':val': now, ':cutoff': now - LAST_LOGIN_INTERVAL}
+            }
+        else:
+            update = None
+        if update:
+            try:
+                table.update_item(Key={'username': username}, **update)
+            except Exception as e:
+                if not aws_clients.is_condition_failure(e):
+                    raise
         
-        return create_response(200, {
+        campaign_progress = int(user.get('campaign_progress', 0))
+        body = {
             'message': 'Login successful',
             'username': username,
-            'campaign_progress': int(user.get('campaign_progress', 0))
-        })
+            'campaign_progress': campaign_progress
+        }
+        
+        # Signed session token other lambdas can verify without a user lookup
+        token = session_tokens.issue(username, campaign_progress)
+        if token:
+            body['token'] = token
+        
+        return create_response(200, body)
         
     except Exception as e:
-        print(f"Error logging in: {str(e)}")
+        log.error("Error logging in", error=str(e))
         return create_response(500, {'error': 'Internal server error'})
 
 def create_response(status_code, body):
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type',
-            'Access-Control-Allow-Methods': 'POST, OPTIONS'
-        },
-        'body': json.dumps(body)
-    }
+    return api_codec.response(status_code, body)
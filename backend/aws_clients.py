@@ -0,0 +1,127 @@
+import os
+import threading
+from decimal import Decimal
+
+import metrics
+
+# boto3 is the most expensive import in every handler, so it is only imported
+# the first time a request actually needs DynamoDB. The resource and Table
+# objects are then kept for the life of the container and reused by every
+# warm invocation.
+_lock = threading.Lock()
+_resource = None
+_tables = {}
+
+# Connection settings for the shared resource. Keep-alive lets warm
+# invocations reuse TLS connections; the pool is sized for the handlers that
+# fan reads out across threads.
+MAX_POOL_CONNECTIONS = 25
+CONNECT_TIMEOUT = 2  # seconds
+READ_TIMEOUT = 5  # seconds
+MAX_ATTEMPTS = 3
+
+
+def dynamodb():
+    """The container's shared DynamoDB service resource"""
+    global _resource
+    if _resource is None:
+        with _lock:
+            if _resource is None and os.environ.get('ARCADE_DYNAMODB_BACKEND') == 'memory':
+                import memory_dynamodb
+
+                _resource = memory_dynamodb.create_arcade_tables(memory_dynamodb.MemoryDynamoDB())
+            if _resource is None:
+                import boto3
+                from botocore.config import Config
+
+                _resource = boto3.resource('dynamodb', config=Config(
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    connect_timeout=CONNECT_TIMEOUT,
+                    read_timeout=READ_TIMEOUT,
+                    retries={'max_attempts': MAX_ATTEMPTS, 'mode': 'standard'}
+                ))
+    return _resource
+
+
+def use_backend(resource):
+    """Serve every table from `resource` (e.g. a MemoryDynamoDB) from now on"""
+    global _resource
+    with _lock:
+        _resource = resource
+        _tables.clear()
+
+
+def table(name):
+    """A cached Table object for `name`"""
+    if name not in _tables:
+        resource_table = dynamodb().Table(name)
+        _tables[name] = MeteredTable(resource_table) if metrics.METRICS_ENABLED else resource_table
+    return _tables[name]
+
+
+def batch_write_item(**kwargs):
+    """The service resource's batch_write_item, metered like table operations"""
+    return metrics.dynamodb_call('batch_write_item', dynamodb().batch_write_item, kwargs)
+
+
+def batch_get_item(**kwargs):
+    """The service resource's batch_get_item, metered like table operations"""
+    return metrics.dynamodb_call('batch_get_item', dynamodb().batch_get_item, kwargs)
+
+
+class MeteredTable:
+    """A Table whose item operations report their time and consumed capacity
+    to metrics; everything else is passed straight through"""
+
+    OPERATIONS = frozenset(('get_item', 'put_item', 'update_item', 'delete_item', 'query', 'scan'))
+
+    def __init__(self, resource_table):
+        self._table = resource_table
+
+    def __getattr__(self, name):
+        attribute = getattr(self._table, name)
+        if name not in self.OPERATIONS:
+            return attribute
+        return lambda **kwargs: metrics.dynamodb_call(name, attribute, kwargs)
+
+
+def error_code(error):
+    """The DynamoDB error code of a botocore ClientError, or None"""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+def is_condition_failure(error):
+    return error_code(error) == 'ConditionalCheckFailedException'
+
+
+def condition_failure_item(error):
+    """The item returned with a failed conditional write, or None.
+
+    Requires ReturnValuesOnConditionCheckFailure='ALL_OLD' on the request. The
+    item arrives in DynamoDB's wire format, even through the resource API.
+    """
+    item = getattr(error, 'response', {}).get('Item')
+    if item is None:
+        return None
+    return {key: deserialize(value) for key, value in item.items()}
+
+
+def deserialize(value):
+    """Convert one wire-format attribute value to the resource API's Python form"""
+    (kind, data), = value.items()
+    if kind == 'S' or kind == 'B' or kind == 'BOOL':
+        return data
+    if kind == 'N':
+        return Decimal(data)
+    if kind == 'NULL':
+        return None
+    if kind == 'M':
+        return {key: deserialize(item) for key, item in data.items()}
+    if kind == 'L':
+        return [deserialize(item) for item in data]
+    if kind == 'SS' or kind == 'BS':
+        return set(data)
+    if kind == 'NS':
+        return {Decimal(item) for item in data}
+    raise ValueError(f'Unknown DynamoDB type {kind}')
@@ -1,43 +1,61 @@
-import json
-import boto3
 import time
-from boto3.dynamodb.conditions import Key
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+import api_codec
+import aws_clients
+import metrics
+import session_tokens
+import structured_logging as log
+
+# DynamoDB table, created on first use and shared by warm invocations
 table_name = 'ArcadeUsers'
-table = dynamodb.Table(table_name)
 
+ACTIONS = ('get_progress', 'update_progress')
+
+@metrics.instrument(actions=ACTIONS)
 def lambda_handler(event, context):
-    print("Received event:", json.dumps(event))
+    log.debug("Received event", event=event)
     
     # Parse the body
-    if 'body' in event and isinstance(event['body'], str):
-        body = json.loads(event['body'])
-    else:
-        body = event
+    try:
+        body = api_codec.parse_body(event)
+    except api_codec.BodyError as e:
+        return create_response(e.status_code, {'error': str(e)})
     
     action = body.get('action')
     username = body.get('username')
     
+    # A session token from login identifies the player without a user lookup
+    session = None
+    if body.get('token'):
+        session = session_tokens.verify(body['token'])
+        if session is None or (username and username != session['u']):
+            return create_response(401, {'error': 'Invalid or expired session'})
+        username = session['u']
+    
     # Basic validation
     if not action or not username:
         return create_response(400, {'error': 'Missing required fields'})
     
     if action == 'get_progress':
+        if session is not None:
+            return create_response(200, {
+                'username': username,
+                'campaign_progress': int(session.get('cp', 0))
+            })
         return get_campaign_progress(username)
     elif action == 'update_progress':
         level = body.get('level')
         score = body.get('score')
         if level is None:
             return create_response(400, {'error': 'Missing level'})
-        return update_campaign_progress(username, level, score)
+        return update_campaign_progress(username, level, score, session)
     else:
         return create_response(400, {'error': 'Invalid action'})
 
 def get_campaign_progress(username):
     """Get the current campaign progress for a user"""
     try:
+        table = aws_clients.table(table_name)
         response = table.get_item(Key={'username': username})
         
         if 'Item' not in response:
@@ -52,65 +70,78 @@ def get_campaign_progress(username):
         })
         
     except Exception as e:
-        print(f"Error getting campaign progress: {str(e)}")
+        log.error("Error getting campaign progress", error=str(e))
         return create_response(500, {'error': 'Internal server error'})
 
-def update_campaign_progress(username, level, score=None):
-    """Update the campaign progress for a user"""
+def update_campaign_progress(username, level, score=None, session=None):
+    """Update the campaign progress for a user.
+
+    Callers with a verified session get a refreshed token carrying the new
+    progress back.
+    """
     try:
-        # First, get current progress to validate
-        response = table.get_item(Key={'username': username})
-        
-        if 'Item' not in response:
-            return create_response(404, {'error': 'User not found'})
-        
-        user = response['Item']
-        current_progress = int(user.get('campaign_progress', 0))
-        
-        # Validate that the user is advancing to the next level
-        # (prevent skipping ahead)
         new_level = int(level)
-        if new_level > current_progress + 1:
-            return create_response(400, {
-                'error': 'Cannot skip levels',
-                'current_progress': current_progress
-            })
         
-        # Update progress only if advancing
-        if new_level > current_progress:
-            table.update_item(
+        # Advance only from the level directly below (never skip, never regress)
+        # in a single conditional write. Users without progress are at level 0.
+        if new_level == 1:
+            condition = 'attribute_exists(username) AND (attribute_not_exists(campaign_progress) OR campaign_progress = :previous)'
+        else:
+            condition = 'attribute_exists(username) AND campaign_progress = :previous'
+        
+        table = aws_clients.table(table_name)
+        try:
+            response = table.update_item(
                 Key={'username': username},
                 UpdateExpression='SET campaign_progress = :level, last_updated = :timestamp',
+                ConditionExpression=condition,
                 ExpressionAttributeValues={
                     ':level': new_level,
+                    ':previous': new_level - 1,
                     ':timestamp': int(time.time())
-                }
+                },
+                ReturnValues='UPDATED_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
             
-            return create_response(200, {
+            campaign_progress = int(response['Attributes']['campaign_progress'])
+            body = {
                 'message': 'Campaign progress updated',
                 'username': username,
-                'campaign_progress': new_level,
+                'campaign_progress': campaign_progress,
                 'score': score
+            }
+            if session is not None:
+                body['token'] = session_tokens.issue(username, campaign_progress)
+            return create_response(200, body)
+        except Exception as e:
+            if not aws_clients.is_condition_failure(e):
+                raise
+            # The failed write already carries the current item; only older
+            # SDKs without ReturnValuesOnConditionCheckFailure need a read
+            user = aws_clients.condition_failure_item(e)
+            if user is None:
+                user = table.get_item(Key={'username': username}).get('Item')
+        
+        if user is None:
+            return create_response(404, {'error': 'User not found'})
+        
+        current_progress = int(user.get('campaign_progress', 0))
+        if new_level > current_progress + 1:
+            return create_response(400, {
+                'error': 'Cannot skip levels',
+                'current_progress': current_progress
             })
-        else:
-            return create_response(200, {
-                'message': 'Progress unchanged',
-                'username': username,
-                'campaign_progress': current_progress
-            })
+        
+        return create_response(200, {
+            'message': 'Progress unchanged',
+            'username': username,
+            'campaign_progress': current_progress
+        })
         
     except Exception as e:
-        print(f"Error updating campaign progress: {str(e)}")
+        log.error("Error updating campaign progress", error=str(e))
         return create_response(500, {'error': 'Internal server error'})
 
 def create_response(status_code, body):
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type',
-            'Access-Control-Allow-Methods': 'POST, OPTIONS'
-        },
-        'body': json.dumps(body)
-    }
+    return api_codec.response(status_code, body)
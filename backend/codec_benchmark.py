@@ -0,0 +1,148 @@
+"""Compare per-request codec CPU: api_codec against plain json handling.
+
+Replays each handler's load-test mix once against the in-memory DynamoDB
+stand-in, capturing every request event and response body, then times only
+the codec work (parsing the request, building the response) both ways:
+
+    json      json.loads / json.dumps with a Decimal hook and a fresh
+              CORS header dict per response, as the handlers used to
+    api_codec api_codec.parse_body / api_codec.response (orjson if installed)
+
+    python backend/codec_benchmark.py
+    python backend/codec_benchmark.py --requests 500 --repeat 20 --handlers auth_lambda
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# One EMF metrics line per request would drown the report
+os.environ.setdefault('ARCADE_METRICS', 'off')
+# Password hashing is not what is measured here; keep the replay quick
+os.environ.setdefault('PASSWORD_HASH_COST', str(2 ** 10))
+
+import api_codec
+import aws_clients
+import load_test
+import memory_dynamodb
+
+# The eight deployed handlers (score_service itself is behind the per-game ones)
+HANDLERS = [
+    'auth_lambda',
+    'campaign_progress_lambda',
+    'lamdba_function',
+    'flappy_bird_score_lambda',
+    'galaga_score_lambda',
+    'pacman_score_lambda',
+    'pong_score_lambda',
+    'snake_score_lambda',
+]
+
+
+def _decimal(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def json_parse(event):
+    body = event.get('body')
+    return json.loads(body) if isinstance(body, str) else event
+
+
+def json_response(status_code, body, headers):
+    if not headers:
+        return {'statusCode': status_code, 'body': json.dumps(body, default=_decimal)}
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS'
+        },
+        'body': json.dumps(body, default=_decimal)
+    }
+
+
+def codec_response(status_code, body, headers):
+    if not headers:
+        return {'statusCode': status_code, 'body': api_codec.dumps(body)}
+    return api_codec.response(status_code, body)
+
+
+def capture(module_name, factories, proxy, requests, rng):
+    """Run the handler on `requests` events.
+
+    Returns [(event, status code, response body object, has headers?)].
+    """
+    handler = importlib.import_module(module_name).lambda_handler
+    weights = [weight for weight, _ in factories]
+    builders = [factory for _, factory in factories]
+    bodies = []
+    dumps = api_codec.dumps
+
+    def recording_dumps(value):
+        bodies.append(value)
+        return dumps(value)
+
+    captured = []
+    api_codec.dumps = recording_dumps
+    try:
+        for _ in range(requests):
+            _, body = rng.choices(builders, weights)[0](rng)
+            event = load_test.api_event(body) if proxy else body
+            del bodies[:]
+            response = handler(event, None)
+            if bodies:
+                captured.append((event, response['statusCode'], bodies[-1], 'headers' in response))
+    finally:
+        api_codec.dumps = dumps
+    return captured
+
+
+def time_codec(captured, parse, respond, repeat):
+    """Best-of-`repeat` microseconds per request spent parsing and responding"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for event, status_code, body, headers in captured:
+            parse(event)
+            respond(status_code, body, headers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return 1e6 * best / len(captured)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300, help='requests captured per handler')
+    parser.add_argument('--repeat', type=int, default=10, help='timing passes (best is reported)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--handlers', nargs='*', choices=HANDLERS, help='handlers to run (default: all)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    db = memory_dynamodb.create_arcade_tables(memory_dynamodb.MemoryDynamoDB())
+    aws_clients.use_backend(db)
+    players, users = 2000, 1000
+    load_test.seed(db, 20000, users, 1000, players, rng)
+
+    scenarios = load_test.scenarios(players, users)
+    print(f'JSON backend: {"orjson " + api_codec.orjson.__version__ if api_codec.orjson else "json (stdlib)"}')
+    print(f'{"handler":28} {"requests":>8} {"json us":>9} {"codec us":>9} {"speedup":>8}')
+    for module_name in args.handlers or HANDLERS:
+        factories, proxy, _ = scenarios[module_name]
+        captured = capture(module_name, factories, proxy, args.requests, rng)
+        baseline = time_codec(captured, json_parse, json_response, args.repeat)
+        codec = time_codec(captured, api_codec.parse_body, codec_response, args.repeat)
+        print(f'{module_name:28} {len(captured):8} {baseline:9.2f} {codec:9.2f} {baseline / codec:7.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import random
+import time
+
+import aws_clients
+import sharding
+
+# Counters that every save bumps (rank counts, score histograms) would all
+# land on a single item, capping a game's save rate at what one item can
+# take. Each counter is instead spread over COUNTER_SHARDS items under
+# partitions <partition>#0 .. <partition>#N-1 (see sharding), same timestamp.
+# A write ADDs to one shard picked at random; a read fetches every shard with
+# batch_get_item and adds them up, so it costs O(shards) items whatever the
+# save rate.
+COUNTER_SHARDS = 10
+BATCH_GET_LIMIT = 100  # keys per BatchGetItem request
+MAX_BATCH_GET_RETRIES = 5
+BATCH_GET_RETRY_DELAY = 0.05  # seconds, doubled per retry
+
+
+def add(table, partition, timestamp, counts, shard=None):
+    """ADD `counts` (attribute name -> amount) to one shard of a counter item"""
+    if shard is None:
+        shard = random.randrange(COUNTER_SHARDS)
+    names = {}
+    values = {}
+    updates = []
+    for index, (name, amount) in enumerate(counts.items()):
+        names[f'#c{index}'] = name
+        values[f':c{index}'] = amount
+        updates.append(f'#c{index} :c{index}')
+    table.update_item(
+        Key={'player_id': sharding.shard_key(partition, shard), 'timestamp': timestamp},
+        UpdateExpression='ADD ' + ', '.join(updates),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def read(table, counters):
+    """Sum every shard of each (partition, timestamp) counter.
+
+    Returns {(partition, timestamp): {attribute name: total}}; counters that
+    were never written come back empty.
+    """
+    keys = [{'player_id': key, 'timestamp': timestamp}
+            for partition, timestamp in counters for key in sharding.shard_keys(partition, COUNTER_SHARDS)]
+
+    totals = {(partition, timestamp): {} for partition, timestamp in counters}
+    for item in batch_get(table, keys):
+        counts = totals[(sharding.base_key(item['player_id']), int(item['timestamp']))]
+        for name, value in item.items():
+            if name not in ('player_id', 'timestamp'):
+                counts[name] = counts.get(name, 0) + int(value)
+    return totals
+
+
+def batch_get(table, keys):
+    """Every existing item among `keys`, fetched BATCH_GET_LIMIT keys at a time"""
+    items = []
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table.name: {'Keys': keys[start:start + BATCH_GET_LIMIT]}}
+        attempt = 0
+        while request:
+            response = aws_clients.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(table.name, []))
+            request = response.get('UnprocessedKeys')
+            if request:
+                if attempt == MAX_BATCH_GET_RETRIES:
+                    raise RuntimeError(f'BatchGetItem left keys unprocessed after {attempt} retries')
+                time.sleep(BATCH_GET_RETRY_DELAY * (2 ** attempt))
+                attempt += 1
+    return items
@@ -0,0 +1,68 @@
+"""Check that every Lambda handler module stays inside its cold-start import budget.
+
+Each handler is imported in a fresh interpreter with `-X importtime`. A
+handler fails the check if importing it pulls in boto3/botocore (those must
+wait until the first request that needs DynamoDB) or if the import takes
+longer than IMPORT_BUDGET_MS.
+
+    python backend/import_budget.py
+"""
+import os
+import subprocess
+import sys
+
+HANDLERS = [
+    'auth_lambda',
+    'campaign_progress_lambda',
+    'lamdba_function',
+    'score_service',
+    'flappy_bird_score_lambda',
+    'galaga_score_lambda',
+    'pacman_score_lambda',
+    'pong_score_lambda',
+    'snake_score_lambda',
+]
+
+IMPORT_BUDGET_MS = 50
+FORBIDDEN_MODULES = ('boto3', 'botocore')
+
+
+def measure(module):
+    """Return (cumulative import time in ms, set of top-level modules imported)"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=backend_dir, capture_output=True, text=True, check=True
+    )
+
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        name = name.strip()
+        imported.add(name.split('.')[0])
+        if name == module:
+            total_us = int(cumulative_us)
+    return total_us / 1000, imported
+
+
+def main():
+    failed = False
+    for module in HANDLERS:
+        elapsed_ms, imported = measure(module)
+        problems = []
+        if elapsed_ms > IMPORT_BUDGET_MS:
+            problems.append(f'over {IMPORT_BUDGET_MS} ms budget')
+        for forbidden in FORBIDDEN_MODULES:
+            if forbidden in imported:
+                problems.append(f'imports {forbidden} at module level')
+        failed = failed or bool(problems)
+        status = 'FAIL ' + ', '.join(problems) if problems else 'ok'
+        print(f'{module:28} {elapsed_ms:8.2f} ms  {status}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,59 +1,327 @@
-# import the JSON utility package
-import json
-# import the Python math library
+# import the Python math, random and time libraries
 import math
+import random
+import time
+# import an ordered dictionary for the result cache
+from collections import OrderedDict
 
-# import the AWS SDK (for Python the package name is boto3)
-import boto3
+# import the shared request/response codec, metrics and the lazily created AWS SDK objects
+import api_codec
+import aws_clients
+import metrics
 # import two packages to help us with dates and date formatting
 from time import gmtime, strftime
 
-# create a DynamoDB object using the AWS SDK
-dynamodb = boto3.resource('dynamodb')
-# use the DynamoDB object to select our table
-table = dynamodb.Table('PowerOfMathDatabase')
-# store the current time in a human readable format in a variable
-now = strftime("%a, %d %b %Y %H:%M:%S +0000", gmtime())
+# name of our DynamoDB table (the Table object is created on first use)
+table_name = 'PowerOfMathDatabase'
+
+# the operations the calculator understands
+OPERATIONS = ('add', 'subtract', 'multiply', 'divide', 'power')
+
+# batch mode limits: the most calculations one request may carry, and the
+# smallest batch worth handing to NumPy (importing it costs more than it saves
+# on a handful of numbers)
+MAX_BATCH_SIZE = 10000
+NUMPY_MIN_BATCH_SIZE = 256
+
+# batch results are written 25 to a BatchWriteItem call (its limit); puts it
+# leaves unprocessed are retried with backoff, at most BATCH_WRITE_RETRIES times
+BATCH_WRITE_CHUNK = 25
+BATCH_WRITE_RETRIES = 5
+BATCH_RETRY_BASE_DELAY = 0.05  # seconds
+
+# NumPy is optional; None until first needed, False if it is not installed
+_numpy = None
+
+# recent results, shared by warm invocations of this container: an LRU of at
+# most CACHE_MAX_ENTRIES calculations, each kept for CACHE_TTL seconds
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 300
+_cache = OrderedDict()
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+# the action our metrics file a request under: its operation, or "batch"
+def metrics_action(request):
+    if 'pairs' in request or isinstance(request.get('num1'), list):
+        return 'batch'
+    return request.get('operation', 'power')
 
 # define the handler function that the Lambda service will use an entry point
+@metrics.instrument(action=metrics_action, actions=OPERATIONS + ('batch',))
 def lambda_handler(event, context):
     
+    # read the request from the event (or from its body, behind API Gateway)
+    try:
+        event = api_codec.parse_body(event)
+    except api_codec.BodyError as e:
+        return {
+            'statusCode': e.status_code,
+            'body': api_codec.dumps('Error: ' + str(e))
+        }
+    
+    # a list of operand pairs (or two operand columns) is a batch request
+    if 'pairs' in event or isinstance(event.get('num1'), list):
+        return handle_batch(event)
+    
     # extract the operation type and two numbers from the event object
     operation = event.get('operation', 'power')  # default to power for backwards compatibility
     num1 = float(event['num1'])
     num2 = float(event['num2'])
     
-    # perform the requested operation
-    if operation == 'add':
-        mathResult = num1 + num2
-    elif operation == 'subtract':
-        mathResult = num1 - num2
-    elif operation == 'multiply':
-        mathResult = num1 * num2
-    elif operation == 'divide':
-        if num2 == 0:
-            return {
-                'statusCode': 400,
-                'body': json.dumps('Error: Cannot divide by zero')
-            }
-        mathResult = num1 / num2
-    elif operation == 'power':
-        mathResult = math.pow(num1, num2)
-    else:
+    # reject unknown operations before anything else
+    if operation not in OPERATIONS:
         return {
             'statusCode': 400,
-            'body': json.dumps('Error: Invalid operation')
+            'body': api_codec.dumps('Error: Invalid operation')
         }
     
-    # write result and time to the DynamoDB table using the object we instantiated and save response in a variable
-    response = table.put_item(
-        Item={
-            'ID': str(mathResult),
-            'LatestGreetingTime': now
-        })
+    # a repeat of a recent calculation is answered from the cache: no maths
+    # and no DynamoDB write, since its result is already stored
+    key = cache_key(operation, num1, num2)
+    mathResult = cache_get(key)
+    if mathResult is not None:
+        return {
+            'statusCode': 200,
+            'body': api_codec.dumps('Your result is ' + str(mathResult))
+        }
+    
+    # perform the requested operation (errors come back as a message)
+    mathResult = evaluate(operation, num1, num2)
+    if isinstance(mathResult, str):
+        return {
+            'statusCode': 400,
+            'body': api_codec.dumps(mathResult)
+        }
+    
+    # store the current time in a human readable format in a variable
+    now = strftime("%a, %d %b %Y %H:%M:%S +0000", gmtime())
+    
+    # write result and time to the DynamoDB table unless it is already there
+    store_result(mathResult, now)
+    cache_put(key, mathResult)
     
     # return a properly formatted JSON object
     return {
         'statusCode': 200,
-        'body': json.dumps('Your result is ' + str(mathResult))
-    }
\ No newline at end of file
+        'body': api_codec.dumps('Your result is ' + str(mathResult))
+    }
+
+# evaluate many calculations in one invocation
+#   {"operation": "add", "pairs": [[1, 2], [3, 4]]}
+#   {"operation": "add", "num1": [1, 3], "num2": [2, 4]}
+# "operation" may also be a list with one operation per calculation. Each
+# calculation gets the message the single mode would have returned, so one
+# bad calculation (say a divide by zero) does not fail the rest.
+def handle_batch(event):
+
+    # turn the request into two equally long columns of numbers
+    try:
+        if 'pairs' in event:
+            num1 = [float(pair[0]) for pair in event['pairs']]
+            num2 = [float(pair[1]) for pair in event['pairs']]
+        else:
+            num1 = [float(value) for value in event['num1']]
+            num2 = [float(value) for value in event['num2']]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return batch_error('Error: Operands must be numbers')
+    if len(num1) != len(num2):
+        return batch_error('Error: num1 and num2 must be the same length')
+    if not num1 or len(num1) > MAX_BATCH_SIZE:
+        return batch_error(f'Error: A batch holds between 1 and {MAX_BATCH_SIZE} calculations')
+
+    # one operation for everything, or one per calculation
+    operation = event.get('operation', 'power')
+    if isinstance(operation, list):
+        if len(operation) != len(num1) or not all(isinstance(op, str) for op in operation):
+            return batch_error('Error: operation must be one name or a list with one per calculation')
+        operations = operation
+    elif operation in OPERATIONS:
+        operations = [operation] * len(num1)
+    else:
+        return batch_error('Error: Invalid operation')
+
+    # answer recent repeats from the cache and work out the rest, vectorised
+    # when there are enough of them
+    keys = [cache_key(op, a, b) for op, a, b in zip(operations, num1, num2)]
+    results = [cache_get(key) for key in keys]
+    missing = [index for index, result in enumerate(results) if result is None]
+    np = load_numpy() if len(missing) >= NUMPY_MIN_BATCH_SIZE else None
+    if np:
+        computed = evaluate_numpy(np, [operations[i] for i in missing],
+                                  [num1[i] for i in missing], [num2[i] for i in missing])
+    else:
+        computed = [evaluate(operations[i], num1[i], num2[i]) for i in missing]
+
+    # store the current time in a human readable format in a variable
+    now = strftime("%a, %d %b %Y %H:%M:%S +0000", gmtime())
+
+    # write every new distinct result with batched writes (the result is the
+    # key, so repeats within a batch are one item). BatchWriteItem cannot be
+    # conditional, so results already served from the cache are skipped here.
+    # Results that could not be written are not cached, so a repeat retries.
+    distinct = {}
+    for index, result in zip(missing, computed):
+        results[index] = result
+        if not isinstance(result, str):
+            distinct.setdefault(str(result), []).append((keys[index], result))
+    unstored = store_results(list(distinct), now)
+    for stored, calculations in distinct.items():
+        if stored not in unstored:
+            for key, result in calculations:
+                cache_put(key, result)
+
+    # return a properly formatted JSON object with one message per calculation
+    return {
+        'statusCode': 200,
+        'body': api_codec.dumps({
+            'results': [
+                result if isinstance(result, str) else 'Your result is ' + str(result)
+                for result in results
+            ],
+            'count': len(results),
+            'cache': cache_stats()
+        })
+    }
+
+# calculate one result; errors come back as the single mode's message
+def evaluate(operation, num1, num2):
+    if operation == 'add':
+        return num1 + num2
+    elif operation == 'subtract':
+        return num1 - num2
+    elif operation == 'multiply':
+        return num1 * num2
+    elif operation == 'divide':
+        if num2 == 0:
+            return 'Error: Cannot divide by zero'
+        return num1 / num2
+    elif operation == 'power':
+        try:
+            return math.pow(num1, num2)
+        except (OverflowError, ValueError) as e:
+            return 'Error: ' + str(e)
+    return 'Error: Invalid operation'
+
+# calculate a whole batch with NumPy arrays, one pass per operation (powers
+# excepted, see below)
+def evaluate_numpy(np, operations, num1, num2):
+    a = np.array(num1, dtype=float)
+    b = np.array(num2, dtype=float)
+    ops = np.array(operations, dtype=object)
+    out = np.zeros(len(num1))
+    errors = [None] * len(num1)
+
+    with np.errstate(all='ignore'):
+        for operation in set(operations):
+            mask = ops == operation
+            if operation == 'add':
+                out[mask] = a[mask] + b[mask]
+            elif operation == 'subtract':
+                out[mask] = a[mask] - b[mask]
+            elif operation == 'multiply':
+                out[mask] = a[mask] * b[mask]
+            elif operation == 'divide':
+                out[mask] = a[mask] / b[mask]
+                for index in np.flatnonzero(mask & (b == 0)):
+                    errors[index] = 'Error: Cannot divide by zero'
+            elif operation == 'power':
+                # np.power can differ from math.pow in the last bit, and a
+                # result must not depend on the size of the batch it came in
+                # (it is cached for single requests too), so powers are
+                # worked out one at a time exactly as single mode does
+                for index in np.flatnonzero(mask):
+                    result = evaluate(operation, num1[index], num2[index])
+                    if isinstance(result, str):
+                        errors[index] = result
+                    else:
+                        out[index] = result
+            else:
+                for index in np.flatnonzero(mask):
+                    errors[index] = 'Error: Invalid operation'
+
+    return [error if error else float(value) for error, value in zip(errors, out.tolist())]
+
+# write a result unless it is already stored (the result is the item's key,
+# so there is nothing to update)
+def store_result(mathResult, now):
+    try:
+        aws_clients.table(table_name).put_item(
+            Item={
+                'ID': str(mathResult),
+                'LatestGreetingTime': now
+            },
+            ConditionExpression='attribute_not_exists(ID)')
+    except Exception as e:
+        if not aws_clients.is_condition_failure(e):
+            raise
+
+# write many results with metered BatchWriteItem calls, retrying unprocessed
+# puts; returns the results still unwritten after BATCH_WRITE_RETRIES retries
+def store_results(results, now):
+    unstored = set()
+    for start in range(0, len(results), BATCH_WRITE_CHUNK):
+        requests = [{'PutRequest': {'Item': {'ID': result, 'LatestGreetingTime': now}}}
+                    for result in results[start:start + BATCH_WRITE_CHUNK]]
+        attempt = 0
+        while requests:
+            response = aws_clients.batch_write_item(RequestItems={table_name: requests})
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            if not requests:
+                break
+            if attempt == BATCH_WRITE_RETRIES:
+                unstored.update(request['PutRequest']['Item']['ID'] for request in requests)
+                break
+            # exponential backoff with jitter before retrying what was left
+            time.sleep(BATCH_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random() / 2))
+            attempt += 1
+    return unstored
+
+# the cache key for a calculation: operands are already floats, so "3", 3 and
+# 3.0 share an entry; repr keeps 0.0 and -0.0 apart
+def cache_key(operation, num1, num2):
+    return (operation, repr(num1), repr(num2))
+
+# look up a cached result; None on a miss or an expired entry
+def cache_get(key):
+    entry = _cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        _cache.move_to_end(key)
+        _cache_stats['hits'] += 1
+        return entry[1]
+    if entry is not None:
+        del _cache[key]
+        _cache_stats['expired'] += 1
+    _cache_stats['misses'] += 1
+    return None
+
+# remember a result, evicting the least recently used entries beyond the limit
+def cache_put(key, mathResult):
+    _cache[key] = (time.monotonic() + CACHE_TTL, mathResult)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+        _cache_stats['evictions'] += 1
+
+# hit/miss counts and hit rate for this container's cache
+def cache_stats():
+    lookups = _cache_stats['hits'] + _cache_stats['misses']
+    return dict(_cache_stats, size=len(_cache),
+                hit_rate=round(_cache_stats['hits'] / lookups, 4) if lookups else 0)
+
+# import NumPy the first time a large batch arrives, if it is installed
+def load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+# a 400 response for a batch request that cannot be evaluated at all
+def batch_error(message):
+    return {
+        'statusCode': 400,
+        'body': api_codec.dumps(message)
+    }
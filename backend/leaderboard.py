@@ -0,0 +1,356 @@
+import sys
+
+import counter_shards
+import paging
+import period_leaderboards
+import player_shards
+import player_stats
+import sharding
+from aws_clients import is_condition_failure
+from score_index import is_reserved_item
+
+# Every saved score carries a board key, which puts it in the score-sorted
+# global secondary index:
+#   ScoreIndex: board (HASH, S) + score (RANGE, N), projection ALL
+# One board value for every score would make a single hot index partition, so
+# scores are spread over LEADERBOARD_SHARDS boards, all#0 .. all#N-1, picked by
+# a hash of the score's timestamp (see sharding). Reads query every board in
+# parallel and merge them by score.
+LEADERBOARD_INDEX = 'ScoreIndex'
+LEADERBOARD_BOARD = 'all'
+LEADERBOARD_SHARDS = 10
+CURSOR_KEY_FIELDS = ('board', 'score', 'player_id', 'timestamp')  # a ScoreIndex LastEvaluatedKey
+
+# Score counts live in the score table itself under reserved partitions, at
+# three levels, so "how many scores beat this one" is one batch read of a
+# fixed number of items however many scores a game has:
+#   __rank_fine__   timestamp score // 100,    n<score % 100>           scores at each value
+#   __rank_coarse__ timestamp score // 10000,  n<(score // 100) % 100>  scores per fine item
+#   __rank_top__    timestamp 0,               n<score // 10000>        scores per coarse item
+# Each level sums the counts above the score in its own item (negative scores
+# count as 0). Every save bumps one counter at each level, so the counters are
+# sharded (see counter_shards).
+RANK_FINE_PARTITION = '__rank_fine__'
+RANK_COARSE_PARTITION = '__rank_coarse__'
+RANK_TOP_PARTITION = '__rank_top__'
+RANK_FANOUT = 100
+
+DEFAULT_LIMIT = 10
+DEFAULT_RADIUS = 5
+MAX_LIMIT = 100
+MAX_QUERY_SCORE = 10 ** 38  # DynamoDB numbers hold at most 38 digits
+
+
+def board_key(timestamp):
+    """Board a new score saved at `timestamp` is indexed under"""
+    return sharding.hashed_shard_key(LEADERBOARD_BOARD, timestamp, LEADERBOARD_SHARDS)
+
+
+def board_keys():
+    """Every board holding scores"""
+    return sharding.shard_keys(LEADERBOARD_BOARD, LEADERBOARD_SHARDS)
+
+
+def index_key(item):
+    """An item's ScoreIndex key, usable as a query's ExclusiveStartKey"""
+    return {'board': item['board'], 'score': item['score'],
+            'player_id': item['player_id'], 'timestamp': item['timestamp']}
+
+
+def query_boards(table, boards, **query_kwargs):
+    """Run the same ScoreIndex query on each board concurrently.
+
+    `boards` maps each board to its ExclusiveStartKey (or None); returns the
+    query responses in the same order. Each board is read until it has
+    returned query_kwargs['Limit'] items or has none left, so a board with
+    LastEvaluatedKey always returned a full Limit.
+    """
+    limit = query_kwargs['Limit']
+
+    def read(board):
+        kwargs = dict(query_kwargs, IndexName=LEADERBOARD_INDEX)
+        kwargs['ExpressionAttributeValues'] = dict(query_kwargs['ExpressionAttributeValues'], **{':b': board})
+        if boards[board]:
+            kwargs['ExclusiveStartKey'] = boards[board]
+        items = []
+        while True:
+            response = table.query(**kwargs)
+            items.extend(response.get('Items', []))
+            if len(items) >= limit or 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            kwargs['Limit'] = limit - len(items)
+        response['Items'] = items
+        return response
+
+    return sharding.read_all(read, list(boards))
+
+
+def rank_counters(score):
+    """The (partition, timestamp, attribute) of each level's counter for a score"""
+    fine = max(0, int(score))
+    coarse = fine // RANK_FANOUT
+    top = coarse // RANK_FANOUT
+    return (
+        (RANK_FINE_PARTITION, coarse, f'n{fine % RANK_FANOUT}'),
+        (RANK_COARSE_PARTITION, top, f'n{coarse % RANK_FANOUT}'),
+        (RANK_TOP_PARTITION, 0, f'n{top}'),
+    )
+
+
+def rank_counts(scores):
+    """{(partition, timestamp): {attribute: count}} for a batch of scores"""
+    counts = {}
+    for score in scores:
+        for partition, timestamp, name in rank_counters(score):
+            item = counts.setdefault((partition, timestamp), {})
+            item[name] = item.get(name, 0) + 1
+    return counts
+
+
+def record_score(table, score):
+    """Count a newly saved score at every rank level"""
+    record_scores(table, [score])
+
+
+def record_scores(table, scores):
+    """Count a batch of saved scores, one counter update per item touched"""
+    for (partition, timestamp), counts in rank_counts(scores).items():
+        counter_shards.add(table, partition, timestamp, counts)
+
+
+def encode_cursor(boards, next_rank):
+    """`boards` maps each board with scores left to its ExclusiveStartKey (or None)"""
+    return paging.encode_token({
+        'boards': {board: {k: int(v) if k in ('score', 'timestamp') else v for k, v in key.items()} if key else None
+                   for board, key in boards.items()},
+        '_rank': next_rank
+    })
+
+
+def decode_cursor(cursor):
+    """Return ({board: ExclusiveStartKey or None}, next rank). Raises ValueError if malformed."""
+    try:
+        payload = paging.decode_token(cursor)
+        next_rank = int(payload['_rank'])
+        boards = payload['boards']
+        if next_rank < 1 or not all(board in board_keys() and valid_start_key(board, key)
+                                    for board, key in boards.items()):
+            raise ValueError('Bad board or start key')
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    return boards, next_rank
+
+
+def valid_start_key(board, key):
+    """True for None or a ScoreIndex key on `board`, as index_key builds them"""
+    if key is None:
+        return True
+    return (isinstance(key, dict) and set(key) == set(CURSOR_KEY_FIELDS) and key['board'] == board
+            and isinstance(key['player_id'], str)
+            and all(type(key[name]) is int for name in ('score', 'timestamp')))
+
+
+def format_entry(item, rank):
+    return {
+        'rank': rank,
+        'player_id': player_shards.display_id(item.get('player_id', 'unknown')),
+        'score': int(item.get('score', 0)),
+        'game_date': item.get('game_date', '')
+    }
+
+
+def get_top(table, limit=DEFAULT_LIMIT, cursor=None):
+    """Return one page of the leaderboard, highest score first.
+
+    Each board is read from where the previous page stopped taking its
+    scores, `limit` at a time, and the page is the best `limit` of them.
+    Raises ValueError for a malformed cursor.
+    """
+    limit = paging.clamp_limit(limit, DEFAULT_LIMIT, MAX_LIMIT)
+    if cursor:
+        boards, first_rank = decode_cursor(cursor)
+    else:
+        boards, first_rank = dict.fromkeys(board_keys()), 1
+
+    responses = query_boards(table, boards,
+                             KeyConditionExpression='board = :b',
+                             ExpressionAttributeValues={},
+                             ScanIndexForward=False,
+                             Limit=limit)
+    # Each board's items are already in score order, so a stable sort keeps
+    # every board's taken items a prefix of what it returned
+    candidates = [(item, board) for board, response in zip(boards, responses) for item in response.get('Items', [])]
+    candidates.sort(key=lambda candidate: -candidate[0]['score'])
+    page = candidates[:limit]
+    entries = [format_entry(item, first_rank + i) for i, (item, _) in enumerate(page)]
+
+    taken = {}
+    for item, board in page:
+        taken.setdefault(board, []).append(item)
+    next_boards = {}
+    for board, response in zip(boards, responses):
+        items = taken.get(board, [])
+        if len(items) == len(response.get('Items', [])) and 'LastEvaluatedKey' not in response:
+            continue  # nothing left on this board
+        next_boards[board] = index_key(items[-1]) if items else boards[board]
+
+    next_cursor = encode_cursor(next_boards, first_rank + len(page)) if next_boards else None
+    return {'entries': entries, 'next_cursor': next_cursor}
+
+
+def count_scores_above(table, score):
+    """Number of saved scores strictly greater than `score`"""
+    counters = rank_counters(score)
+    totals = counter_shards.read(table, [(partition, timestamp) for partition, timestamp, _ in counters])
+    if int(score) < 0:
+        # Negative scores are counted as 0, so every counted score is above
+        return sum(totals[(RANK_TOP_PARTITION, 0)].values())
+    total = 0
+    for partition, timestamp, name in counters:
+        own = int(name[1:])
+        total += sum(count for slot, count in totals[(partition, timestamp)].items()
+                     if slot.startswith('n') and int(slot[1:]) > own)
+    return total
+
+
+def get_player_best(table, player_id):
+    """Best saved score for one player, from their summary item(s)"""
+    return player_stats.get_best(table, player_id)
+
+
+def get_rank(table, score):
+    """1-based competition rank a score holds (ties share a rank)"""
+    return count_scores_above(table, score) + 1
+
+
+def get_around(table, score, radius=DEFAULT_RADIUS):
+    """Return up to `radius` entries above and below `score`, with ranks"""
+    radius = paging.clamp_limit(radius, DEFAULT_RADIUS, MAX_LIMIT)
+    boards = dict.fromkeys(board_keys())
+
+    above = [item for response in query_boards(table, boards,
+                                               KeyConditionExpression='board = :b AND score > :s',
+                                               ExpressionAttributeValues={':s': int(score)},
+                                               ScanIndexForward=True,
+                                               Limit=radius)
+             for item in response.get('Items', [])]
+    above.sort(key=lambda item: item['score'])
+    above = above[:radius]
+    above.reverse()
+
+    at_or_below = [item for response in query_boards(table, boards,
+                                                     KeyConditionExpression='board = :b AND score <= :s',
+                                                     ExpressionAttributeValues={':s': int(score)},
+                                                     ScanIndexForward=False,
+                                                     Limit=radius + 1)
+                   for item in response.get('Items', [])]
+    at_or_below.sort(key=lambda item: -item['score'])
+    at_or_below = at_or_below[:radius + 1]
+
+    rank = get_rank(table, score)
+    first_rank = rank - len(above)
+    items = above + at_or_below
+    return {
+        'rank': rank,
+        'entries': [format_entry(item, first_rank + i) for i, item in enumerate(items)]
+    }
+
+
+def backfill(table):
+    """Index and count scores saved before the leaderboard existed. Safe to re-run."""
+    indexed = 0
+    scan_kwargs = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if is_reserved_item(item) or 'board' in item:
+                continue
+            try:
+                table.update_item(
+                    Key={'player_id': item['player_id'], 'timestamp': item['timestamp']},
+                    UpdateExpression='SET board = :b',
+                    ConditionExpression='attribute_not_exists(board)',
+                    ExpressionAttributeValues={':b': board_key(item['timestamp'])}
+                )
+            except Exception as e:
+                if is_condition_failure(e):
+                    continue
+                raise
+            record_score(table, item.get('score', 0))
+            indexed += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return indexed
+
+
+def handle_request(table, body):
+    """Dispatch a get_leaderboard request body to the right query.
+
+    mode 'top' (default): limit, cursor
+    mode 'around':        player_id or score, radius
+    mode 'rank':          player_id or score
+
+    period 'daily' or 'weekly' (with mode 'top' and an optional date) reads
+    that window's board instead of the all-time index.
+    """
+    mode = body.get('mode', 'top')
+    period = body.get('period', 'all')
+    if period != 'all':
+        if period not in period_leaderboards.PERIODS:
+            return {'error': 'Invalid period. Use "all", "daily" or "weekly"'}
+        if mode != 'top':
+            return {'error': 'Daily and weekly boards only support mode "top"'}
+        try:
+            return period_leaderboards.get_board(table, period, body.get('date'))
+        except (TypeError, ValueError):
+            return {'error': 'Invalid date. Use YYYY-MM-DD'}
+
+    if mode == 'top':
+        try:
+            return get_top(table, body.get('limit', DEFAULT_LIMIT), body.get('cursor'))
+        except ValueError as e:
+            return {'error': str(e)}
+
+    score = body.get('score')
+    if score is None and body.get('player_id'):
+        try:
+            player_shards.validate_player_id(body['player_id'])
+        except ValueError as e:
+            return {'error': str(e)}
+        score = get_player_best(table, body['player_id'])
+        if score is None:
+            return {'error': 'No scores for player', 'player_id': body['player_id']}
+    if score is None:
+        return {'error': 'Provide player_id or score'}
+    try:
+        score = int(score)
+    except (TypeError, ValueError, OverflowError):
+        score = None
+    if score is None or abs(score) >= MAX_QUERY_SCORE:
+        return {'error': 'Score must be an integer'}
+
+    if mode == 'around':
+        return get_around(table, score, body.get('radius', DEFAULT_RADIUS))
+    if mode == 'rank':
+        return {'score': score, 'rank': get_rank(table, score)}
+    return {'error': 'Invalid mode. Use "top", "around" or "rank"'}
+
+
+def main(argv=None):
+    import argparse
+
+    import aws_clients
+    from score_service import GAMES
+
+    parser = argparse.ArgumentParser(description='Index a game\'s existing scores for the ranked leaderboard')
+    parser.add_argument('game', choices=sorted(game for game, config in GAMES.items() if not config.get('matches')))
+    args = parser.parse_args(argv)
+
+    indexed = backfill(aws_clients.table(GAMES[args.game]['table']))
+    print(f'Indexed {indexed} scores', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+"""Load-test every backend handler against the in-memory DynamoDB stand-in.
+
+Seeds memory_dynamodb with realistic data, then replays a weighted mix of
+API Gateway events through each handler's lambda_handler in-process (one
+warm container) and reports, per handler and action:
+
+    p50/p95/p99 latency, items read and written per request
+
+plus the container's memory. With --rate the replay is open-loop: requests
+are scheduled at a fixed rate and latency is measured from the scheduled
+time, so a handler that cannot keep up shows its queueing delay.
+
+    python backend/load_test.py --scores 1000000 --requests 20000 --rate 10000 --latency-ms 2
+    python backend/load_test.py --handlers score_service auth_lambda
+"""
+import argparse
+import importlib
+import itertools
+import json
+import math
+import os
+import random
+import resource
+import sys
+import time
+
+# Handlers log one line per request at INFO; keep the replay quiet unless asked
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# One EMF metrics line per request would drown the report
+os.environ.setdefault('ARCADE_METRICS', 'off')
+
+import aws_clients
+import counter_shards
+import leaderboard
+import memory_dynamodb
+import passwords
+import player_stats
+import score_histogram
+import sharding
+from score_index import HIGH_SCORE_KEY
+
+SCORE_TABLES = {
+    'galaga': 'GalagaScores',
+    'flappy_bird': 'FlappyBirdScores',
+    'pacman': 'PacmanScores',
+    'snake': 'SnakeScores',
+}
+
+SEED_PASSWORD = 'hunter2'
+LEGACY_PASSWORD_SHARE = 20  # every Nth seeded user still has a plaintext password
+
+
+# ---------------------------------------------------------------------------
+# Seeding
+
+def seed(db, scores, users, matches, players, rng):
+    """Fill the stand-in tables. `scores` is the total across all score games."""
+    base_timestamp = int(time.time() * 1000) - scores * 10
+    per_game = scores // len(SCORE_TABLES)
+    for table_name in SCORE_TABLES.values():
+        items = []
+        summaries = {}
+        counters = {}
+        best = None
+        for index in range(per_game):
+            score = int(rng.expovariate(1 / 2000))
+            item = {
+                'player_id': f'player{rng.randrange(players):06d}',
+                'board': leaderboard.board_key(base_timestamp + index * 10),
+                'timestamp': base_timestamp + index * 10,
+                'score': score,
+                'game_date': time.strftime('%Y-%m-%d %H:%M:%S +0000', time.gmtime((base_timestamp + index * 10) / 1000))
+            }
+            items.append(item)
+            if best is None or score > best['score']:
+                best = item
+            summary = summaries.setdefault(item['player_id'], dict(
+                player_stats.summary_key(item['player_id']), games_played=0, total_score=0, best=-1))
+            summary['games_played'] += 1
+            summary['total_score'] += score
+            if score > summary['best']:
+                summary.update(best=score, best_timestamp=item['timestamp'], best_date=item['game_date'])
+            summary.update(last_score=score, last_timestamp=item['timestamp'], last_played=item['game_date'])
+            # The rank and histogram counters a save would ADD to, on the
+            # random shard it would pick
+            shard = rng.randrange(counter_shards.COUNTER_SHARDS)
+            for (partition, timestamp), counts in itertools.chain(
+                    leaderboard.rank_counts([score]).items(), score_histogram.histogram_counts([item]).items()):
+                totals = counters.setdefault((sharding.shard_key(partition, shard), timestamp), {})
+                for name, amount in counts.items():
+                    totals[name] = totals.get(name, 0) + amount
+
+        # Bookkeeping items the save path maintains
+        items.extend(dict(counts, player_id=partition, timestamp=timestamp)
+                     for (partition, timestamp), counts in counters.items())
+        items.extend(summaries.values())
+        if best is not None:
+            items.append(dict(HIGH_SCORE_KEY, score=best['score'], holder_id=best['player_id'],
+                              holder_timestamp=best['timestamp'], game_date=best['game_date']))
+        db.Table(table_name).load(items)
+
+    # Last logins spread over the past half hour: with the default 15 minute
+    # LAST_LOGIN_INTERVAL about half are still fresh and half get rewritten
+    # Hashing is deliberately slow, so every user shares one precomputed hash
+    now = int(time.time())
+    password_hash = passwords.hash_password(SEED_PASSWORD)
+    db.Table('ArcadeUsers').load(
+        {
+            'username': f'user{index:06d}',
+            'password': SEED_PASSWORD if index % LEGACY_PASSWORD_SHARE == 0 else password_hash,
+            'created_at': 0,
+            'last_login': now - rng.randrange(30 * 60),
+            'campaign_progress': rng.randrange(5)
+        }
+        for index in range(users)
+    )
+
+    # Matches spread over the last few days, one every 30 seconds
+    match_time = time.time() - matches * 30
+    db.Table('PongScores').load(
+        {
+            'game_id': f'seed-{index:08d}',
+            'created_day': time.strftime('%Y-%m-%d', time.gmtime(match_time + index * 30)),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(match_time + index * 30)),
+            'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(match_time + index * 30)),
+            'player_score': rng.randrange(12),
+            'ai_score': rng.randrange(12),
+            'result': rng.choice(['WIN', 'LOSS'])
+        }
+        for index in range(matches)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Event mixes. Each factory returns (action label, request body).
+
+def api_event(body):
+    """An API Gateway REST proxy event carrying `body`"""
+    return {
+        'resource': '/',
+        'path': '/',
+        'httpMethod': 'POST',
+        'headers': {
+            'Content-Type': 'application/json',
+            'Origin': 'https://arcade.example.com',
+            'User-Agent': 'Mozilla/5.0 (load test)'
+        },
+        'requestContext': {
+            'stage': 'DEV',
+            'requestId': '%032x' % random.getrandbits(128),
+            'identity': {'sourceIp': '203.0.113.10'}
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps(body)
+    }
+
+
+def score_mix(game, players):
+    def high_score(rng):
+        return 'get_high_score', {'action': 'get_high_score'}
+
+    def save(rng):
+        # The game pages save most scores as anonymous
+        player_id = 'anonymous' if rng.random() < 0.6 else f'player{rng.randrange(players):06d}'
+        body = {'action': 'save_score', 'player_id': player_id, 'score': int(rng.expovariate(1 / 2000))}
+        if game == 'snake':
+            body['snake_length'] = rng.randrange(3, 60)
+        return 'save_score', body
+
+    def save_batch(rng):
+        return 'save_scores', {'action': 'save_scores', 'scores': [
+            {'player_id': f'player{rng.randrange(players):06d}', 'score': int(rng.expovariate(1 / 2000))}
+            for _ in range(10)
+        ]}
+
+    def top(rng):
+        return 'leaderboard_top', {'action': 'get_leaderboard', 'limit': 10}
+
+    def around(rng):
+        return 'leaderboard_around', {'action': 'get_leaderboard', 'mode': 'around',
+                                      'player_id': f'player{rng.randrange(players):06d}'}
+
+    def rank(rng):
+        return 'leaderboard_rank', {'action': 'get_leaderboard', 'mode': 'rank',
+                                    'score': int(rng.expovariate(1 / 2000))}
+
+    def daily(rng):
+        return 'leaderboard_daily', {'action': 'get_leaderboard',
+                                     'period': rng.choice(['daily', 'weekly'])}
+
+    def distribution(rng):
+        return 'score_distribution', {'action': 'get_score_distribution'}
+
+    def stats(rng):
+        return 'player_stats', {'action': 'get_player_stats',
+                                'player_id': f'player{rng.randrange(players):06d}'}
+
+    return [(44, high_score), (25, save), (2, save_batch), (10, top), (4, around), (4, rank), (5, stats),
+            (2, distribution), (4, daily)]
+
+
+def pong_mix():
+    recorded = []
+    live = {}  # game_id -> last seq sent for matches still being played
+
+    def rally(rng):
+        if len(live) < 50:
+            live[f'live-{rng.getrandbits(64):016x}'] = 0
+        game_id = rng.choice(list(live))
+        live[game_id] += 1
+        return 'record_game_in_progress', {'action': 'record_game', 'game_id': game_id,
+                                           'seq': live[game_id], 'player_score': live[game_id] // 2,
+                                           'ai_score': live[game_id] // 3, 'result': 'IN_PROGRESS'}
+
+    def record(rng):
+        body = {'action': 'record_game', 'game_id': f'load-{rng.getrandbits(64):016x}',
+                'player_score': rng.randrange(12), 'ai_score': rng.randrange(12),
+                'result': rng.choice(['WIN', 'LOSS'])}
+        if len(recorded) < 10000:
+            recorded.append(body)
+        return 'record_game', body
+
+    def retry(rng):
+        # A client resending a finished match it never saw acknowledged
+        return 'record_game_retry', dict(rng.choice(recorded)) if recorded else record(rng)[1]
+
+    def recent(rng):
+        return 'get_recent_games', {'action': 'get_recent_games'}
+
+    return [(45, rally), (35, record), (10, retry), (10, recent)]
+
+
+def auth_mix(users):
+    counter = [0]
+
+    def login(rng):
+        return 'login', {'action': 'login', 'username': f'user{rng.randrange(users):06d}',
+                         'password': SEED_PASSWORD}
+
+    def bad_login(rng):
+        return 'login_failed', {'action': 'login', 'username': f'user{rng.randrange(users):06d}',
+                                'password': 'wrong'}
+
+    def register(rng):
+        counter[0] += 1
+        return 'register', {'action': 'register', 'username': f'new{counter[0]:08d}',
+                            'password': SEED_PASSWORD}
+
+    return [(85, login), (5, bad_login), (10, register)]
+
+
+def campaign_mix(users):
+    def get_progress(rng):
+        return 'get_progress', {'action': 'get_progress', 'username': f'user{rng.randrange(users):06d}'}
+
+    def update_progress(rng):
+        return 'update_progress', {'action': 'update_progress', 'username': f'user{rng.randrange(users):06d}',
+                                   'level': rng.randrange(1, 6), 'score': rng.randrange(5000)}
+
+    return [(60, get_progress), (40, update_progress)]
+
+
+def calculator_mix():
+    def calculate(rng):
+        operation = rng.choice(['add', 'subtract', 'multiply', 'divide', 'power'])
+        return operation, {'operation': operation, 'num1': rng.randrange(1, 100), 'num2': rng.randrange(0, 10)}
+
+    def calculate_batch(rng):
+        size = rng.choice([10, 100, 1000])
+        return f'batch_{size}', {'operation': rng.choice(['add', 'multiply', 'divide', 'power']),
+                                 'pairs': [[rng.randrange(1, 100), rng.randrange(0, 10)] for _ in range(size)]}
+
+    return [(95, calculate), (5, calculate_batch)]
+
+
+def hub_mix(players):
+    def anonymous(rng):
+        return 'get_hub_summary', {'action': 'get_hub_summary'}
+
+    def player(rng):
+        return 'get_hub_summary_player', {'action': 'get_hub_summary',
+                                          'player_id': f'player{rng.randrange(players):06d}'}
+
+    return [(60, anonymous), (40, player)]
+
+
+def with_game(mix, game):
+    """Route a per-game mix through score_service's shared handler"""
+    def wrap(factory):
+        def build(rng):
+            label, body = factory(rng)
+            return f'{game}:{label}', dict(body, game=game)
+        return build
+    return [(weight, wrap(factory)) for weight, factory in mix]
+
+
+def scenarios(players, users):
+    """handler module -> (weighted event factories, proxy integration?, response hook)"""
+    shared = []
+    for game in SCORE_TABLES:
+        shared += with_game(score_mix(game, players), game)
+    shared += with_game(pong_mix(), 'pong')
+    shared += hub_mix(players)
+    return {
+        'score_service': (shared, True, None),
+        'galaga_score_lambda': (score_mix('galaga', players), True, None),
+        'flappy_bird_score_lambda': (score_mix('flappy_bird', players), True, None),
+        'pacman_score_lambda': (score_mix('pacman', players), True, None),
+        # The Snake page and the calculator invoke their lambdas directly
+        'snake_score_lambda': (score_mix('snake', players), False, None),
+        'pong_score_lambda': (pong_mix(), True, None),
+        'auth_lambda': (auth_mix(users), True, None),
+        'campaign_progress_lambda': (campaign_mix(users), True, None),
+        'lamdba_function': (calculator_mix(), False, None),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Replay
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def replay(db, module_name, factories, proxy, hook, requests, rate, rng):
+    handler = importlib.import_module(module_name).lambda_handler
+    weights = [weight for weight, _ in factories]
+    builders = [factory for _, factory in factories]
+    results = {}
+
+    start = time.perf_counter()
+    for index in range(requests):
+        label, body = rng.choices(builders, weights)[0](rng)
+        event = api_event(body) if proxy else body
+
+        scheduled = start + index / rate if rate else time.perf_counter()
+        now = time.perf_counter()
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+        reads = db.stats['items_read']
+        writes = db.stats['items_written']
+        response = handler(event, None)
+        finished = time.perf_counter()
+        if hook:
+            hook(response)
+
+        stats = results.setdefault(label, {'latencies': [], 'service': 0.0, 'reads': 0, 'writes': 0, 'errors': 0})
+        stats['latencies'].append(finished - min(scheduled, now))
+        stats['service'] += finished - now
+        stats['reads'] += db.stats['items_read'] - reads
+        stats['writes'] += db.stats['items_written'] - writes
+        if response.get('statusCode', 200) >= 500:
+            stats['errors'] += 1
+
+    return results, time.perf_counter() - start
+
+
+def report(module_name, results, elapsed, rate):
+    total = sum(len(stats['latencies']) for stats in results.values())
+    mean_service = sum(stats['service'] for stats in results.values()) / total
+    print(f'\n{module_name}: {total} requests in {elapsed:.2f}s ({total / elapsed:,.0f} req/s)')
+    if rate:
+        print(f'  containers needed at {rate:,} req/s: {math.ceil(rate * mean_service)}')
+    print(f'  {"action":32} {"count":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"reads":>8} {"writes":>7} {"5xx":>5}')
+    for label in sorted(results):
+        stats = results[label]
+        latencies = sorted(stats['latencies'])
+        count = len(latencies)
+        print(f'  {label:32} {count:7} '
+              f'{1000 * percentile(latencies, 0.50):8.3f} '
+              f'{1000 * percentile(latencies, 0.95):8.3f} '
+              f'{1000 * percentile(latencies, 0.99):8.3f} '
+              f'{stats["reads"] / count:8.1f} {stats["writes"] / count:7.1f} {stats["errors"]:5}')
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scores', type=int, default=200000, help='stored scores across all score tables')
+    parser.add_argument('--players', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--matches', type=int, default=10000, help='stored Pong matches')
+    parser.add_argument('--requests', type=int, default=5000, help='requests replayed per handler')
+    parser.add_argument('--rate', type=int, default=0, help='target req/s (0 = as fast as possible)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='injected DynamoDB latency per call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--handlers', nargs='*', help='handler modules to run (default: all)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    db = memory_dynamodb.create_arcade_tables(memory_dynamodb.MemoryDynamoDB(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000))
+    aws_clients.use_backend(db)
+
+    seed_start = time.perf_counter()
+    seed(db, args.scores, args.users, args.matches, args.players, rng)
+    print(f'Seeded {args.scores:,} scores, {args.users:,} users and {args.matches:,} matches '
+          f'in {time.perf_counter() - seed_start:.1f}s (max RSS {max_rss_mb():,.0f} MB)')
+
+    selected = scenarios(args.players, args.users)
+    for module_name in args.handlers or list(selected):
+        factories, proxy, hook = selected[module_name]
+        rss_before = max_rss_mb()
+        results, elapsed = replay(db, module_name, factories, proxy, hook, args.requests, args.rate, rng)
+        report(module_name, results, elapsed, args.rate)
+        print(f'  container memory: max RSS {max_rss_mb():,.0f} MB (+{max_rss_mb() - rss_before:,.1f} MB during replay)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
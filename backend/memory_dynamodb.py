@@ -0,0 +1,1007 @@
+"""In-process stand-in for the DynamoDB service resource.
+
+Implements the subset of the boto3 resource API the handlers use (Table
+get_item/put_item/update_item/delete_item/query/scan, and the service-level
+batch_write_item/batch_get_item) with real expression strings, so handler code
+runs unchanged against it:
+
+    import aws_clients, memory_dynamodb
+    db = memory_dynamodb.MemoryDynamoDB(latency=0.002)
+    memory_dynamodb.create_arcade_tables(db)
+    aws_clients.use_backend(db)
+
+Partitions and secondary indexes are kept as sorted lists, so key-bounded
+queries cost what they would in DynamoDB (a bisect plus the items returned),
+while scans walk every item. Every call sleeps for the configured latency and
+is counted in `stats`. Numbers are stored as Decimal and floats are rejected,
+as boto3 does.
+
+Set ARCADE_DYNAMODB_BACKEND=memory to make aws_clients use a fresh instance
+with the arcade tables instead of AWS.
+"""
+import bisect
+import copy
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from decimal import Decimal
+from functools import lru_cache
+
+# Items returned per query/scan page before LastEvaluatedKey is set, standing in
+# for DynamoDB's 1 MB page limit
+DEFAULT_PAGE_ITEMS = 1000
+
+
+class ClientError(Exception):
+    """Mirrors botocore's ClientError closely enough for aws_clients.error_code"""
+
+    def __init__(self, code, message, item=None):
+        super().__init__(f'An error occurred ({code}): {message}')
+        self.response = {'Error': {'Code': code, 'Message': message}}
+        if item is not None:
+            self.response['Item'] = serialize_item(item)
+
+
+# ---------------------------------------------------------------------------
+# Value conversion
+
+def to_internal(value):
+    """Convert a request value to the stored form (ints become Decimal)"""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        return {key: to_internal(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_internal(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {to_internal(item) for item in value}
+    raise TypeError(f'Unsupported type {type(value).__name__}')
+
+
+def serialize_value(value):
+    """DynamoDB wire format, as returned in low-level error responses"""
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, Decimal):
+        return {'N': str(value)}
+    if isinstance(value, bytes):
+        return {'B': value}
+    if isinstance(value, dict):
+        return {'M': serialize_item(value)}
+    if isinstance(value, list):
+        return {'L': [serialize_value(item) for item in value]}
+    if isinstance(value, set):
+        sample = next(iter(value))
+        if isinstance(sample, str):
+            return {'SS': sorted(value)}
+        return {'NS': [str(item) for item in value]}
+    raise TypeError(f'Unsupported type {type(value).__name__}')
+
+
+def serialize_item(item):
+    return {key: serialize_value(value) for key, value in item.items()}
+
+
+def item_size(item):
+    """Rough DynamoDB item size in bytes, for capacity accounting"""
+    size = 0
+    for key, value in item.items():
+        size += len(key)
+        if isinstance(value, str):
+            size += len(value.encode())
+        elif isinstance(value, (dict, list, set)):
+            size += len(repr(value))
+        else:
+            size += 8
+    return size
+
+
+# ---------------------------------------------------------------------------
+# Expression parsing. Parsed trees are cached per expression string; the
+# name/value maps are applied at evaluation time.
+
+_TOKEN_RE = re.compile(r'\s*(?:(\d+)|([#:]?[A-Za-z_][A-Za-z0-9_\-]*)|(<>|<=|>=|[=<>(),.\[\]+\-]))')
+_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+_MISSING = object()
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise ClientError('ValidationException', f'Invalid expression: {expression!r}')
+        number, word, symbol = match.groups()
+        if number is not None:
+            tokens.append(('num', int(number)))
+        elif word is not None:
+            tokens.append(('word', word))
+        else:
+            tokens.append(('sym', symbol))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def error(self):
+        return ClientError('ValidationException', f'Invalid expression: {self.expression!r}')
+
+    def expect(self, symbol):
+        if self.next() != ('sym', symbol):
+            raise self.error()
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == 'word' and value.upper() == word:
+            self.position += 1
+            return True
+        return False
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # Paths and operands
+
+    def path(self):
+        kind, value = self.next()
+        if kind != 'word' or value.startswith(':'):
+            raise self.error()
+        parts = [('name', value)]
+        while True:
+            if self.peek() == ('sym', '.'):
+                self.next()
+                kind, value = self.next()
+                if kind != 'word':
+                    raise self.error()
+                parts.append(('name', value))
+            elif self.peek() == ('sym', '['):
+                self.next()
+                kind, value = self.next()
+                if kind != 'num':
+                    raise self.error()
+                self.expect(']')
+                parts.append(('index', value))
+            else:
+                return ('path', tuple(parts))
+
+    def operand(self):
+        kind, value = self.peek()
+        if kind != 'word':
+            raise self.error()
+        if value.startswith(':'):
+            self.next()
+            return ('value', value)
+        if self.peek(1) == ('sym', '('):
+            name = value.lower()
+            self.position += 2
+            if name == 'size':
+                argument = self.path()
+                self.expect(')')
+                return ('size', argument)
+            if name == 'if_not_exists':
+                argument = self.path()
+                self.expect(',')
+                default = self.value_expression()
+                self.expect(')')
+                return ('if_not_exists', argument, default)
+            if name == 'list_append':
+                first = self.value_expression()
+                self.expect(',')
+                second = self.value_expression()
+                self.expect(')')
+                return ('list_append', first, second)
+            raise self.error()
+        return self.path()
+
+    def value_expression(self):
+        left = self.operand()
+        if self.peek() in (('sym', '+'), ('sym', '-')):
+            operator = self.next()[1]
+            return ('arith', operator, left, self.operand())
+        return left
+
+    # Conditions
+
+    def condition(self):
+        left = self.conjunction()
+        while self.keyword('OR'):
+            left = ('or', left, self.conjunction())
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.keyword('AND'):
+            left = ('and', left, self.negation())
+        return left
+
+    def negation(self):
+        if self.keyword('NOT'):
+            return ('not', self.negation())
+        return self.primary()
+
+    def primary(self):
+        if self.peek() == ('sym', '('):
+            self.next()
+            inner = self.condition()
+            self.expect(')')
+            return inner
+
+        kind, value = self.peek()
+        if kind == 'word' and self.peek(1) == ('sym', '('):
+            name = value.lower()
+            if name in ('attribute_exists', 'attribute_not_exists'):
+                self.position += 2
+                argument = self.path()
+                self.expect(')')
+                return (name, argument)
+            if name in ('begins_with', 'contains'):
+                self.position += 2
+                argument = self.path()
+                self.expect(',')
+                operand = self.operand()
+                self.expect(')')
+                return (name, argument, operand)
+
+        left = self.operand()
+        if self.keyword('BETWEEN'):
+            low = self.operand()
+            if not self.keyword('AND'):
+                raise self.error()
+            return ('between', left, low, self.operand())
+        if self.keyword('IN'):
+            self.expect('(')
+            options = [self.operand()]
+            while self.peek() == ('sym', ','):
+                self.next()
+                options.append(self.operand())
+            self.expect(')')
+            return ('in', left, tuple(options))
+        kind, operator = self.next()
+        if kind != 'sym' or operator not in ('=', '<>', '<', '<=', '>', '>='):
+            raise self.error()
+        return ('compare', operator, left, self.operand())
+
+    # Update expressions
+
+    def update(self):
+        actions = []
+        while not self.done():
+            kind, value = self.next()
+            clause = value.upper() if kind == 'word' else None
+            if clause not in _CLAUSES:
+                raise self.error()
+            while True:
+                target = self.path()
+                if clause == 'SET':
+                    self.expect('=')
+                    actions.append(('SET', target, self.value_expression()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', target, None))
+                else:
+                    actions.append((clause, target, self.operand()))
+                if self.peek() == ('sym', ','):
+                    self.next()
+                    continue
+                break
+        return tuple(actions)
+
+
+@lru_cache(maxsize=512)
+def parse_condition(expression):
+    parser = _Parser(expression)
+    tree = parser.condition()
+    if not parser.done():
+        raise parser.error()
+    return tree
+
+
+@lru_cache(maxsize=512)
+def parse_update(expression):
+    return _Parser(expression).update()
+
+
+@lru_cache(maxsize=512)
+def parse_projection(expression):
+    parser = _Parser(expression)
+    paths = [parser.path()]
+    while parser.peek() == ('sym', ','):
+        parser.next()
+        paths.append(parser.path())
+    if not parser.done():
+        raise parser.error()
+    return tuple(paths)
+
+
+class _Context:
+    def __init__(self, names, values):
+        self.names = names or {}
+        self.values = {key: to_internal(value) for key, value in (values or {}).items()}
+
+    def name(self, name):
+        if name.startswith('#'):
+            if name not in self.names:
+                raise ClientError('ValidationException', f'Missing expression attribute name {name}')
+            return self.names[name]
+        return name
+
+    def value(self, placeholder):
+        if placeholder not in self.values:
+            raise ClientError('ValidationException', f'Missing expression attribute value {placeholder}')
+        return self.values[placeholder]
+
+    def resolve(self, path):
+        return tuple((kind, self.name(part) if kind == 'name' else part) for kind, part in path[1])
+
+    def get(self, item, path):
+        current = item
+        for kind, part in self.resolve(path):
+            if kind == 'name':
+                if not isinstance(current, dict) or part not in current:
+                    return _MISSING
+            elif not isinstance(current, list) or part >= len(current):
+                return _MISSING
+            current = current[part]
+        return current
+
+    def evaluate(self, item, node):
+        kind = node[0]
+        if kind == 'path':
+            return self.get(item, node)
+        if kind == 'value':
+            return self.value(node[1])
+        if kind == 'size':
+            value = self.get(item, node[1])
+            if value is _MISSING:
+                return _MISSING
+            return Decimal(len(value.encode()) if isinstance(value, str) else len(value))
+        if kind == 'if_not_exists':
+            value = self.get(item, node[1])
+            return self.evaluate(item, node[2]) if value is _MISSING else value
+        if kind == 'list_append':
+            return list(self.evaluate(item, node[1])) + list(self.evaluate(item, node[2]))
+        if kind == 'arith':
+            left = self.evaluate(item, node[2])
+            right = self.evaluate(item, node[3])
+            if not isinstance(left, Decimal) or not isinstance(right, Decimal):
+                raise ClientError('ValidationException', 'Arithmetic operands must be numbers')
+            return left + right if node[1] == '+' else left - right
+        raise ClientError('ValidationException', f'Unexpected operand {kind}')
+
+    def test(self, item, node):
+        kind = node[0]
+        if kind == 'and':
+            return self.test(item, node[1]) and self.test(item, node[2])
+        if kind == 'or':
+            return self.test(item, node[1]) or self.test(item, node[2])
+        if kind == 'not':
+            return not self.test(item, node[1])
+        if kind == 'attribute_exists':
+            return self.get(item, node[1]) is not _MISSING
+        if kind == 'attribute_not_exists':
+            return self.get(item, node[1]) is _MISSING
+        if kind == 'begins_with':
+            value = self.get(item, node[1])
+            prefix = self.evaluate(item, node[2])
+            return isinstance(value, str) and isinstance(prefix, str) and value.startswith(prefix)
+        if kind == 'contains':
+            value = self.get(item, node[1])
+            needle = self.evaluate(item, node[2])
+            try:
+                return value is not _MISSING and needle in value
+            except TypeError:
+                return False
+        if kind == 'between':
+            value = self.evaluate(item, node[1])
+            return (_compare('>=', value, self.evaluate(item, node[2]))
+                    and _compare('<=', value, self.evaluate(item, node[3])))
+        if kind == 'in':
+            value = self.evaluate(item, node[1])
+            return any(_compare('=', value, self.evaluate(item, option)) for option in node[2])
+        if kind == 'compare':
+            return _compare(node[1], self.evaluate(item, node[2]), self.evaluate(item, node[3]))
+        raise ClientError('ValidationException', f'Unexpected condition {kind}')
+
+    def set_path(self, item, path, value):
+        parts = self.resolve(path)
+        parent = item
+        for kind, part in parts[:-1]:
+            try:
+                parent = parent[part]
+            except (KeyError, IndexError, TypeError):
+                raise ClientError('ValidationException',
+                                  'The document path provided in the update expression is invalid for update')
+        kind, part = parts[-1]
+        if kind == 'index' and isinstance(parent, list) and part >= len(parent):
+            parent.append(value)
+        else:
+            parent[part] = value
+
+    def remove_path(self, item, path):
+        parts = self.resolve(path)
+        parent = item
+        for kind, part in parts[:-1]:
+            try:
+                parent = parent[part]
+            except (KeyError, IndexError, TypeError):
+                return
+        kind, part = parts[-1]
+        try:
+            del parent[part]
+        except (KeyError, IndexError, TypeError):
+            pass
+
+
+def _compare(operator, left, right):
+    if left is _MISSING or right is _MISSING:
+        return operator == '<>' and left is not right
+    if operator == '=':
+        return left == right
+    if operator == '<>':
+        return left != right
+    if type(left) is not type(right):
+        return False
+    if operator == '<':
+        return left < right
+    if operator == '<=':
+        return left <= right
+    if operator == '>':
+        return left > right
+    return left >= right
+
+
+def _project(item, projection, names):
+    if not projection:
+        return copy.deepcopy(item)
+    context = _Context(names, None)
+    result = {}
+    for path in parse_projection(projection):
+        value = context.get(item, path)
+        if value is not _MISSING:
+            context_parts = context.resolve(path)
+            if len(context_parts) == 1:
+                result[context_parts[0][1]] = copy.deepcopy(value)
+            else:
+                # Nested projections keep only the top-level attribute
+                top = context_parts[0][1]
+                result[top] = copy.deepcopy(item[top])
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Tables
+
+class _SortedKeys:
+    """Sorted partition -> [(range value, table key)] map for a table or index"""
+
+    def __init__(self, hash_key, range_key):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.partitions = {}
+
+    def entry(self, item, table_key):
+        if self.hash_key not in item or (self.range_key and self.range_key not in item):
+            return None, None
+        range_value = item[self.range_key] if self.range_key else None
+        return item[self.hash_key], (range_value, table_key)
+
+    def add(self, item, table_key):
+        partition, entry = self.entry(item, table_key)
+        if entry is not None:
+            bisect.insort(self.partitions.setdefault(partition, []), entry)
+
+    def remove(self, item, table_key):
+        partition, entry = self.entry(item, table_key)
+        if entry is None:
+            return
+        entries = self.partitions.get(partition, [])
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+            if not entries:
+                del self.partitions[partition]
+
+    def bulk_add(self, items_by_key):
+        for table_key, item in items_by_key:
+            partition, entry = self.entry(item, table_key)
+            if entry is not None:
+                self.partitions.setdefault(partition, []).append(entry)
+        for entries in self.partitions.values():
+            entries.sort()
+
+
+class MemoryTable:
+    def __init__(self, db, name, hash_key, range_key=None, indexes=None):
+        self._db = db
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.key_names = (hash_key, range_key) if range_key else (hash_key,)
+        self._items = {}
+        self._keys = []  # every table key, sorted, for scans
+        self._primary = _SortedKeys(hash_key, range_key)
+        self._indexes = {
+            index_name: _SortedKeys(index_hash, index_range)
+            for index_name, (index_hash, index_range) in (indexes or {}).items()
+        }
+
+    # Helpers
+
+    def _key_of(self, key):
+        try:
+            return tuple(to_internal(key[name]) for name in self.key_names)
+        except KeyError:
+            raise ClientError('ValidationException', 'The provided key element does not match the schema')
+
+    def _index_add(self, item, table_key):
+        bisect.insort(self._keys, table_key)
+        self._primary.add(item, table_key)
+        for index in self._indexes.values():
+            index.add(item, table_key)
+
+    def _index_remove(self, item, table_key):
+        position = bisect.bisect_left(self._keys, table_key)
+        if position < len(self._keys) and self._keys[position] == table_key:
+            del self._keys[position]
+        self._primary.remove(item, table_key)
+        for index in self._indexes.values():
+            index.remove(item, table_key)
+
+    def _store(self, table_key, item):
+        old = self._items.get(table_key)
+        if old is not None:
+            self._index_remove(old, table_key)
+        self._items[table_key] = item
+        self._index_add(item, table_key)
+        return old
+
+    def _check(self, item, condition, names, values, return_on_failure=None):
+        if not condition:
+            return
+        if not _Context(names, values).test(item or {}, parse_condition(condition)):
+            returned = item if return_on_failure == 'ALL_OLD' and item else None
+            raise ClientError('ConditionalCheckFailedException', 'The conditional request failed', returned)
+
+    def _capacity(self, kwargs, units, read=True):
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') == 'NONE':
+            return {}
+        return {'ConsumedCapacity': {'TableName': self.name, 'CapacityUnits': units}}
+
+    def load(self, items):
+        """Bulk-load items without per-item sorting (for seeding large tables)"""
+        loaded = []
+        for raw in items:
+            item = to_internal(raw)
+            table_key = self._key_of(item)
+            if table_key in self._items:
+                self._index_remove(self._items[table_key], table_key)
+            self._items[table_key] = item
+            loaded.append((table_key, item))
+        self._keys = sorted(self._items)
+        self._primary = _SortedKeys(self.hash_key, self.range_key)
+        self._primary.bulk_add(self._items.items())
+        for name, index in list(self._indexes.items()):
+            rebuilt = _SortedKeys(index.hash_key, index.range_key)
+            rebuilt.bulk_add(self._items.items())
+            self._indexes[name] = rebuilt
+        return len(loaded)
+
+    def item_count(self):
+        return len(self._items)
+
+    # Item API
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 ConsistentRead=False, **kwargs):
+        self._db._call('get_item')
+        with self._db._lock:
+            item = self._items.get(self._key_of(Key))
+            self._db._count(reads=1)
+            response = {}
+            if item is not None:
+                response['Item'] = _project(item, ProjectionExpression, ExpressionAttributeNames)
+            units = max(1, math.ceil(item_size(item) / 4096)) if item else 1
+            if not ConsistentRead:
+                units /= 2
+            response.update(self._capacity(kwargs, units))
+            return response
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues='NONE',
+                 ReturnValuesOnConditionCheckFailure='NONE', **kwargs):
+        self._db._call('put_item')
+        item = to_internal(Item)
+        table_key = self._key_of(item)
+        with self._db._lock:
+            old = self._items.get(table_key)
+            self._check(old, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, ReturnValuesOnConditionCheckFailure)
+            self._store(table_key, item)
+            self._db._count(writes=1)
+            response = {}
+            if ReturnValues == 'ALL_OLD' and old is not None:
+                response['Attributes'] = copy.deepcopy(old)
+            response.update(self._capacity(kwargs, max(1, math.ceil(item_size(item) / 1024)), read=False))
+            return response
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE',
+                    ReturnValuesOnConditionCheckFailure='NONE', **kwargs):
+        self._db._call('delete_item')
+        table_key = self._key_of(Key)
+        with self._db._lock:
+            old = self._items.get(table_key)
+            self._check(old, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, ReturnValuesOnConditionCheckFailure)
+            if old is not None:
+                del self._items[table_key]
+                self._index_remove(old, table_key)
+            self._db._count(writes=1)
+            response = {}
+            if ReturnValues == 'ALL_OLD' and old is not None:
+                response['Attributes'] = old
+            response.update(self._capacity(kwargs, 1, read=False))
+            return response
+
+    def update_item(self, Key, UpdateExpression=None, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ReturnValues='NONE', ReturnValuesOnConditionCheckFailure='NONE', **kwargs):
+        self._db._call('update_item')
+        table_key = self._key_of(Key)
+        with self._db._lock:
+            old = self._items.get(table_key)
+            self._check(old, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, ReturnValuesOnConditionCheckFailure)
+
+            context = _Context(ExpressionAttributeNames, ExpressionAttributeValues)
+            item = copy.deepcopy(old) if old is not None else {
+                name: value for name, value in zip(self.key_names, table_key)
+            }
+            touched = []
+            for action, path, operand in parse_update(UpdateExpression or ''):
+                touched.append(context.resolve(path)[0][1])
+                if action == 'SET':
+                    # Every operand is evaluated against the item before the update
+                    context.set_path(item, path, copy.deepcopy(context.evaluate(old or item, operand)))
+                elif action == 'REMOVE':
+                    context.remove_path(item, path)
+                elif action == 'ADD':
+                    value = context.evaluate(item, operand)
+                    current = context.get(item, path)
+                    if isinstance(value, set):
+                        context.set_path(item, path, (set() if current is _MISSING else set(current)) | value)
+                    else:
+                        context.set_path(item, path, (Decimal(0) if current is _MISSING else current) + value)
+                elif action == 'DELETE':
+                    current = context.get(item, path)
+                    if current is not _MISSING:
+                        remaining = set(current) - context.evaluate(item, operand)
+                        if remaining:
+                            context.set_path(item, path, remaining)
+                        else:
+                            context.remove_path(item, path)
+            if any(name in self.key_names for name in touched):
+                raise ClientError('ValidationException', 'Cannot update attribute that is part of the key')
+
+            self._store(table_key, item)
+            self._db._count(writes=1)
+
+            response = {}
+            if ReturnValues == 'ALL_NEW':
+                response['Attributes'] = copy.deepcopy(item)
+            elif ReturnValues == 'ALL_OLD' and old is not None:
+                response['Attributes'] = copy.deepcopy(old)
+            elif ReturnValues == 'UPDATED_NEW':
+                response['Attributes'] = {name: copy.deepcopy(item[name]) for name in touched if name in item}
+            elif ReturnValues == 'UPDATED_OLD' and old is not None:
+                response['Attributes'] = {name: copy.deepcopy(old[name]) for name in touched if name in old}
+            response.update(self._capacity(kwargs, max(1, math.ceil(item_size(item) / 1024)), read=False))
+            return response
+
+    # Query and scan
+
+    def query(self, KeyConditionExpression, IndexName=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, FilterExpression=None, ProjectionExpression=None,
+              ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, Select='ALL_ATTRIBUTES',
+              ConsistentRead=False, **kwargs):
+        self._db._call('query')
+        if not isinstance(KeyConditionExpression, str):
+            raise TypeError('MemoryTable only supports string key condition expressions')
+        sorted_keys = self._primary
+        if IndexName:
+            if IndexName not in self._indexes:
+                raise ClientError('ValidationException', f'The table does not have the specified index: {IndexName}')
+            sorted_keys = self._indexes[IndexName]
+
+        context = _Context(ExpressionAttributeNames, ExpressionAttributeValues)
+        partition, range_condition = self._key_condition(
+            context, parse_condition(KeyConditionExpression), sorted_keys)
+
+        with self._db._lock:
+            entries = sorted_keys.partitions.get(partition, [])
+            low, high = self._range_bounds(context, entries, range_condition)
+
+            if ExclusiveStartKey:
+                start = to_internal(ExclusiveStartKey)
+                range_value = start.get(sorted_keys.range_key) if sorted_keys.range_key else None
+                start_entry = (range_value, self._key_of(start))
+                if ScanIndexForward:
+                    low = max(low, bisect.bisect_right(entries, start_entry))
+                else:
+                    high = min(high, bisect.bisect_left(entries, start_entry))
+
+            positions = range(low, high) if ScanIndexForward else range(high - 1, low - 1, -1)
+            return self._page(entries, positions, sorted_keys, context, FilterExpression,
+                              ProjectionExpression, ExpressionAttributeNames, Limit, Select,
+                              ConsistentRead, kwargs)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None,
+             Segment=None, TotalSegments=None, Select='ALL_ATTRIBUTES', ConsistentRead=False,
+             IndexName=None, **kwargs):
+        self._db._call('scan')
+        if IndexName:
+            raise ClientError('ValidationException', 'MemoryTable does not support index scans')
+        context = _Context(ExpressionAttributeNames, ExpressionAttributeValues)
+        with self._db._lock:
+            keys = self._keys
+            low = 0
+            if ExclusiveStartKey:
+                low = bisect.bisect_right(keys, self._key_of(to_internal(ExclusiveStartKey)))
+            if TotalSegments:
+                segment_keys = [key for key in keys[low:] if _segment_of(key, TotalSegments) == Segment]
+                entries = [(None, key) for key in segment_keys]
+                positions = range(len(entries))
+            else:
+                entries = [(None, key) for key in keys]
+                positions = range(low, len(entries))
+            return self._page(entries, positions, self._primary, context, FilterExpression,
+                              ProjectionExpression, ExpressionAttributeNames, Limit, Select,
+                              ConsistentRead, kwargs)
+
+    def _key_condition(self, context, tree, sorted_keys):
+        conditions = [tree]
+        if tree[0] == 'and':
+            conditions = [tree[1], tree[2]]
+        partition = _MISSING
+        range_condition = None
+        for condition in conditions:
+            if (condition[0] == 'compare' and condition[1] == '=' and condition[2][0] == 'path'
+                    and context.resolve(condition[2])[0][1] == sorted_keys.hash_key):
+                partition = context.evaluate({}, condition[3])
+            else:
+                range_condition = condition
+        if partition is _MISSING:
+            raise ClientError('ValidationException', 'Query condition missed key schema element')
+        return partition, range_condition
+
+    def _range_bounds(self, context, entries, condition):
+        if condition is None:
+            return 0, len(entries)
+        kind = condition[0]
+
+        def bound(value, right):
+            search = bisect.bisect_right if right else bisect.bisect_left
+            return search(entries, value, key=lambda entry: entry[0])
+
+        if kind == 'between':
+            low = context.evaluate({}, condition[2])
+            high = context.evaluate({}, condition[3])
+            return bound(low, False), bound(high, True)
+        if kind == 'begins_with':
+            prefix = context.evaluate({}, condition[2])
+            low = bound(prefix, False)
+            high = low
+            while high < len(entries) and str(entries[high][0]).startswith(prefix):
+                high += 1
+            return low, high
+        if kind == 'compare':
+            operator = condition[1]
+            value = context.evaluate({}, condition[3])
+            if operator == '=':
+                return bound(value, False), bound(value, True)
+            if operator == '<':
+                return 0, bound(value, False)
+            if operator == '<=':
+                return 0, bound(value, True)
+            if operator == '>':
+                return bound(value, True), len(entries)
+            if operator == '>=':
+                return bound(value, False), len(entries)
+        raise ClientError('ValidationException', 'Unsupported key condition')
+
+    def _page(self, entries, positions, sorted_keys, context, filter_expression, projection,
+              names, limit, select, consistent, kwargs):
+        page_limit = min(limit or self._db.page_items, self._db.page_items)
+        filter_tree = parse_condition(filter_expression) if filter_expression else None
+        items = []
+        count = scanned = 0
+        size = 0
+        last = None
+        for position in positions:
+            if scanned == page_limit:
+                break
+            table_key = entries[position][1]
+            item = self._items[table_key]
+            scanned += 1
+            size += item_size(item)
+            last = item
+            if filter_tree is not None and not context.test(item, filter_tree):
+                continue
+            count += 1
+            if select != 'COUNT':
+                items.append(_project(item, projection, names))
+        else:
+            last = None
+
+        self._db._count(reads=scanned)
+        response = {'Count': count, 'ScannedCount': scanned}
+        if select != 'COUNT':
+            response['Items'] = items
+        if last is not None:
+            key_names = set(self.key_names) | {sorted_keys.hash_key}
+            if sorted_keys.range_key:
+                key_names.add(sorted_keys.range_key)
+            response['LastEvaluatedKey'] = {name: last[name] for name in key_names}
+        units = max(1, math.ceil(size / 4096))
+        response.update(self._capacity(kwargs, units if consistent else units / 2))
+        return response
+
+    def batch_writer(self):
+        return _BatchWriter(self)
+
+
+class _BatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+def _segment_of(key, total_segments):
+    return zlib.crc32(repr(key[0]).encode()) % total_segments
+
+
+# ---------------------------------------------------------------------------
+# Service resource
+
+class MemoryDynamoDB:
+    """Stand-in for boto3.resource('dynamodb').
+
+    latency:          seconds slept per API call
+    jitter:           extra random latency, uniform in [0, jitter) seconds
+    unprocessed_rate: fraction of batch_write_item puts returned unprocessed
+    page_items:       items per query/scan page
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, unprocessed_rate=0.0, page_items=DEFAULT_PAGE_ITEMS):
+        self.latency = latency
+        self.jitter = jitter
+        self.unprocessed_rate = unprocessed_rate
+        self.page_items = page_items
+        self.tables = {}
+        self._lock = threading.RLock()
+        self.reset_stats()
+
+    def create_table(self, name, hash_key, range_key=None, indexes=None):
+        """Create a table. `indexes` maps index name -> (hash key, range key or None)."""
+        self.tables[name] = MemoryTable(self, name, hash_key, range_key, indexes)
+        return self.tables[name]
+
+    def Table(self, name):
+        if name not in self.tables:
+            raise ClientError('ResourceNotFoundException', f'Requested resource not found: Table: {name} not found')
+        return self.tables[name]
+
+    def reset_stats(self):
+        self.stats = {'calls': {}, 'items_read': 0, 'items_written': 0}
+
+    def _call(self, operation):
+        with self._lock:
+            self.stats['calls'][operation] = self.stats['calls'].get(operation, 0) + 1
+        delay = self.latency + (random.random() * self.jitter if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def _count(self, reads=0, writes=0):
+        self.stats['items_read'] += reads
+        self.stats['items_written'] += writes
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._call('batch_write_item')
+        unprocessed = {}
+        consumed = []
+        for table_name, requests in RequestItems.items():
+            if len(requests) > 25:
+                raise ClientError('ValidationException', 'Too many items requested for the BatchWriteItem call')
+            table = self.Table(table_name)
+            for request in requests:
+                if self.unprocessed_rate and random.random() < self.unprocessed_rate:
+                    unprocessed.setdefault(table_name, []).append(request)
+                    continue
+                with self._lock:
+                    if 'PutRequest' in request:
+                        item = to_internal(request['PutRequest']['Item'])
+                        table._store(table._key_of(item), item)
+                    else:
+                        table_key = table._key_of(request['DeleteRequest']['Key'])
+                        old = table._items.pop(table_key, None)
+                        if old is not None:
+                            table._index_remove(old, table_key)
+                    self._count(writes=1)
+            written = len(requests) - len(unprocessed.get(table_name, []))
+            consumed.append({'TableName': table_name, 'CapacityUnits': written})
+        response = {'UnprocessedItems': unprocessed}
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = consumed
+        return response
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._call('batch_get_item')
+        responses = {}
+        consumed = []
+        for table_name, request in RequestItems.items():
+            if len(request['Keys']) > 100:
+                raise ClientError('ValidationException', 'Too many items requested for the BatchGetItem call')
+            table = self.Table(table_name)
+            found = []
+            with self._lock:
+                for key in request['Keys']:
+                    item = table._items.get(table._key_of(key))
+                    self._count(reads=1)
+                    if item is not None:
+                        found.append(_project(item, request.get('ProjectionExpression'),
+                                              request.get('ExpressionAttributeNames')))
+            responses[table_name] = found
+            consumed.append({'TableName': table_name, 'CapacityUnits': len(request['Keys']) / 2})
+        response = {'Responses': responses, 'UnprocessedKeys': {}}
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = consumed
+        return response
+
+
+def create_arcade_tables(db):
+    """Create every table the arcade backend uses, with its key schema and indexes"""
+    for name in ('GalagaScores', 'FlappyBirdScores', 'PacmanScores', 'SnakeScores'):
+        db.create_table(name, 'player_id', 'timestamp', indexes={'ScoreIndex': ('board', 'score')})
+    db.create_table('PongScores', 'game_id', indexes={'RecentIndex': ('created_day', 'created_at')})
+    db.create_table('ArcadeUsers', 'username')
+    db.create_table('PowerOfMathDatabase', 'ID')
+    return db
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+# Per-invocation metrics, written to stdout in CloudWatch's embedded metric
+# format (EMF): one JSON line per invocation, which CloudWatch Logs turns into
+# metrics under METRICS_NAMESPACE, dimensioned by function and action, so
+# p99s and capacity can be graphed per action. Locally the lines can simply
+# be captured from stdout.
+#
+# @instrument wraps a lambda_handler and times the whole invocation. While it
+# runs, api_codec reports the time spent parsing the request and serialising
+# responses, and aws_clients' tables report every DynamoDB call, requesting
+# ReturnConsumedCapacity so the read and write units it cost are counted.
+# DynamoDBTime is summed over calls, so reads fanned out across threads can
+# add up to more than the invocation's Duration.
+#
+# ARCADE_METRICS=off disables all of it: handlers are left unwrapped and
+# tables unmetered.
+METRICS_ENABLED = os.environ.get('ARCADE_METRICS', 'on').lower() not in ('0', 'off', 'false')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Arcade')
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+
+READ_OPERATIONS = frozenset(('get_item', 'query', 'scan', 'batch_get_item'))
+UNKNOWN_ACTION = 'unknown'
+
+METRIC_DEFINITIONS = [
+    {'Name': name, 'Unit': unit} for name, unit in (
+        ('Duration', 'Milliseconds'),
+        ('ParseTime', 'Milliseconds'),
+        ('DynamoDBTime', 'Milliseconds'),
+        ('SerializeTime', 'Milliseconds'),
+        ('DynamoDBCalls', 'Count'),
+        ('ReadCapacityUnits', 'Count'),
+        ('WriteCapacityUnits', 'Count'),
+        ('ColdStart', 'Count'),
+        ('Errors', 'Count'),
+    )
+]
+DIMENSIONS = [['Function', 'Action'], ['Function']]
+
+# The metric declarations are the same in every record; encode them once
+_CLOUDWATCH_METRICS = json.dumps([{
+    'Namespace': METRICS_NAMESPACE,
+    'Dimensions': DIMENSIONS,
+    'Metrics': METRIC_DEFINITIONS
+}], separators=(',', ':'))
+
+_lock = threading.Lock()
+_current = None
+_cold_start = True
+
+
+class Invocation:
+    """What one invocation has spent so far"""
+
+    def __init__(self, action_of, actions):
+        self.action_of = action_of
+        self.actions = actions
+        self.action = None
+        self.parse = 0.0
+        self.serialize = 0.0
+        self.dynamodb = 0.0
+        self.calls = 0
+        self.read_units = 0.0
+        self.write_units = 0.0
+
+
+def _request_action(fields):
+    return fields.get('action')
+
+
+def instrument(handler=None, *, action=None, actions=()):
+    """Decorate a lambda_handler to emit one EMF record per invocation.
+
+    `action` maps the parsed request fields to the Action dimension; by
+    default it is the request's "action" field. Only the handler's known
+    `actions` become dimension values; anything else a client sends is
+    recorded as UNKNOWN_ACTION, so requests cannot mint new metric series.
+    """
+    def decorate(handler):
+        if not METRICS_ENABLED:
+            return handler
+        function = FUNCTION_NAME or handler.__module__
+        known = frozenset(actions)
+
+        @wraps(handler)
+        def instrumented(event, context):
+            global _current, _cold_start
+            invocation = _current = Invocation(action or _request_action, known)
+            cold_start, _cold_start = _cold_start, False
+            start = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                _current = None
+                emit(function, invocation, time.perf_counter() - start, cold_start, response)
+        return instrumented
+
+    return decorate(handler) if handler is not None else decorate
+
+
+def record_parse(seconds, fields):
+    """Count request parsing time and note the request's action"""
+    invocation = _current
+    if invocation is not None:
+        invocation.parse += seconds
+        action = invocation.action_of(fields)
+        invocation.action = action if isinstance(action, str) and action in invocation.actions else None
+
+
+def record_serialize(seconds):
+    invocation = _current
+    if invocation is not None:
+        invocation.serialize += seconds
+
+
+def dynamodb_call(operation, method, kwargs):
+    """Call a DynamoDB method, counting its time and consumed capacity.
+
+    Outside an instrumented invocation the call is made exactly as given.
+    """
+    invocation = _current
+    if invocation is None:
+        return method(**kwargs)
+    kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    start = time.perf_counter()
+    response = None
+    try:
+        response = method(**kwargs)
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        consumed = (response or {}).get('ConsumedCapacity') or []
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        units = sum(float(entry.get('CapacityUnits', 0)) for entry in consumed)
+        with _lock:
+            invocation.dynamodb += elapsed
+            invocation.calls += 1
+            if operation in READ_OPERATIONS:
+                invocation.read_units += units
+            else:
+                invocation.write_units += units
+
+
+def emit(function, invocation, seconds, cold_start, response):
+    status_code = response.get('statusCode') if isinstance(response, dict) else None
+    values = {
+        'Function': function,
+        'Action': invocation.action or UNKNOWN_ACTION,
+        'Duration': round(seconds * 1000, 3),
+        'ParseTime': round(invocation.parse * 1000, 3),
+        'DynamoDBTime': round(invocation.dynamodb * 1000, 3),
+        'SerializeTime': round(invocation.serialize * 1000, 3),
+        'DynamoDBCalls': invocation.calls,
+        'ReadCapacityUnits': round(invocation.read_units, 2),
+        'WriteCapacityUnits': round(invocation.write_units, 2),
+        'ColdStart': 1 if cold_start else 0,
+        'Errors': 1 if status_code is None or status_code >= 500 else 0,
+        'StatusCode': status_code
+    }
+    print('{"_aws":{"Timestamp":%d,"CloudWatchMetrics":%s},%s' % (
+        int(time.time() * 1000), _CLOUDWATCH_METRICS, json.dumps(values, separators=(',', ':'))[1:]))
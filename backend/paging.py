@@ -0,0 +1,32 @@
+import base64
+import json
+
+# Paginated reads hand clients an opaque token to continue from: the JSON
+# state of where the page stopped (DynamoDB start keys and the like),
+# URL-safe base64 encoded. Tokens come back from clients, so each reader
+# still checks the fields it decodes before using them.
+
+
+def encode_token(payload):
+    """Opaque token for a JSON-serialisable dict"""
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_token(token):
+    """The dict inside a token from encode_token. Raises ValueError if malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError('Malformed token') from e
+    if not isinstance(payload, dict):
+        raise ValueError('Malformed token')
+    return payload
+
+
+def clamp_limit(limit, default, maximum):
+    """A requested page size as an int from 1 to `maximum`; `default` if it is not a number"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return max(1, min(limit, maximum))
@@ -0,0 +1,123 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+# Salted scrypt password hashes, stored as
+#   scrypt$<n>$<r>$<p>$<base64url salt>$<base64url key>
+#
+# The cost n is calibrated once per container: the first call to cost() times
+# a small scrypt run and picks the largest power of two whose hash fits in
+# PASSWORD_HASH_BUDGET_MS on this container's CPU, never below MIN_COST and
+# never needing more than a quarter of the function's memory. Lambda scales
+# CPU with memory size, so larger functions calibrate to stronger hashes.
+# PASSWORD_HASH_COST pins n instead (e.g. to keep every container alike).
+#
+# Stored values that are not scrypt hashes are legacy plaintext passwords.
+# verify() still accepts them, and reports them, like hashes below the
+# current cost, as needing a rehash; login writes the new hash in the update
+# it already makes. Hashes are only ever upgraded, so containers that
+# calibrate differently cannot undo each other's work.
+PASSWORD_HASH_BUDGET = float(os.environ.get('PASSWORD_HASH_BUDGET_MS', '50')) / 1000  # seconds
+PASSWORD_HASH_COST = int(os.environ.get('PASSWORD_HASH_COST', '0'))
+LAMBDA_MEMORY_MB = int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '1024'))
+
+SCHEME = 'scrypt'
+SCRYPT_R = 8
+SCRYPT_P = 1
+MIN_COST = 2 ** 14
+MAX_COST = 2 ** 20
+CALIBRATION_COST = 2 ** 12
+CALIBRATION_RUNS = 3
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_cost = None
+_dummy_hash = None
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _memory_needed(n, r):
+    """Bytes scrypt needs for cost n and block size r"""
+    return 128 * r * n
+
+
+def _derive(password, salt, n, r=SCRYPT_R, p=SCRYPT_P):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=2 * _memory_needed(n, r), dklen=KEY_BYTES)
+
+
+def calibrate(budget=PASSWORD_HASH_BUDGET, memory_mb=LAMBDA_MEMORY_MB):
+    """The largest power-of-two cost whose hash takes at most `budget` seconds here"""
+    elapsed = min(_time_hash(CALIBRATION_COST) for _ in range(CALIBRATION_RUNS))
+    memory_limit = memory_mb * 1024 * 1024 // 4
+    n = CALIBRATION_COST
+    # scrypt's time and memory both grow linearly with n
+    while (n * 2 <= MAX_COST and elapsed * (n * 2 // CALIBRATION_COST) <= budget
+           and _memory_needed(n * 2, SCRYPT_R) <= memory_limit):
+        n *= 2
+    return max(n, MIN_COST)
+
+
+def _time_hash(n):
+    start = time.perf_counter()
+    _derive('calibration', bytes(SALT_BYTES), n)
+    return time.perf_counter() - start
+
+
+def cost():
+    """The scrypt cost new hashes use in this container"""
+    global _cost
+    if _cost is None:
+        _cost = PASSWORD_HASH_COST or calibrate()
+    return _cost
+
+
+def hash_password(password, n=None):
+    """A new salted hash of `password` to store"""
+    n = n or cost()
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _derive(password, salt, n)
+    return '$'.join((SCHEME, str(n), str(SCRYPT_R), str(SCRYPT_P), _b64encode(salt), _b64encode(key)))
+
+
+def dummy_hash():
+    """A hash of a random password at cost(), made once per container.
+
+    Logins to unknown usernames verify against it, so they take as long as
+    a wrong password for a real user and do not reveal which names exist.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_urlsafe(SALT_BYTES))
+    return _dummy_hash
+
+
+def verify(password, stored):
+    """Return (matches, needs_rehash) for a login attempt against a stored password.
+
+    needs_rehash is only ever True for a matching password whose stored value
+    is plaintext or a hash cheaper than cost().
+    """
+    stored = str(stored)
+    if not stored.startswith(SCHEME + '$'):
+        matches = hmac.compare_digest(password.encode(), stored.encode())
+        return matches, matches
+    try:
+        _, n, r, p, salt, key = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        derived = _derive(password, _b64decode(salt), n, r, p)
+        key = _b64decode(key)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(derived, key)
+    return matches, matches and n < cost()
@@ -0,0 +1,125 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import player_shards
+from aws_clients import is_condition_failure
+
+# Daily and weekly top-K boards live in the score table under reserved
+# partitions, one item per window:
+#   __top_daily__   timestamp YYYYMMDD  (UTC day)
+#   __top_weekly__  timestamp YYYYWW    (ISO week)
+# Each item holds the window's best TOP_K entries, highest first, and a
+# version for optimistic concurrency. Saving a score rewrites a window only
+# when the score makes its top K, which drops the entry that falls to K+1;
+# reading a board is one get_item. Old windows carry expires_at (epoch
+# seconds) and are deleted by DynamoDB TTL, which must be enabled on every
+# score table with attribute name expires_at.
+PERIODS = {
+    'daily': {'partition': '__top_daily__', 'retention': timedelta(days=8)},
+    'weekly': {'partition': '__top_weekly__', 'retention': timedelta(weeks=5)},
+}
+TOP_K = 10
+MAX_WRITE_ATTEMPTS = 5
+
+# Lowest score on each full board seen by this container, keyed by table,
+# period and window. A window's cutoff only ever rises, so a cached value can
+# be stale but never too high: scores at or below it cannot qualify and need
+# no read at all.
+_cutoffs = {}
+
+
+def window_start(period, timestamp):
+    """UTC start of the window holding an epoch-millisecond timestamp"""
+    moment = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'weekly':
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def window_key(period, timestamp):
+    start = window_start(period, timestamp)
+    if period == 'weekly':
+        year, week, _ = start.isocalendar()
+        return year * 100 + week
+    return int(start.strftime('%Y%m%d'))
+
+
+def window_expiry(period, timestamp):
+    """Epoch seconds after which a window's item may be deleted"""
+    length = timedelta(weeks=1) if period == 'weekly' else timedelta(days=1)
+    return int((window_start(period, timestamp) + length + PERIODS[period]['retention']).timestamp())
+
+
+def board_key(period, key):
+    return {'player_id': PERIODS[period]['partition'], 'timestamp': key}
+
+
+def record_score(table, item, periods=PERIODS):
+    """Add a saved score item to the boards of `periods` (default daily and
+    weekly) it qualifies for"""
+    for period in periods:
+        key = window_key(period, item['timestamp'])
+        cutoff = _cutoffs.get((table.name, period, key))
+        if cutoff is not None and item['score'] <= cutoff:
+            continue
+        _record_in_window(table, period, key, item)
+
+
+def _record_in_window(table, period, key, item):
+    entry = {
+        'player_id': player_shards.display_id(item['player_id']),
+        'score': item['score'],
+        'timestamp': item['timestamp'],
+        'game_date': item['game_date']
+    }
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        board = table.get_item(Key=board_key(period, key), ConsistentRead=True).get('Item')
+        entries = board['entries'] if board else []
+        version = int(board['version']) if board else 0
+
+        if len(entries) >= TOP_K and item['score'] <= entries[-1]['score']:
+            _cutoffs[(table.name, period, key)] = int(entries[-1]['score'])
+            return
+        entries = sorted(entries + [entry], key=lambda e: (-e['score'], e['timestamp']))[:TOP_K]
+
+        try:
+            table.put_item(
+                Item=dict(board_key(period, key), entries=entries, version=version + 1,
+                          expires_at=window_expiry(period, item['timestamp'])),
+                ConditionExpression='attribute_not_exists(version) OR version = :v',
+                ExpressionAttributeValues={':v': version}
+            )
+        except Exception as e:
+            if is_condition_failure(e):
+                continue  # another save rewrote the board; re-read and retry
+            raise
+        if len(entries) >= TOP_K:
+            _cutoffs[(table.name, period, key)] = int(entries[-1]['score'])
+        return
+
+
+def get_board(table, period, date=None):
+    """Top entries, with ranks, of the window holding `date` (YYYY-MM-DD, default today).
+
+    Raises ValueError for a malformed date.
+    """
+    if date is None:
+        timestamp = int(time.time() * 1000)
+    else:
+        timestamp = int(datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+    key = window_key(period, timestamp)
+    board = table.get_item(Key=board_key(period, key)).get('Item') or {}
+    return {
+        'period': period,
+        'window': key,
+        'entries': [
+            {
+                'rank': index + 1,
+                'player_id': entry['player_id'],
+                'score': int(entry['score']),
+                'game_date': entry.get('game_date', '')
+            }
+            for index, entry in enumerate(board.get('entries', []))
+        ]
+    }
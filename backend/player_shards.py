@@ -0,0 +1,54 @@
+import sharding
+
+# Scores saved without a player id all belong to one player, 'anonymous',
+# which would put most unauthenticated traffic on a single partition key. Its
+# scores are instead spread over ANONYMOUS_SHARDS partitions, anonymous#0 ..
+# anonymous#N-1, picked by a hash of the score's timestamp (see sharding).
+# Reads for 'anonymous' gather every shard plus the unsharded partition
+# holding scores saved before sharding; everything shown to players uses the
+# plain 'anonymous' id.
+#
+# Player ids come from requests and share the score table's partition key
+# with its bookkeeping items (high score, rank counters, histograms, period
+# boards), which all live under '__' partitions and their '#' shards. Ids
+# that could name one of those, or a shard of any player, are refused, as are
+# ids that are not strings of 1 to MAX_PLAYER_ID_LENGTH characters.
+ANONYMOUS_PLAYER = 'anonymous'
+ANONYMOUS_SHARDS = 10
+RESERVED_PREFIX = '__'
+MAX_PLAYER_ID_LENGTH = 64
+
+
+def write_key(player_id, timestamp):
+    """Partition key a new score by `player_id` is saved under"""
+    if player_id != ANONYMOUS_PLAYER:
+        return player_id
+    return sharding.hashed_shard_key(ANONYMOUS_PLAYER, timestamp, ANONYMOUS_SHARDS)
+
+
+def validate_player_id(player_id):
+    """Raise ValueError for a player id that is malformed or could collide
+    with a reserved or sharded key"""
+    if (not isinstance(player_id, str) or not 0 < len(player_id) <= MAX_PLAYER_ID_LENGTH
+            or player_id.startswith(RESERVED_PREFIX) or sharding.SEPARATOR in player_id):
+        raise ValueError('Invalid player_id')
+
+
+def read_keys(player_id):
+    """Every partition key holding scores of `player_id`"""
+    if player_id != ANONYMOUS_PLAYER:
+        return [player_id]
+    return [ANONYMOUS_PLAYER] + sharding.shard_keys(ANONYMOUS_PLAYER, ANONYMOUS_SHARDS)
+
+
+def display_id(player_id):
+    """The player id to show for a (possibly sharded) partition key"""
+    if sharding.is_shard_of(ANONYMOUS_PLAYER, player_id):
+        return ANONYMOUS_PLAYER
+    return player_id
+
+
+def gather(player_id, read):
+    """Call read(key) for every partition key of `player_id` and return the
+    results in key order. Sharded players are read concurrently."""
+    return sharding.read_all(read, read_keys(player_id))
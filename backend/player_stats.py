@@ -0,0 +1,206 @@
+import paging
+import player_shards
+from aws_clients import condition_failure_item, is_condition_failure
+
+# Each player's running totals live in their own partition of the score table
+# under timestamp 0, which no saved game can have (real timestamps are epoch
+# milliseconds):
+#   games_played, total_score, best, best_timestamp, best_date,
+#   last_score, last_timestamp, last_played
+# Saving a score folds it into the summary with one conditional update (two
+# when it is a new personal best), so a player's stats cost a get_item for the
+# summary plus a query bounded to their own partition for recent games.
+# Sharded players (see player_shards) have one summary per shard, and their
+# reads merge every shard.
+SUMMARY_TIMESTAMP = 0
+
+# Attempts at folding a save into a summary that keeps changing underneath
+# (a concurrent new best or seed); each attempt is at most two updates.
+MAX_SUMMARY_ATTEMPTS = 5
+
+DEFAULT_HISTORY = 10
+MAX_HISTORY = 50
+
+
+def summary_key(player_id):
+    return {'player_id': player_id, 'timestamp': SUMMARY_TIMESTAMP}
+
+
+def record_games(table, items):
+    """Fold one player's newly saved score items into their summary.
+
+    `items` must share a partition key and be in save order. Players whose
+    scores predate summaries are seeded from their partition on first save.
+    Raises RuntimeError if the summary could not be updated in
+    MAX_SUMMARY_ATTEMPTS attempts.
+    """
+    player_id = items[0]['player_id']
+    best = max(items, key=lambda item: item['score'])
+    last = items[-1]
+    totals = 'ADD games_played :n, total_score :total SET last_score = :last, last_timestamp = :lt, last_played = :ld'
+    values = {
+        ':n': len(items),
+        ':total': sum(item['score'] for item in items),
+        ':last': last['score'],
+        ':lt': last['timestamp'],
+        ':ld': last['game_date'],
+        ':best': best['score']
+    }
+    for _ in range(MAX_SUMMARY_ATTEMPTS):
+        try:
+            table.update_item(
+                Key=summary_key(player_id),
+                UpdateExpression=totals,
+                ConditionExpression='best >= :best',
+                ExpressionAttributeValues=values,
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return
+        except Exception as e:
+            if not is_condition_failure(e):
+                raise
+            existing = condition_failure_item(e)
+            if existing is None:
+                existing = table.get_item(Key=summary_key(player_id), ConsistentRead=True).get('Item')
+
+        if existing is None:
+            # seed_summary reads strongly consistently, so it counts the
+            # items just saved and they must not be added again
+            if seed_summary(table, player_id) is not None:
+                return
+            continue
+
+        try:
+            table.update_item(
+                Key=summary_key(player_id),
+                UpdateExpression=totals + ', best = :best, best_timestamp = :bt, best_date = :bd',
+                ConditionExpression='best < :best',
+                ExpressionAttributeValues=dict(values, **{
+                    ':bt': best['timestamp'],
+                    ':bd': best['game_date']
+                })
+            )
+            return
+        except Exception as e:
+            if not is_condition_failure(e):
+                raise
+            # A better score landed in between; fold this one in as a non-best
+    raise RuntimeError(f'Summary of {player_id} not updated after {MAX_SUMMARY_ATTEMPTS} attempts')
+
+
+def query_games(table, player_id, **kwargs):
+    """Query a player's saved games (never their summary item)"""
+    return table.query(
+        KeyConditionExpression='player_id = :p AND #t > :summary',
+        ExpressionAttributeNames={'#t': 'timestamp'},
+        ExpressionAttributeValues={':p': player_id, ':summary': SUMMARY_TIMESTAMP},
+        **kwargs
+    )
+
+
+def seed_summary(table, player_id):
+    """Build a summary from every saved game of a player who has none yet.
+
+    Returns the summary, None if the player has no games or another writer
+    created the summary first. The query is strongly consistent so the seed
+    includes games saved just before it.
+    """
+    summary = None
+    query_kwargs = {'ConsistentRead': True}
+    while True:
+        response = query_games(table, player_id, **query_kwargs)
+        for item in response.get('Items', []):
+            score = int(item.get('score', 0))
+            if summary is None:
+                summary = dict(summary_key(player_id), games_played=0, total_score=0, best=score,
+                               best_timestamp=item['timestamp'], best_date=item.get('game_date', ''))
+            summary['games_played'] += 1
+            summary['total_score'] += score
+            if score > summary['best']:
+                summary.update(best=score, best_timestamp=item['timestamp'],
+                               best_date=item.get('game_date', ''))
+            summary.update(last_score=score, last_timestamp=item['timestamp'],
+                           last_played=item.get('game_date', ''))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if summary is None:
+        return None
+    try:
+        table.put_item(Item=summary, ConditionExpression='attribute_not_exists(player_id)')
+    except Exception as e:
+        if is_condition_failure(e):
+            return None
+        raise
+    return summary
+
+
+def read_summary(table, player_id):
+    """A player's summary item, seeding it if needed, or None if they have no games"""
+    item = table.get_item(Key=summary_key(player_id)).get('Item')
+    if item is None:
+        item = seed_summary(table, player_id)
+        if item is None:
+            item = table.get_item(Key=summary_key(player_id)).get('Item')
+    return item
+
+
+def merge_summaries(summaries):
+    """Combine the summaries of a sharded player's partitions into one"""
+    summaries = [summary for summary in summaries if summary]
+    if not summaries:
+        return None
+    best = max(summaries, key=lambda summary: summary.get('best', 0))
+    last = max(summaries, key=lambda summary: summary.get('last_timestamp', 0))
+    return {
+        'games_played': sum(summary.get('games_played', 0) for summary in summaries),
+        'total_score': sum(summary.get('total_score', 0) for summary in summaries),
+        'best': best.get('best', 0),
+        'best_date': best.get('best_date', ''),
+        'last_played': last.get('last_played', '')
+    }
+
+
+def read_player_summary(table, player_id):
+    """A player's summary across all of their partitions, or None without games"""
+    return merge_summaries(player_shards.gather(player_id, lambda key: read_summary(table, key)))
+
+
+def get_best(table, player_id):
+    """A player's best saved score, or None if they have no games"""
+    summary = read_player_summary(table, player_id)
+    return int(summary['best']) if summary and 'best' in summary else None
+
+
+def get_history(table, player_id, limit=DEFAULT_HISTORY):
+    """A player's most recent saved games, newest first"""
+    limit = paging.clamp_limit(limit, DEFAULT_HISTORY, MAX_HISTORY)
+    pages = player_shards.gather(player_id, lambda key: query_games(
+        table, key, ScanIndexForward=False, Limit=limit).get('Items', []))
+    items = sorted((item for page in pages for item in page),
+                   key=lambda item: item['timestamp'], reverse=True)[:limit]
+    return [
+        {'score': int(item.get('score', 0)), 'timestamp': int(item['timestamp']),
+         'game_date': item.get('game_date', '')}
+        for item in items
+    ]
+
+
+def get_stats(table, player_id, limit=DEFAULT_HISTORY):
+    """Personal best, games played, average and recent games for one player"""
+    summary = read_player_summary(table, player_id)
+    if summary is None:
+        return {'player_id': player_id, 'games_played': 0, 'best': 0, 'average': 0, 'recent': []}
+
+    games_played = int(summary.get('games_played', 0))
+    total_score = int(summary.get('total_score', 0))
+    return {
+        'player_id': player_id,
+        'games_played': games_played,
+        'best': int(summary.get('best', 0)),
+        'best_date': summary.get('best_date', ''),
+        'average': round(total_score / games_played, 2) if games_played else 0,
+        'last_played': summary.get('last_played', ''),
+        'recent': get_history(table, player_id, limit)
+    }
@@ -0,0 +1,121 @@
+import sys
+from datetime import datetime, timedelta
+
+import paging
+
+# Every match row carries created_day = the UTC date of created_at, which puts
+# it in a time-bucketed global secondary index:
+#   RecentIndex: created_day (HASH, S) + created_at (RANGE, S), projection ALL
+# "Recent games" reads today's bucket newest-first and walks back a day at a
+# time until the page is full, so a page costs at most LOOKBACK_DAYS queries no
+# matter how large the table grows.
+RECENT_INDEX = 'RecentIndex'
+CURSOR_KEY_FIELDS = ('game_id', 'created_day', 'created_at')  # a RecentIndex LastEvaluatedKey
+LOOKBACK_DAYS = 30
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def created_day(created_at):
+    """Bucket key for an ISO-8601 created_at timestamp"""
+    return created_at[:10]
+
+
+def encode_cursor(day, last_key):
+    return paging.encode_token({'day': day, 'key': last_key})
+
+
+def decode_cursor(cursor):
+    """Return (day, ExclusiveStartKey or None). Raises ValueError if malformed."""
+    try:
+        payload = paging.decode_token(cursor)
+        day, key = payload['day'], payload.get('key')
+        datetime.strptime(day, '%Y-%m-%d')
+        if key is not None and (set(key) != set(CURSOR_KEY_FIELDS)
+                                or not all(isinstance(value, str) for value in key.values())):
+            raise ValueError('Bad start key')
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    return day, key
+
+
+def previous_day(day):
+    return (datetime.strptime(day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def get_recent(table, limit=DEFAULT_LIMIT, cursor=None):
+    """Return up to `limit` matches, newest first, and a cursor for older ones.
+
+    Raises ValueError for a malformed cursor.
+    """
+    limit = paging.clamp_limit(limit, DEFAULT_LIMIT, MAX_LIMIT)
+    if cursor:
+        day, start_key = decode_cursor(cursor)
+    else:
+        day, start_key = datetime.utcnow().strftime('%Y-%m-%d'), None
+
+    games = []
+    days_checked = 0
+    while len(games) < limit and days_checked < LOOKBACK_DAYS:
+        query_kwargs = {
+            'IndexName': RECENT_INDEX,
+            'KeyConditionExpression': 'created_day = :d',
+            'ExpressionAttributeValues': {':d': day},
+            'ScanIndexForward': False,
+            'Limit': limit - len(games)
+        }
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        response = table.query(**query_kwargs)
+        games.extend(response.get('Items', []))
+
+        if 'LastEvaluatedKey' in response:
+            start_key = response['LastEvaluatedKey']
+        else:
+            day, start_key = previous_day(day), None
+            days_checked += 1
+
+    # A full page may have older games behind it; a short page means the
+    # lookback window ran out
+    next_cursor = encode_cursor(day, start_key) if len(games) == limit else None
+    return games, next_cursor
+
+
+def backfill(table):
+    """Add created_day to matches saved before the index existed. Safe to re-run."""
+    updated = 0
+    scan_kwargs = {
+        'FilterExpression': 'attribute_not_exists(created_day) AND attribute_exists(created_at)'
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            table.update_item(
+                Key={'game_id': item['game_id']},
+                UpdateExpression='SET created_day = :d',
+                ExpressionAttributeValues={':d': created_day(item['created_at'])}
+            )
+            updated += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return updated
+
+
+def main(argv=None):
+    import argparse
+
+    import aws_clients
+    from score_service import GAMES
+
+    parser = argparse.ArgumentParser(description='Add created_day to a match game\'s existing matches')
+    parser.add_argument('game', choices=sorted(game for game, config in GAMES.items() if config.get('matches')))
+    args = parser.parse_args(argv)
+
+    updated = backfill(aws_clients.table(GAMES[args.game]['table']))
+    print(f'Updated {updated} matches', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Export a game's saved scores as NDJSON or CSV.
+
+Items are read with paginated scans and written out one row at a time, so
+memory stays constant however large the table is. An export can be split
+across parallel scan segments and across invocations: every chunk ends with
+a resume token that picks up after the last exported row.
+
+    python backend/score_export.py snake --format csv > snake.csv
+    python backend/score_export.py pacman --segments 4 --output pacman.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import queue
+import sys
+import threading
+import time
+from decimal import Decimal
+
+import paging
+import player_shards
+from score_index import is_reserved_item
+
+FORMATS = ('ndjson', 'csv')
+SCAN_PAGE_SIZE = 500
+
+DEFAULT_CHUNK_ROWS = 1000
+MAX_CHUNK_ROWS = 5000
+CHUNK_TIME_BUDGET = 20  # seconds; leaves headroom under the API Gateway timeout
+
+MATCH_COLUMNS = ('game_id', 'created_at', 'updated_at', 'player_score', 'ai_score', 'result')
+SCORE_COLUMNS = ('player_id', 'timestamp', 'score', 'game_date')
+
+
+def key_names_for(game_config):
+    """Primary key attributes of a game's table"""
+    return ('game_id',) if game_config.get('matches') else ('player_id', 'timestamp')
+
+
+def columns_for(game_config):
+    """CSV columns for a game's rows, from its GAMES registry entry"""
+    if game_config.get('matches'):
+        return MATCH_COLUMNS
+    return SCORE_COLUMNS + tuple(game_config['extra_fields']) + ('verified',)
+
+
+def encode_resume_token(segment, total_segments, last_key):
+    return paging.encode_token({'segment': segment, 'segments': total_segments, 'key': to_json_value(last_key)})
+
+
+def decode_resume_token(token):
+    """Return (segment, total_segments, last_key). Raises ValueError if malformed."""
+    try:
+        payload = paging.decode_token(token)
+        return int(payload['segment']), int(payload['segments']), payload['key']
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid resume token') from e
+
+
+def to_json_value(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, set):
+        return sorted(to_json_value(item) for item in value)
+    return value
+
+
+def export_row(item):
+    row = to_json_value(item)
+    row.pop('board', None)  # leaderboard index key, not score data
+    if 'player_id' in row:
+        row['player_id'] = player_shards.display_id(row['player_id'])
+    return row
+
+
+def iter_items(table, key_names, segment=0, total_segments=1, start_key=None):
+    """Yield (item, key) for every saved score or match in one scan segment.
+
+    `key` is the item's primary key; passing it back as `start_key` resumes the
+    scan right after that item.
+    """
+    scan_kwargs = {'Limit': SCAN_PAGE_SIZE}
+    if total_segments > 1:
+        scan_kwargs.update(Segment=segment, TotalSegments=total_segments)
+    if start_key:
+        scan_kwargs['ExclusiveStartKey'] = start_key
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if is_reserved_item(item):
+                continue
+            yield item, {name: item[name] for name in key_names}
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+class RowWriter:
+    """Formats rows as NDJSON lines or CSV records"""
+
+    def __init__(self, fmt, columns):
+        self.fmt = fmt
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._csv = csv.DictWriter(self._buffer, fieldnames=columns, extrasaction='ignore')
+
+    def header(self):
+        if self.fmt != 'csv':
+            return ''
+        self._csv.writeheader()
+        return self._take()
+
+    def row(self, item):
+        row = export_row(item)
+        if self.fmt == 'ndjson':
+            return json.dumps(row, separators=(',', ':')) + '\n'
+        self._csv.writerow(row)
+        return self._take()
+
+    def _take(self):
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+
+def export_chunk(table, key_names, fmt, columns, resume_token=None, segment=0, total_segments=1,
+                 max_rows=DEFAULT_CHUNK_ROWS, time_budget=CHUNK_TIME_BUDGET):
+    """Export up to `max_rows` rows of one segment within `time_budget` seconds.
+
+    Returns {'data', 'rows', 'resume_token'}; resume_token is None once the
+    segment is exhausted. The CSV header is only written by a segment's
+    first chunk.
+    """
+    start_key = None
+    if resume_token:
+        segment, total_segments, start_key = decode_resume_token(resume_token)
+    if total_segments < 1 or not 0 <= segment < total_segments:
+        raise ValueError('segment must be between 0 and segments - 1')
+
+    writer = RowWriter(fmt, columns)
+    parts = [] if start_key else [writer.header()]
+    rows = 0
+    deadline = time.monotonic() + time_budget
+    last_key = None
+    for item, key in iter_items(table, key_names, segment, total_segments, start_key):
+        parts.append(writer.row(item))
+        rows += 1
+        last_key = key
+        if rows >= max_rows or time.monotonic() >= deadline:
+            return {
+                'data': ''.join(parts),
+                'rows': rows,
+                'resume_token': encode_resume_token(segment, total_segments, last_key)
+            }
+    return {'data': ''.join(parts), 'rows': rows, 'resume_token': None}
+
+
+def stream(table, key_names, fmt, columns, out, segments=1):
+    """Write every row to `out`, scanning `segments` segments in parallel.
+
+    Segments hand rows to the writer through a bounded queue, so memory stays
+    constant however many rows there are. Returns the number of rows written.
+    """
+    writer = RowWriter(fmt, columns)
+    out.write(writer.header())
+    if segments == 1:
+        rows = 0
+        for item, _ in iter_items(table, key_names):
+            out.write(writer.row(item))
+            rows += 1
+        return rows
+
+    rows_queue = queue.Queue(maxsize=SCAN_PAGE_SIZE * segments)
+    done = object()
+    errors = []
+
+    def scan_segment(segment):
+        try:
+            for item, _ in iter_items(table, key_names, segment, segments):
+                rows_queue.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            rows_queue.put(done)
+
+    threads = [threading.Thread(target=scan_segment, args=(segment,), daemon=True)
+               for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    rows = 0
+    finished = 0
+    while finished < segments:
+        item = rows_queue.get()
+        if item is done:
+            finished += 1
+            continue
+        out.write(writer.row(item))
+        rows += 1
+    if errors:
+        raise errors[0]
+    return rows
+
+
+def main(argv=None):
+    import aws_clients
+    from score_service import GAMES
+
+    parser = argparse.ArgumentParser(description='Export a game\'s scores as NDJSON or CSV')
+    parser.add_argument('game', choices=sorted(GAMES))
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--segments', type=int, default=1, help='parallel scan segments')
+    parser.add_argument('--output', help='file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    config = GAMES[args.game]
+    table = aws_clients.table(config['table'])
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        rows = stream(table, key_names_for(config), args.format, columns_for(config), out, max(1, args.segments))
+    finally:
+        if args.output:
+            out.close()
+    print(f'Exported {rows} rows', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import math
+import time
+
+import counter_shards
+
+# Score distributions are kept as fixed log-scale histograms in the score
+# table itself, under a reserved partition:
+#   timestamp 0         all-time histogram
+#   timestamp YYYYMMDD  histogram of the scores saved that UTC day
+# Each item holds score_count, score_total and one counter per non-empty
+# bucket (b0, b1, ...). Bucket 0 holds scores <= 0; bucket k >= 1 holds
+# scores in [2 ** ((k - 1) / 4), 2 ** (k / 4)), so every bucket spans about
+# 19% of its lower bound. Saving a score bumps two items with ADD, and a
+# distribution read is one batch read no matter how many scores there are.
+# Every save in a game bumps the same all-time item, so each histogram is
+# sharded (see counter_shards) and reads add the shards up.
+HISTOGRAM_PARTITION = '__histogram__'
+ALL_TIME = 0
+BUCKETS_PER_DOUBLING = 4
+PERCENTILES = (50, 90, 99)
+
+
+def bucket_for(score):
+    if score <= 0:
+        return 0
+    return 1 + int(math.floor(math.log2(score) * BUCKETS_PER_DOUBLING))
+
+
+def bucket_bounds(bucket):
+    """[lower, upper) score range of a bucket"""
+    if bucket == 0:
+        return 0, 1
+    return 2 ** ((bucket - 1) / BUCKETS_PER_DOUBLING), 2 ** (bucket / BUCKETS_PER_DOUBLING)
+
+
+def day_key(timestamp):
+    """Histogram timestamp (YYYYMMDD) for an epoch-millisecond score timestamp"""
+    return int(time.strftime('%Y%m%d', time.gmtime(timestamp / 1000)))
+
+
+def parse_day(day):
+    """Histogram timestamp for a 'YYYY-MM-DD' string. Raises ValueError."""
+    return int(time.strftime('%Y%m%d', time.strptime(day, '%Y-%m-%d')))
+
+
+def histogram_counts(items):
+    """{(partition, timestamp): {attribute: count}} to add for saved score items"""
+    histograms = {}
+    for item in items:
+        bucket = f'b{bucket_for(item["score"])}'
+        for key in (ALL_TIME, day_key(item['timestamp'])):
+            counts = histograms.setdefault((HISTOGRAM_PARTITION, key), {'score_count': 0, 'score_total': 0})
+            counts['score_count'] += 1
+            counts['score_total'] += item['score']
+            counts[bucket] = counts.get(bucket, 0) + 1
+    return histograms
+
+
+def record_scores(table, items):
+    """Count saved score items in the all-time and per-day histograms"""
+    for (partition, key), counts in histogram_counts(items).items():
+        counter_shards.add(table, partition, key, counts)
+
+
+def percentile(buckets, count, fraction):
+    """Approximate score at `fraction` of the distribution, interpolated within its bucket"""
+    target = fraction * count
+    seen = 0
+    for bucket, bucket_count in buckets:
+        if seen + bucket_count >= target:
+            lower, upper = bucket_bounds(bucket)
+            return round(lower + (upper - lower) * (target - seen) / bucket_count, 2)
+        seen += bucket_count
+    return round(bucket_bounds(buckets[-1][0])[1], 2) if buckets else 0
+
+
+def get_distribution(table, key=ALL_TIME):
+    """Counts, mean and approximate percentiles for all time or one UTC day
+    (`key` from parse_day)"""
+    item = counter_shards.read(table, [(HISTOGRAM_PARTITION, key)])[(HISTOGRAM_PARTITION, key)]
+
+    count = int(item.get('score_count', 0))
+    buckets = sorted(
+        (int(name[1:]), int(value)) for name, value in item.items()
+        if name[0] == 'b' and name[1:].isdigit() and value
+    )
+    distribution = {
+        'count': count,
+        'mean': round(int(item.get('score_total', 0)) / count, 2) if count else 0,
+        'buckets': [
+            {'min': math.ceil(lower), 'max': math.ceil(upper) - 1, 'count': bucket_count}
+            for (lower, upper), bucket_count in ((bucket_bounds(b), c) for b, c in buckets)
+        ]
+    }
+    for p in PERCENTILES:
+        distribution[f'p{p}'] = percentile(buckets, count, p / 100) if count else 0
+    return distribution
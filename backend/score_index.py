@@ -0,0 +1,114 @@
+import sys
+
+import player_shards
+from aws_clients import is_condition_failure
+
+# The best score for a game lives in its own score table under a reserved key.
+# Real games always have an epoch-millisecond timestamp, so timestamp 0 can
+# never collide with a saved score. Saves keep the record current with one
+# conditional update; a table that already held scores when the record was
+# introduced is seeded once by the backfill, `python backend/score_index.py
+# <game>`, rather than by scanning it inside a request.
+HIGH_SCORE_KEY = {'player_id': '__high_score__', 'timestamp': 0}
+
+
+def is_reserved_item(item):
+    """True for bookkeeping items that are not real saved games.
+
+    That is anything under a reserved '__' player id, and the per-player
+    summaries kept at timestamp 0.
+    """
+    return str(item.get('player_id', '')).startswith('__') or item.get('timestamp') == 0
+
+
+def update_high_score(table, player_id, score, timestamp, game_date):
+    """Replace the high-score record only if `score` beats it, creating the
+    record if the table has none yet.
+
+    Returns True when the record now holds this score, False when the current
+    high score is equal or better. Tables holding scores saved before the
+    record existed need `backfill` run once; until then the first save takes
+    the record whatever the older scores were.
+    """
+    try:
+        _set_high_score(table, player_id, score, timestamp, game_date, 'attribute_not_exists(score) OR score < :s')
+        return True
+    except Exception as e:
+        if is_condition_failure(e):
+            return False
+        raise
+
+
+def _set_high_score(table, player_id, score, timestamp, game_date, condition):
+    table.update_item(
+        Key=HIGH_SCORE_KEY,
+        UpdateExpression='SET score = :s, holder_id = :p, holder_timestamp = :t, game_date = :d',
+        ConditionExpression=condition,
+        ExpressionAttributeValues={
+            ':s': score,
+            ':p': player_id,
+            ':t': timestamp,
+            ':d': game_date
+        }
+    )
+
+
+def read_high_score(table):
+    """Return {'score', 'player_id', 'game_date'} for the best score, or None"""
+    item = table.get_item(Key=HIGH_SCORE_KEY).get('Item')
+    if not item or 'score' not in item:
+        return None
+    return {
+        'score': int(item['score']),
+        'player_id': item.get('holder_id', 'unknown'),
+        'game_date': item.get('game_date', '')
+    }
+
+
+def backfill(table):
+    """Seed the high-score record from scores saved before it existed.
+
+    Scans the whole table once (following every page) and returns the best
+    score found, or None for a table without scores. Safe to re-run: the
+    record is only replaced by a better score.
+    """
+    best = None
+    scan_kwargs = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for candidate in response.get('Items', []):
+            if is_reserved_item(candidate):
+                continue
+            if best is None or int(candidate.get('score', 0)) > int(best.get('score', 0)):
+                best = candidate
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if best is not None:
+        update_high_score(table, player_shards.display_id(best['player_id']), int(best.get('score', 0)),
+                          best['timestamp'], best.get('game_date', ''))
+    return best
+
+
+def main(argv=None):
+    import argparse
+
+    import aws_clients
+    from score_service import GAMES
+
+    parser = argparse.ArgumentParser(description='Seed a game\'s high-score record from its existing scores')
+    parser.add_argument('game', choices=sorted(game for game, config in GAMES.items() if not config.get('matches')))
+    args = parser.parse_args(argv)
+
+    table = aws_clients.table(GAMES[args.game]['table'])
+    best = backfill(table)
+    if best is None:
+        print('No scores found', file=sys.stderr)
+    else:
+        print(f'Best existing score {int(best.get("score", 0))}; high score is now {read_high_score(table)["score"]}',
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,866 @@
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from time import gmtime, strftime
+
+import api_codec
+import aws_clients
+import counter_shards
+import leaderboard
+import metrics
+import paging
+import period_leaderboards
+import player_shards
+import player_stats
+import recent_games
+import score_histogram
+import session_tokens
+import structured_logging as log
+from score_index import update_high_score, read_high_score
+
+# Per-game schema registry.
+#   table:        DynamoDB table holding the game's scores
+#   extra_fields: additional integer fields saved with each score, with defaults
+#   matches:      True for games stored as one row per match (Pong) rather than
+#                 one row per score keyed by player_id + timestamp
+GAMES = {
+    'galaga': {
+        'table': 'GalagaScores',
+        'extra_fields': {}
+    },
+    'flappy_bird': {
+        'table': 'FlappyBirdScores',
+        'extra_fields': {}
+    },
+    'pacman': {
+        'table': 'PacmanScores',
+        'extra_fields': {}
+    },
+    'snake': {
+        'table': 'SnakeScores',
+        'extra_fields': {'snake_length': 0}
+    },
+    'pong': {
+        'table': 'PongScores',
+        'matches': True
+    }
+}
+
+SCORE_ACTIONS = ('save_score', 'save_scores', 'get_high_score', 'get_leaderboard', 'get_player_stats',
+                 'get_score_distribution', 'export_scores')
+MATCH_ACTIONS = ('record_game', 'start_game', 'save_score', 'get_recent_games', 'export_scores')
+# Every action any score lambda answers, for the metrics Action dimension
+KNOWN_ACTIONS = SCORE_ACTIONS + MATCH_ACTIONS + ('get_hub_summary',)
+
+# Scores and their extra fields are whole numbers from 0 to MAX_SCORE. The cap
+# keeps them well inside what every JSON encoder and the rank counters handle
+# (the top rank level holds one counter per 10,000 points).
+MAX_SCORE = 10 ** 8 - 1
+
+# record_game upserts a match by a client-generated ID, so a retried request
+# lands on the same row instead of creating another one.
+GAME_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+MATCH_RESULTS = ('IN_PROGRESS', 'WIN', 'LOSS')
+
+# In-progress match updates that carry a sequence number ("seq") are coalesced:
+# a container persists at most one IN_PROGRESS state per match every
+# MATCH_FLUSH_WINDOW seconds and acknowledges the ones in between without a
+# write, keeping the latest as pending. Each update carries the full score, so
+# the next persisted state supersedes the skipped ones; a pending state whose
+# window has passed is written by the container's next record_game request
+# (at most MAX_FLUSHES_PER_REQUEST per request). WIN and LOSS always write
+# immediately, the container remembers the match as finished so later
+# in-progress updates get 409, and the stored seq rejects stale or
+# out-of-order writes from any container.
+MATCH_FLUSH_WINDOW = 5  # seconds
+MAX_TRACKED_MATCHES = 1000
+MAX_FLUSHES_PER_REQUEST = 5
+_match_flushes = {}
+
+# get_hub_summary reads every game's high score, the caller's personal bests
+# and their campaign progress concurrently. Reads still running after
+# HUB_READ_TIMEOUT are reported as unavailable rather than holding up the
+# rest of the summary. A running read cannot be cancelled, so each summary
+# gets its own threads: a read stuck on a slow table only finishes (or hits
+# the DynamoDB client's own timeouts, see aws_clients) in the background,
+# instead of occupying a shared worker later invocations would queue behind.
+USERS_TABLE = 'ArcadeUsers'
+HUB_READ_TIMEOUT = 2  # seconds
+
+# Saving scores also updates everything derived from them: the high-score
+# record, the rank and histogram counters, the daily and weekly boards and
+# each player's summary. Those updates touch different items, so they run
+# concurrently on a pool shared by warm invocations and a save waits for all
+# of them. The scores are stored before any of it starts, so a failed update
+# is logged and the save still succeeds; failing it would have the client
+# retry and store the score twice.
+INDEX_MAX_WORKERS = 16
+_index_pool = None
+
+# save_scores limits. DynamoDB accepts at most 25 puts per BatchWriteItem call;
+# anything it leaves unprocessed is retried with exponential backoff.
+MAX_BATCH_RECORDS = 500
+BATCH_WRITE_CHUNK = 25
+MAX_BATCH_RETRIES = 5
+BATCH_RETRY_BASE_DELAY = 0.05  # seconds
+
+# Current best score per game, shared by warm invocations of this container.
+# Entries expire after HIGH_SCORE_CACHE_TTL seconds so scores saved through
+# other containers show up quickly; scores saved here are written through.
+HIGH_SCORE_CACHE_TTL = 30
+_high_score_cache = {}
+_high_score_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_table(game):
+    return aws_clients.table(GAMES[game]['table'])
+
+
+@metrics.instrument(actions=KNOWN_ACTIONS)
+def lambda_handler(event, context):
+    """Single entry point for every game; routes on the 'game' field"""
+    try:
+        body = parse_body(event)
+    except api_codec.BodyError as e:
+        return create_response(e.status_code, {'error': str(e)})
+    return dispatch(body.get('game'), body)
+
+
+def handle_game_event(game, event):
+    """Entry point for the per-game lambdas, which already know their game"""
+    try:
+        body = parse_body(event)
+    except api_codec.BodyError as e:
+        return create_response(e.status_code, {'error': str(e)})
+    return dispatch(game, body)
+
+
+def parse_body(event):
+    log.debug("Received event", event=event)
+    return api_codec.parse_body(event)
+
+
+def dispatch(game, body):
+    # The hub summary covers every game, so any score lambda can serve it
+    if body.get('action') == 'get_hub_summary':
+        log.info("Request", action='get_hub_summary')
+        return get_hub_summary(body)
+
+    if game not in GAMES:
+        return create_response(400, {
+            'error': 'Unknown game. Use one of: ' + ', '.join(sorted(GAMES)) +
+                     ', or the "get_hub_summary" action'
+        })
+
+    action = body.get('action')
+    log.info("Request", game=game, action=action)
+
+    if GAMES[game].get('matches'):
+        if action == 'record_game':
+            return record_game(game, body)
+        elif action == 'start_game':
+            return start_game(game)
+        elif action == 'save_score':
+            return save_match_score(game, body)
+        elif action == 'get_recent_games':
+            return get_recent_games(game, body)
+        elif action == 'export_scores':
+            return export_scores(game, body)
+        return create_response(400, {'error': 'Invalid action. Use ' + describe_actions(MATCH_ACTIONS)})
+
+    # Scores sent with a session token are attributed to its verified player.
+    # Only the token can make a player verified, never a field of the body.
+    verified_player = None
+    if action in ('save_score', 'save_scores') and body.get('token'):
+        session = session_tokens.verify(body['token'])
+        if session is None:
+            return create_response(401, {'error': 'Invalid or expired session'})
+        verified_player = session['u']
+
+    if action == 'save_score':
+        return save_score(game, body, verified_player)
+    elif action == 'save_scores':
+        return save_scores(game, body, verified_player)
+    elif action == 'get_high_score':
+        return get_high_score(game)
+    elif action == 'get_leaderboard':
+        return get_leaderboard(game, body)
+    elif action == 'get_player_stats':
+        return get_player_stats(game, body)
+    elif action == 'get_score_distribution':
+        return get_score_distribution(game, body)
+    elif action == 'export_scores':
+        return export_scores(game, body)
+    return create_response(400, {'error': 'Invalid action. Use ' + describe_actions(SCORE_ACTIONS)})
+
+
+def describe_actions(actions):
+    quoted = [f'"{action}"' for action in actions]
+    return ', '.join(quoted[:-1]) + ' or ' + quoted[-1]
+
+
+def build_score_item(game, data, timestamp, game_date, verified_player=None):
+    """Build the item saved for one score.
+
+    Raises ValueError, with a message for the client, on a player id that is
+    not allowed or a score (or extra field) that is not an integer from 0 to
+    MAX_SCORE.
+    """
+    # Missing or empty player ids are saved as anonymous, spread over shards
+    player_id = verified_player or data.get('player_id') or player_shards.ANONYMOUS_PLAYER
+    player_shards.validate_player_id(player_id)
+    values = {}
+    for field, default in dict(GAMES[game]['extra_fields'], score=0).items():
+        value = data.get(field, default)
+        try:
+            values[field] = int(value) if value else default
+        except (TypeError, ValueError, OverflowError):
+            values[field] = None
+        if values[field] is None or not 0 <= values[field] <= MAX_SCORE:
+            raise ValueError(f'Score must be an integer from 0 to {MAX_SCORE}')
+    score = values.pop('score')
+
+    item = {
+        'player_id': player_shards.write_key(player_id, timestamp),
+        'board': leaderboard.board_key(timestamp),
+        'timestamp': timestamp,
+        'score': score,
+        'game_date': game_date
+    }
+    if verified_player:
+        item['verified'] = True
+    item.update(values)
+    return item
+
+
+def save_score(game, data, verified_player=None):
+    """Save a score for any player-scored game.
+
+    `verified_player` is the username from a verified session token, if any.
+    """
+    table = get_table(game)
+
+    # Create timestamp for sort key
+    timestamp = int(time.time() * 1000)  # milliseconds
+    # Get human-readable date
+    game_date = strftime("%Y-%m-%d %H:%M:%S +0000", gmtime())
+
+    try:
+        item = build_score_item(game, data, timestamp, game_date, verified_player)
+    except ValueError as e:
+        return create_response(400, {'error': str(e)})
+
+    try:
+        table.put_item(Item=item)
+    except Exception as e:
+        log.error("Error saving score", error=str(e))
+        return create_response(500, {'error': f'Failed to save score: {str(e)}'})
+
+    update_indexes(game, table, [item])
+    return create_response(200, {
+        'message': 'Score saved successfully!',
+        'score': item['score'],
+        'timestamp': timestamp
+    })
+
+
+def save_scores(game, data, verified_player=None):
+    """Save a list of queued scores with batched writes.
+
+    Every record gets a result entry, in request order, with status 'saved',
+    'invalid' (rejected by validation) or 'failed' (still unprocessed after
+    all retries). `verified_player` is as for save_score.
+    """
+    records = data.get('scores')
+    if not isinstance(records, list) or not records:
+        return create_response(400, {'error': 'Missing scores list'})
+    if len(records) > MAX_BATCH_RECORDS:
+        return create_response(400, {'error': f'At most {MAX_BATCH_RECORDS} scores per request'})
+
+    table = get_table(game)
+
+    # Records share the request's time; offsetting by position keeps the
+    # player_id + timestamp keys unique within the batch
+    base_timestamp = int(time.time() * 1000)
+    game_date = strftime("%Y-%m-%d %H:%M:%S +0000", gmtime())
+
+    results = []
+    items = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            results.append({'index': index, 'status': 'invalid', 'error': 'Score record must be an object'})
+            continue
+        try:
+            item = build_score_item(game, record, base_timestamp + index, game_date, verified_player)
+        except ValueError as e:
+            results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+            continue
+        items[index] = item
+        results.append({'index': index, 'status': 'saved', 'score': item['score'], 'timestamp': item['timestamp']})
+
+    try:
+        unprocessed = batch_write(table.name, list(items.values()))
+    except Exception as e:
+        log.error("Error saving scores", error=str(e))
+        return create_response(500, {'error': f'Failed to save scores: {str(e)}'})
+
+    for index, item in list(items.items()):
+        if (item['player_id'], item['timestamp']) in unprocessed:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Write was not processed'}
+            del items[index]
+
+    saved = list(items.values())
+    if saved:
+        update_indexes(game, table, saved)
+
+    return create_response(200, {
+        'message': f'Saved {len(saved)} of {len(records)} scores',
+        'results': results
+    })
+
+
+def index_pool():
+    global _index_pool
+    if _index_pool is None:
+        # Imported on first use; concurrent.futures would otherwise add to
+        # every score lambda's cold start
+        from concurrent.futures import ThreadPoolExecutor
+
+        _index_pool = ThreadPoolExecutor(max_workers=INDEX_MAX_WORKERS, thread_name_prefix='index')
+    return _index_pool
+
+
+def update_indexes(game, table, items):
+    """Fold newly saved score items into every index derived from them.
+
+    The updates run concurrently and failures are logged, not raised (see
+    INDEX_MAX_WORKERS).
+    """
+    best = max(items, key=lambda item: item['score'])
+
+    def high_score():
+        # No-op unless the record is beaten
+        player_id = player_shards.display_id(best['player_id'])
+        if update_high_score(table, player_id, best['score'], best['timestamp'], best['game_date']):
+            cache_high_score(game, {
+                'score': best['score'],
+                'player_id': player_id,
+                'game_date': best['game_date']
+            })
+
+    def period_board(period):
+        # A window's item takes the whole batch in turn; concurrent rewrites
+        # of it would only conflict
+        for item in sorted(items, key=lambda item: -item['score'])[:period_leaderboards.TOP_K]:
+            period_leaderboards.record_score(table, item, (period,))
+
+    counters = leaderboard.rank_counts(item['score'] for item in items)
+    counters.update(score_histogram.histogram_counts(items))
+    by_player = {}
+    for item in items:
+        by_player.setdefault(item['player_id'], []).append(item)
+
+    updates = [('high_score', high_score, ())]
+    updates += [(period, period_board, (period,)) for period in period_leaderboards.PERIODS]
+    updates += [(partition, counter_shards.add, (table, partition, timestamp, counts))
+                for (partition, timestamp), counts in counters.items()]
+    updates += [('player_summary', player_stats.record_games, (table, player_items))
+                for player_items in by_player.values()]
+
+    pool = index_pool()
+    futures = [(name, pool.submit(update, *args)) for name, update, args in updates]
+    for name, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            log.error("Error updating score index", index=name, error=str(e))
+
+
+def batch_write(table_name, items):
+    """Write items in BatchWriteItem chunks, retrying unprocessed puts.
+
+    Returns the (player_id, timestamp) keys that were still unprocessed after
+    MAX_BATCH_RETRIES retries.
+    """
+    unprocessed = set()
+    for start in range(0, len(items), BATCH_WRITE_CHUNK):
+        requests = [{'PutRequest': {'Item': item}} for item in items[start:start + BATCH_WRITE_CHUNK]]
+        attempt = 0
+        while requests:
+            response = aws_clients.batch_write_item(RequestItems={table_name: requests})
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            if not requests:
+                break
+            if attempt == MAX_BATCH_RETRIES:
+                for request in requests:
+                    item = request['PutRequest']['Item']
+                    unprocessed.add((item['player_id'], int(item['timestamp'])))
+                break
+            # Exponential backoff with jitter before retrying what was left
+            time.sleep(BATCH_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random() / 2))
+            attempt += 1
+    return unprocessed
+
+
+def cache_high_score(game, high_score):
+    _high_score_cache[game] = (time.monotonic() + HIGH_SCORE_CACHE_TTL, high_score)
+
+
+def cached_high_score(game):
+    """Return (hit, high_score) from this container's cache"""
+    entry = _high_score_cache.get(game)
+    if entry and entry[0] > time.monotonic():
+        _high_score_cache_stats['hits'] += 1
+        return True, entry[1]
+    _high_score_cache_stats['misses'] += 1
+    return False, None
+
+
+def load_high_score(game):
+    """Return (hit, high_score), reading the high-score record on a cache miss"""
+    hit, high_score = cached_high_score(game)
+    if not hit:
+        high_score = read_high_score(get_table(game))
+        cache_high_score(game, high_score)
+    return hit, high_score
+
+
+def get_high_score(game):
+    """Get the highest score, from the container cache or the high-score record"""
+    try:
+        hit, high_score = load_high_score(game)
+
+        cache_info = dict(_high_score_cache_stats, hit=hit)
+
+        if not high_score:
+            return create_response(200, {'high_score': 0, 'cache': cache_info})
+
+        return create_response(200, {
+            'high_score': high_score['score'],
+            'player_id': high_score['player_id'],
+            'game_date': high_score['game_date'],
+            'cache': cache_info
+        })
+    except Exception as e:
+        log.error("Error fetching high score", error=str(e))
+        return create_response(500, {'error': str(e), 'high_score': 0})
+
+
+def get_leaderboard(game, data):
+    """Get a page of the ranked leaderboard, the scores around a player, or a rank"""
+    try:
+        result = leaderboard.handle_request(get_table(game), data)
+        return create_response(400 if 'error' in result else 200, result)
+    except Exception as e:
+        log.error("Error fetching leaderboard", error=str(e))
+        return create_response(500, {'error': str(e)})
+
+
+def get_player_stats(game, data):
+    """Personal best, games played, average score and recent games for one player"""
+    player_id = data.get('player_id')
+    if data.get('token'):
+        session = session_tokens.verify(data['token'])
+        if session is None:
+            return create_response(401, {'error': 'Invalid or expired session'})
+        player_id = session['u']
+    if not player_id:
+        return create_response(400, {'error': 'Missing player_id'})
+    try:
+        player_shards.validate_player_id(player_id)
+    except ValueError as e:
+        return create_response(400, {'error': str(e)})
+
+    try:
+        stats = player_stats.get_stats(get_table(game), player_id,
+                                       data.get('limit', player_stats.DEFAULT_HISTORY))
+        return create_response(200, stats)
+    except Exception as e:
+        log.error("Error fetching player stats", error=str(e))
+        return create_response(500, {'error': str(e)})
+
+
+def get_score_distribution(game, data):
+    """Count, mean and approximate p50/p90/p99 of a game's scores, all time or for one day"""
+    day = data.get('day')
+    try:
+        key = score_histogram.ALL_TIME if day is None else score_histogram.parse_day(day)
+    except (TypeError, ValueError):
+        return create_response(400, {'error': 'Invalid day. Use YYYY-MM-DD'})
+    try:
+        distribution = score_histogram.get_distribution(get_table(game), key)
+    except Exception as e:
+        log.error("Error fetching score distribution", error=str(e))
+        return create_response(500, {'error': str(e)})
+    return create_response(200, dict(day=day, **distribution))
+
+
+def export_scores(game, data):
+    """Export one chunk of a game's saved rows as NDJSON or CSV.
+
+    Pass the returned resume_token back to get the next chunk; it is null once
+    the export (or its scan segment) is complete. Large exports can run
+    `segments` scans in parallel, one request chain per `segment`.
+    """
+    # Imported on first use; its csv and threading imports would otherwise
+    # add to every score lambda's cold start
+    import score_export
+
+    fmt = data.get('format', 'ndjson')
+    if fmt not in score_export.FORMATS:
+        return create_response(400, {'error': 'Invalid format. Use ' + describe_actions(score_export.FORMATS)})
+    try:
+        max_rows = paging.clamp_limit(data.get('limit'), score_export.DEFAULT_CHUNK_ROWS,
+                                      score_export.MAX_CHUNK_ROWS)
+        config = GAMES[game]
+        chunk = score_export.export_chunk(
+            get_table(game), score_export.key_names_for(config), fmt, score_export.columns_for(config),
+            resume_token=data.get('resume_token'),
+            segment=int(data.get('segment', 0)),
+            total_segments=int(data.get('segments', 1)),
+            max_rows=max_rows
+        )
+    except (TypeError, ValueError) as e:
+        return create_response(400, {'error': str(e)})
+    except Exception as e:
+        log.error("Error exporting scores", error=str(e))
+        return create_response(500, {'error': str(e)})
+    return create_response(200, dict(chunk, format=fmt))
+
+
+def read_campaign_progress(username):
+    item = aws_clients.table(USERS_TABLE).get_item(
+        Key={'username': username},
+        ProjectionExpression='campaign_progress'
+    ).get('Item')
+    return int(item.get('campaign_progress', 0)) if item else None
+
+
+def get_hub_summary(data):
+    """High scores for every game plus, for a known player, their personal bests
+    and campaign progress, gathered in one request.
+
+    A session token identifies the player (and already carries their campaign
+    progress); otherwise an optional player_id selects whose bests to read.
+    Reads that fail or time out are listed under 'unavailable'.
+    """
+    player_id = data.get('player_id')
+    campaign_progress = None
+    if data.get('token'):
+        session = session_tokens.verify(data['token'])
+        if session is None:
+            return create_response(401, {'error': 'Invalid or expired session'})
+        player_id = session['u']
+        campaign_progress = int(session.get('cp', 0))
+    if player_id:
+        try:
+            player_shards.validate_player_id(player_id)
+        except ValueError as e:
+            return create_response(400, {'error': str(e)})
+
+    score_games = [game for game in sorted(GAMES) if not GAMES[game].get('matches')]
+    reads = {}
+    for game in score_games:
+        reads[('high_score', game)] = (lambda game=game: load_high_score(game)[1])
+        if player_id:
+            reads[('personal_best', game)] = (
+                lambda game=game: leaderboard.get_player_best(get_table(game), player_id))
+    if player_id and campaign_progress is None:
+        reads[('campaign_progress', None)] = lambda: read_campaign_progress(player_id)
+
+    # Imported on first use; concurrent.futures would otherwise add to every
+    # score lambda's cold start
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    pool = ThreadPoolExecutor(max_workers=len(reads), thread_name_prefix='hub')
+    futures = {pool.submit(read): key for key, read in reads.items()}
+    done, pending = wait(futures, timeout=HUB_READ_TIMEOUT)
+    pool.shutdown(wait=False)
+
+    summary = {'high_scores': {}, 'unavailable': []}
+    if player_id:
+        summary['player_id'] = player_id
+        summary['personal_bests'] = {}
+        summary['campaign_progress'] = campaign_progress
+    for future, (kind, game) in futures.items():
+        label = f'{game}:{kind}' if game else kind
+        if future in pending:
+            log.error("Hub read timed out", read=label, timeout=HUB_READ_TIMEOUT)
+            summary['unavailable'].append(label)
+            continue
+        try:
+            value = future.result()
+        except Exception as e:
+            log.error("Hub read failed", read=label, error=str(e))
+            summary['unavailable'].append(label)
+            continue
+
+        if kind == 'high_score':
+            summary['high_scores'][game] = {
+                'high_score': value['score'] if value else 0,
+                'player_id': value['player_id'] if value else None,
+                'game_date': value['game_date'] if value else None
+            }
+        elif kind == 'personal_best':
+            summary['personal_bests'][game] = value or 0
+        else:
+            summary['campaign_progress'] = value
+
+    summary['unavailable'].sort()
+    return create_response(200, summary)
+
+
+def start_game(game):
+    """Create a new match record with initial scores 0 and return its ID"""
+    game_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    item = {
+        'game_id': game_id,
+        'created_day': recent_games.created_day(now),
+        'created_at': now,
+        'updated_at': now,
+        'player_score': 0,
+        'ai_score': 0,
+        'result': 'IN_PROGRESS'
+    }
+    try:
+        get_table(game).put_item(Item=item)
+    except Exception as e:
+        log.error("Error creating game record", error=str(e))
+        return create_response(500, {'error': f'Failed to create game: {str(e)}'})
+
+    return create_response(200, {
+        'message': 'Game started',
+        'game_id': game_id,
+        'backend_version': 'v6.0'
+    })
+
+
+def parse_seq(data):
+    """The update's sequence number, None if it has none, or False if invalid"""
+    seq = data.get('seq')
+    if seq is None:
+        return None
+    try:
+        seq = int(seq)
+    except (TypeError, ValueError):
+        return False
+    return seq if seq >= 0 else False
+
+
+def track_match(game, game_id, seq, finished=None):
+    """Note a state of a match this container has just persisted"""
+    key = (game, game_id)
+    _match_flushes.pop(key, None)
+    _match_flushes[key] = {'seq': seq, 'at': time.time(), 'pending': None, 'finished': finished}
+    if len(_match_flushes) > MAX_TRACKED_MATCHES:
+        del _match_flushes[next(iter(_match_flushes))]
+
+
+def coalesce_match_update(game, game_id, seq, result, player_score, ai_score):
+    """Decide what to do with a sequenced update: 'write', 'coalesced', 'stale' or 'finished'"""
+    if result != 'IN_PROGRESS':
+        return 'write'
+    tracked = _match_flushes.get((game, game_id))
+    if tracked is None:
+        track_match(game, game_id, seq)
+        return 'write'
+    if seq <= tracked['seq']:
+        return 'stale'
+    if tracked['finished']:
+        return 'finished'
+    if time.time() - tracked['at'] < MATCH_FLUSH_WINDOW:
+        tracked['seq'] = seq
+        tracked['pending'] = (player_score, ai_score)
+        return 'coalesced'
+    track_match(game, game_id, seq)
+    return 'write'
+
+
+def flush_coalesced_matches():
+    """Persist the latest coalesced state of matches whose window has passed"""
+    now = time.time()
+    due = [(key, tracked) for key, tracked in _match_flushes.items()
+           if tracked['pending'] and now - tracked['at'] >= MATCH_FLUSH_WINDOW][:MAX_FLUSHES_PER_REQUEST]
+    for (game, game_id), tracked in due:
+        player_score, ai_score = tracked['pending']
+        tracked['pending'] = None
+        tracked['at'] = now
+        try:
+            write_match_state(game, game_id, player_score, ai_score, 'IN_PROGRESS', tracked['seq'])
+        except Exception as e:
+            # Finished or already newer elsewhere; a failed flush only loses
+            # a state the next update supersedes
+            if not aws_clients.is_condition_failure(e):
+                log.warning("Error flushing coalesced match state", game_id=game_id, error=str(e))
+                continue
+            existing = aws_clients.condition_failure_item(e) or {}
+            if existing.get('result') in ('WIN', 'LOSS'):
+                tracked['finished'] = existing['result']
+
+
+def write_match_state(game, game_id, player_score, ai_score, result, seq=None):
+    """Create or update a match row, unless it is finished or holds a newer seq.
+
+    Raises the DynamoDB error, with the stored item on a condition failure.
+    """
+    now = datetime.utcnow().isoformat()
+    update_expression = (
+        'SET player_score = :p, ai_score = :a, #r = :r, updated_at = :u, '
+        'created_at = if_not_exists(created_at, :u), '
+        'created_day = if_not_exists(created_day, :d)'
+    )
+    condition = 'attribute_not_exists(game_id) OR #r = :in_progress'
+    values = {
+        ':p': player_score,
+        ':a': ai_score,
+        ':r': result,
+        ':u': now,
+        ':d': recent_games.created_day(now),
+        ':in_progress': 'IN_PROGRESS'
+    }
+    if seq is not None:
+        update_expression += ', seq = :seq'
+        condition = f'({condition}) AND (attribute_not_exists(seq) OR seq < :seq)'
+        values[':seq'] = seq
+    get_table(game).update_item(
+        Key={'game_id': game_id},
+        UpdateExpression=update_expression,
+        ConditionExpression=condition,
+        ExpressionAttributeNames={'#r': 'result'},
+        ExpressionAttributeValues=values,
+        ReturnValuesOnConditionCheckFailure='ALL_OLD'
+    )
+
+
+def record_game(game, data):
+    """Create or update a match by its client-generated game_id in one write.
+
+    The row is created on first sight and updated while it is IN_PROGRESS. Once
+    a match is finished, resending the same final result is acknowledged
+    without a write; a different result is rejected. Updates with a "seq" are
+    coalesced (see MATCH_FLUSH_WINDOW) and never overwrite a newer state.
+    """
+    game_id = data.get('game_id')
+    result = data.get('result', 'IN_PROGRESS')
+    try:
+        player_score = int(data['player_score'])
+        ai_score = int(data['ai_score'])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return create_response(400, {'error': 'Missing or invalid scores'})
+    if not (0 <= player_score <= MAX_SCORE and 0 <= ai_score <= MAX_SCORE):
+        return create_response(400, {'error': 'Missing or invalid scores'})
+    if not isinstance(game_id, str) or not GAME_ID_PATTERN.match(game_id):
+        return create_response(400, {'error': 'Missing or invalid game_id'})
+    if result not in MATCH_RESULTS:
+        return create_response(400, {'error': 'Invalid result. Use ' + describe_actions(MATCH_RESULTS)})
+    seq = parse_seq(data)
+    if seq is False:
+        return create_response(400, {'error': 'Invalid seq'})
+
+    response_body = {
+        'message': 'Game recorded',
+        'game_id': game_id,
+        'player_score': player_score,
+        'ai_score': ai_score,
+        'result': result,
+        'duplicate': False
+    }
+    flush_coalesced_matches()
+    if seq is not None:
+        response_body['seq'] = seq
+        outcome = coalesce_match_update(game, game_id, seq, result, player_score, ai_score)
+        if outcome == 'finished':
+            return create_response(409, {'error': 'Game already finished', 'game_id': game_id})
+        if outcome != 'write':
+            response_body[outcome] = True
+            return create_response(200, response_body)
+
+    try:
+        write_match_state(game, game_id, player_score, ai_score, result, seq)
+    except Exception as e:
+        if not aws_clients.is_condition_failure(e):
+            log.error("Error recording game", game_id=game_id, error=str(e))
+            return create_response(500, {'error': f'Failed to record game: {str(e)}'})
+
+        # The match is already finished: a retry of the same final write is a
+        # no-op, anything else would rewrite history
+        existing = aws_clients.condition_failure_item(e)
+        if existing is None:
+            existing = get_table(game).get_item(Key={'game_id': game_id}).get('Item', {})
+        if existing.get('result') in ('WIN', 'LOSS'):
+            track_match(game, game_id, int(existing.get('seq', -1)), finished=existing['result'])
+        if (existing.get('result') == result
+                and existing.get('player_score') == player_score
+                and existing.get('ai_score') == ai_score):
+            response_body['duplicate'] = True
+            return create_response(200, response_body)
+        if seq is not None and result == 'IN_PROGRESS' and existing.get('seq', -1) >= seq:
+            # Another container already stored a newer state
+            response_body['stale'] = True
+            return create_response(200, response_body)
+        return create_response(409, {'error': 'Game already finished', 'game_id': game_id})
+
+    if result != 'IN_PROGRESS':
+        track_match(game, game_id, seq if seq is not None else -1, finished=result)
+    return create_response(200, response_body)
+
+
+def save_match_score(game, data):
+    """Update the scores and result of an existing match"""
+    player_score = data.get('player_score')
+    ai_score = data.get('ai_score')
+    result = data.get('result')  # "WIN", "LOSS", or "IN_PROGRESS"
+    game_id = data.get('game_id')
+
+    if None in (player_score, ai_score, game_id):
+        return create_response(400, {'error': 'Missing required data (scores or game_id)'})
+
+    now = datetime.utcnow().isoformat()
+    try:
+        get_table(game).update_item(
+            Key={'game_id': game_id},
+            UpdateExpression="set player_score=:p, ai_score=:a, #r=:r, updated_at=:u",
+            # Only update matches created by start_game; never invent new rows
+            ConditionExpression='attribute_exists(game_id)',
+            ExpressionAttributeNames={'#r': 'result'},
+            ExpressionAttributeValues={
+                ':p': int(player_score),
+                ':a': int(ai_score),
+                ':r': result,
+                ':u': now
+            }
+        )
+    except Exception as e:
+        if aws_clients.is_condition_failure(e):
+            return create_response(404, {'error': 'Game not found', 'game_id': game_id})
+        log.error("Error updating score", error=str(e))
+        return create_response(500, {'error': f'Failed to update score: {str(e)}'})
+
+    return create_response(200, {
+        'message': 'Score updated',
+        'game_id': game_id,
+        'player_score': int(player_score),
+        'ai_score': int(ai_score),
+        'backend_version': 'v5.0'
+    })
+
+
+def get_recent_games(game, data):
+    """Get the most recent matches, newest first, from the time-bucketed index"""
+    try:
+        games, next_cursor = recent_games.get_recent(
+            get_table(game), data.get('limit', recent_games.DEFAULT_LIMIT), data.get('cursor'))
+    except ValueError as e:
+        return create_response(400, {'error': str(e)})
+    except Exception as e:
+        log.error("Error fetching recent games", error=str(e))
+        return create_response(500, {'error': str(e)})
+
+    return create_response(200, {'games': games, 'next_cursor': next_cursor})
+
+
+def create_response(status_code, body):
+    return api_codec.response(status_code, body)
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+# Compact signed session tokens: base64url(JSON claims) + "." + base64url(HMAC-SHA256).
+#
+# Claims:
+#   u   username
+#   iat issued-at (epoch seconds)
+#   exp expiry (epoch seconds)
+#   cp  campaign progress when the token was issued
+#
+# Every lambda that shares SESSION_TOKEN_SECRET can verify a token locally, so
+# an authenticated request does not need an ArcadeUsers read just to learn who
+# the caller is. Without a secret no tokens are issued and every token fails
+# verification, which leaves callers on their unauthenticated paths.
+SESSION_TOKEN_SECRET = os.environ.get('SESSION_TOKEN_SECRET', '').encode()
+SESSION_TOKEN_TTL = int(os.environ.get('SESSION_TOKEN_TTL', str(12 * 60 * 60)))  # seconds
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload):
+    return hmac.new(SESSION_TOKEN_SECRET, payload.encode(), hashlib.sha256).digest()
+
+
+def issue(username, campaign_progress=0, now=None):
+    """Return a signed token for `username`, or None if no secret is configured"""
+    if not SESSION_TOKEN_SECRET:
+        return None
+    issued_at = int(now if now is not None else time.time())
+    claims = {
+        'u': username,
+        'iat': issued_at,
+        'exp': issued_at + SESSION_TOKEN_TTL,
+        'cp': int(campaign_progress)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return payload + '.' + _b64encode(_sign(payload))
+
+
+def verify(token, now=None):
+    """Return the token's claims if it is authentic and unexpired, else None"""
+    if not SESSION_TOKEN_SECRET or not isinstance(token, str) or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    try:
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or 'u' not in claims:
+        return None
+    if claims.get('exp', 0) <= (now if now is not None else time.time()):
+        return None
+    return claims
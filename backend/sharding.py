@@ -0,0 +1,54 @@
+import zlib
+
+# Keys that would take too much traffic on their own (the anonymous player,
+# the leaderboard board, per-game counters) are spread over a fixed number of
+# shards named <key>#0 .. <key>#N-1. Writes pick one shard; reads look at
+# every shard, concurrently where each is a separate request, and merge.
+#
+# Only ever increase a shard count: reads look at shards 0..N-1, so lowering
+# one would hide whatever was written to the dropped shards.
+SEPARATOR = '#'
+
+MAX_WORKERS = 16
+_pool = None
+
+
+def shard_key(key, shard):
+    return f'{key}{SEPARATOR}{shard}'
+
+
+def shard_keys(key, shards):
+    """Every shard of `key`, in shard order"""
+    return [shard_key(key, shard) for shard in range(shards)]
+
+
+def hashed_shard_key(key, value, shards):
+    """The shard of `key` that `value` (e.g. a timestamp) always maps to"""
+    return shard_key(key, zlib.crc32(str(value).encode()) % shards)
+
+
+def is_shard_of(key, sharded):
+    return sharded.startswith(key + SEPARATOR)
+
+
+def base_key(sharded):
+    """The key a shard belongs to"""
+    return sharded.split(SEPARATOR, 1)[0]
+
+
+def pool():
+    """Thread pool for reading shards concurrently, shared by warm invocations"""
+    global _pool
+    if _pool is None:
+        # Imported on first use to keep it out of every lambda's cold start
+        from concurrent.futures import ThreadPoolExecutor
+
+        _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='shard')
+    return _pool
+
+
+def read_all(read, keys):
+    """Call read(key) for every key concurrently; return the results in key order"""
+    if len(keys) == 1:
+        return [read(keys[0])]
+    return list(pool().map(read, keys))
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+import time
+
+# One JSON object per line, written to stdout for CloudWatch Logs.
+#
+# Records below LOG_LEVEL return before anything is serialised, so handlers
+# can pass whole events as fields without paying for it in production. Field
+# values may also be zero-argument callables, which are only called when the
+# record is actually written.
+#
+# Debug records are additionally sampled (LOG_DEBUG_SAMPLE_RATE) and capped
+# per container (LOG_DEBUG_MAX_PER_SECOND) so turning debug on under load
+# doesn't swamp the hot path.
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+DEBUG_MAX_PER_SECOND = int(os.environ.get('LOG_DEBUG_MAX_PER_SECOND', '50'))
+
+# Values under these keys (at any depth, case-insensitive) are never logged
+REDACTED_KEYS = ('password', 'token', 'secret', 'authorization', 'cookie')
+REDACTED = '***'
+
+_debug_window = {'second': 0, 'count': 0}
+
+
+def is_enabled(level):
+    return LEVELS[level] >= LOG_LEVEL
+
+
+def debug(message, **fields):
+    if not is_enabled('DEBUG') or not _debug_sampled():
+        return
+    _emit('DEBUG', message, fields)
+
+
+def info(message, **fields):
+    if is_enabled('INFO'):
+        _emit('INFO', message, fields)
+
+
+def warning(message, **fields):
+    if is_enabled('WARNING'):
+        _emit('WARNING', message, fields)
+
+
+def error(message, **fields):
+    if is_enabled('ERROR'):
+        _emit('ERROR', message, fields)
+
+
+def redact(value):
+    """Copy of `value` with secret fields masked, including inside JSON bodies"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if _is_secret_key(key) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, str) and value[:1] in ('{', '['):
+        # API Gateway proxy events carry the request as a JSON string body
+        try:
+            return redact(json.loads(value))
+        except ValueError:
+            return value
+    return value
+
+
+def _is_secret_key(key):
+    key = str(key).lower()
+    return any(secret in key for secret in REDACTED_KEYS)
+
+
+def _debug_sampled():
+    if DEBUG_SAMPLE_RATE < 1.0 and random.random() >= DEBUG_SAMPLE_RATE:
+        return False
+    second = int(time.time())
+    if _debug_window['second'] != second:
+        _debug_window['second'] = second
+        _debug_window['count'] = 0
+    _debug_window['count'] += 1
+    return _debug_window['count'] <= DEBUG_MAX_PER_SECOND
+
+
+def _emit(level, message, fields):
+    record = {'level': level, 'message': message}
+    for key, value in fields.items():
+        if callable(value):
+            value = value()
+        record[key] = REDACTED if _is_secret_key(key) else redact(value)
+    print(json.dumps(record, default=str))
@@ -0,0 +1,43 @@
+"""Shared setup for the backend tests.
+
+Each test runs the real handlers against a fresh in-memory DynamoDB
+(memory_dynamodb) and a clean set of container caches, with session tokens
+enabled and cheap password hashing.
+"""
+import json
+import os
+import sys
+import unittest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+os.environ.setdefault('ARCADE_METRICS', 'off')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('PASSWORD_HASH_COST', str(2 ** 10))
+os.environ.setdefault('SESSION_TOKEN_SECRET', 'test-secret')
+
+import aws_clients  # noqa: E402
+import memory_dynamodb  # noqa: E402
+import period_leaderboards  # noqa: E402
+import score_service  # noqa: E402
+
+
+class MemoryTestCase(unittest.TestCase):
+    """A test case with its own in-memory arcade tables"""
+
+    def setUp(self):
+        self.db = memory_dynamodb.create_arcade_tables(memory_dynamodb.MemoryDynamoDB())
+        aws_clients.use_backend(self.db)
+        score_service._high_score_cache.clear()
+        score_service._match_flushes.clear()
+        period_leaderboards._cutoffs.clear()
+
+    def table(self, name):
+        return self.db.Table(name)
+
+    def call(self, handler, body):
+        """Invoke `handler` through an API Gateway proxy event; return (status, body)"""
+        response = handler({'body': json.dumps(body)}, None)
+        return response['statusCode'], json.loads(response['body'])
@@ -0,0 +1,85 @@
+import base64
+import json
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from support import MemoryTestCase
+
+import api_codec
+import snake_score_lambda
+
+
+class DumpsTest(unittest.TestCase):
+    """dumps writes the same JSON whichever encoder is bundled"""
+
+    def test_decimals_become_numbers(self):
+        self.assertEqual(api_codec.dumps({'a': Decimal('3'), 'b': Decimal('2.5')}), '{"a":3,"b":2.5}')
+
+    def test_sets_become_sorted_lists(self):
+        self.assertEqual(json.loads(api_codec.dumps({'tags': {'b', 'a'}})), {'tags': ['a', 'b']})
+
+    def test_integers_beyond_64_bits(self):
+        value = {'score': 2 ** 64, 'stored': Decimal(2 ** 70)}
+        self.assertEqual(json.loads(api_codec.dumps(value)), {'score': 2 ** 64, 'stored': 2 ** 70})
+
+    def test_unencodable_values_still_raise(self):
+        with self.assertRaises(TypeError):
+            api_codec.dumps({'value': object()})
+
+
+class ParseBodyTest(unittest.TestCase):
+    """parse_body reads proxy bodies, base64 bodies and direct invocations"""
+
+    def test_sources(self):
+        fields = {'action': 'get_high_score', 'score': 5}
+        text = json.dumps(fields)
+        self.assertEqual(api_codec.parse_body({'body': text}), fields)
+        self.assertEqual(api_codec.parse_body({'body': base64.b64encode(text.encode()).decode(),
+                                               'isBase64Encoded': True}), fields)
+        self.assertEqual(api_codec.parse_body({'body': fields}), fields)
+        self.assertEqual(api_codec.parse_body(fields), fields)
+
+    def test_rejected_bodies(self):
+        cases = (
+            ({'body': '{"action": '}, 400, 'Request body is not valid JSON'),
+            ({'body': '!!!', 'isBase64Encoded': True}, 400, 'Request body is not valid JSON'),
+            ({'body': '[1, 2]'}, 400, 'Request body must be a JSON object'),
+            ({'body': '"text"'}, 400, 'Request body must be a JSON object'),
+        )
+        for event, status, message in cases:
+            with self.assertRaises(api_codec.BodyError) as raised:
+                api_codec.parse_body(event)
+            self.assertEqual((raised.exception.status_code, str(raised.exception)), (status, message))
+
+    def test_size_limit(self):
+        with mock.patch.object(api_codec, 'MAX_BODY_BYTES', 16):
+            self.assertEqual(api_codec.parse_body({'body': '{"a": "0123456"}'}), {'a': '0123456'})
+            with self.assertRaises(api_codec.BodyError) as raised:
+                api_codec.parse_body({'body': '{"a": "01234567"}'})
+            self.assertEqual(raised.exception.status_code, 413)
+            encoded = base64.b64encode(b'{"a": "01234567890"}').decode()
+            with self.assertRaises(api_codec.BodyError):
+                api_codec.parse_body({'body': encoded, 'isBase64Encoded': True})
+
+    def test_handlers_reply_with_the_error(self):
+        response = snake_score_lambda.lambda_handler({'body': 'not json'}, None)
+        self.assertEqual(response['statusCode'], 400)
+
+
+class LargeStoredScoreTest(MemoryTestCase):
+    """A row holding a huge score does not break the reads that return it"""
+
+    def test_reads_return_huge_scores(self):
+        table = self.table('SnakeScores')
+        table.put_item(Item={'player_id': '__high_score__', 'timestamp': 0, 'score': Decimal(2 ** 64),
+                             'holder_id': 'ann', 'game_date': ''})
+        table.put_item(Item={'player_id': 'ann', 'timestamp': 1000, 'board': 'all#0',
+                             'score': Decimal(2 ** 64), 'game_date': ''})
+        for body in ({'action': 'get_high_score'}, {'action': 'get_leaderboard'}, {'action': 'get_hub_summary'}):
+            status, _ = self.call(snake_score_lambda.lambda_handler, body)
+            self.assertEqual(status, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
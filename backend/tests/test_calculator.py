@@ -0,0 +1,175 @@
+import unittest
+from unittest import mock
+
+from support import MemoryTestCase
+
+import aws_clients
+import lamdba_function
+
+
+class CalculatorTestCase(MemoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        lamdba_function._cache.clear()
+        for name in lamdba_function._cache_stats:
+            lamdba_function._cache_stats[name] = 0
+
+    def calculate(self, **fields):
+        return self.call(lamdba_function.lambda_handler, fields)
+
+    def stored(self):
+        return sorted(item['ID'] for item in self.table('PowerOfMathDatabase').scan()['Items'])
+
+
+class SingleCalculationTest(CalculatorTestCase):
+    """One calculation per request, its result stored once"""
+
+    def test_operations(self):
+        cases = (('add', 2, 3, 'Your result is 5.0'), ('subtract', 2, 3, 'Your result is -1.0'),
+                 ('multiply', 2, 3, 'Your result is 6.0'), ('divide', 3, 2, 'Your result is 1.5'),
+                 ('power', 2, 3, 'Your result is 8.0'))
+        for operation, num1, num2, message in cases:
+            self.assertEqual(self.calculate(operation=operation, num1=num1, num2=num2), (200, message))
+        self.assertEqual(self.calculate(num1='2', num2='10'), (200, 'Your result is 1024.0'))
+        self.assertEqual(self.stored(), ['-1.0', '1.5', '1024.0', '5.0', '6.0', '8.0'])
+
+    def test_errors(self):
+        self.assertEqual(self.calculate(operation='divide', num1=1, num2=0), (400, 'Error: Cannot divide by zero'))
+        self.assertEqual(self.calculate(operation='power', num1=-8, num2=0.5), (400, 'Error: math domain error'))
+        self.assertEqual(self.calculate(operation='power', num1=10, num2=400), (400, 'Error: math range error'))
+        self.assertEqual(self.calculate(operation='modulo', num1=1, num2=2), (400, 'Error: Invalid operation'))
+        self.assertEqual(self.stored(), [])
+
+
+class CacheTest(CalculatorTestCase):
+    """Repeats are answered from the container's cache without a write"""
+
+    def test_repeat_is_a_hit_without_a_write(self):
+        self.calculate(operation='add', num1=1, num2=2)
+        self.table('PowerOfMathDatabase').delete_item(Key={'ID': '3.0'})
+        self.assertEqual(self.calculate(operation='add', num1='1', num2=2.0), (200, 'Your result is 3.0'))
+        self.assertEqual(self.stored(), [])
+        stats = lamdba_function.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+
+    def test_signed_zero_is_a_different_calculation(self):
+        self.assertEqual(self.calculate(operation='divide', num1=1, num2=-0.0), (400, 'Error: Cannot divide by zero'))
+        self.assertEqual(self.calculate(operation='multiply', num1=0.0, num2=-1), (200, 'Your result is -0.0'))
+        self.assertEqual(self.calculate(operation='multiply', num1=-0.0, num2=-1), (200, 'Your result is 0.0'))
+
+    def test_least_recently_used_is_evicted(self):
+        with mock.patch.object(lamdba_function, 'CACHE_MAX_ENTRIES', 2):
+            self.calculate(operation='add', num1=1, num2=1)
+            self.calculate(operation='add', num1=2, num2=2)
+            self.calculate(operation='add', num1=1, num2=1)
+            self.calculate(operation='add', num1=3, num2=3)
+        self.assertEqual(list(lamdba_function._cache), [('add', '1.0', '1.0'), ('add', '3.0', '3.0')])
+        self.assertEqual(lamdba_function.cache_stats()['evictions'], 1)
+
+    def test_expired_entries_are_recalculated(self):
+        with mock.patch.object(lamdba_function, 'CACHE_TTL', -1):
+            self.calculate(operation='add', num1=1, num2=1)
+        self.table('PowerOfMathDatabase').delete_item(Key={'ID': '2.0'})
+        self.calculate(operation='add', num1=1, num2=1)
+        self.assertEqual(self.stored(), ['2.0'])
+        self.assertEqual(lamdba_function.cache_stats()['expired'], 1)
+
+
+class BatchTest(CalculatorTestCase):
+    """A batch answers each calculation as single mode would"""
+
+    def test_pairs_and_columns(self):
+        status, body = self.calculate(operation='add', pairs=[[1, 2], [3, 4], [1, 2]])
+        self.assertEqual(status, 200)
+        self.assertEqual(body['results'], ['Your result is 3.0', 'Your result is 7.0', 'Your result is 3.0'])
+        self.assertEqual(body['count'], 3)
+        status, body = self.calculate(operation='multiply', num1=[2, 3], num2=['4', 5])
+        self.assertEqual(body['results'], ['Your result is 8.0', 'Your result is 15.0'])
+        self.assertEqual(self.stored(), ['15.0', '3.0', '7.0', '8.0'])
+
+    def test_one_bad_calculation_does_not_fail_the_rest(self):
+        status, body = self.calculate(operation=['divide', 'power', 'modulo', 'subtract'],
+                                      pairs=[[1, 0], [-8, 0.5], [1, 2], [5, 3]])
+        self.assertEqual(status, 200)
+        self.assertEqual(body['results'], ['Error: Cannot divide by zero', 'Error: math domain error',
+                                           'Error: Invalid operation', 'Your result is 2.0'])
+        self.assertEqual(self.stored(), ['2.0'])
+
+    def test_cached_results_are_reused(self):
+        self.calculate(operation='add', num1=1, num2=2)
+        _, body = self.calculate(operation='add', pairs=[[1, 2], [2, 2]])
+        self.assertEqual(body['results'], ['Your result is 3.0', 'Your result is 4.0'])
+        self.assertEqual(body['cache']['hits'], 1)
+        self.assertEqual(self.calculate(operation='add', num1=2, num2=2), (200, 'Your result is 4.0'))
+        self.assertEqual(lamdba_function.cache_stats()['hits'], 2)
+
+    def test_large_batch_matches_single_mode(self):
+        operations = list(lamdba_function.OPERATIONS)
+        pairs = [[i % 17 - 8, i % 5 - 2] for i in range(lamdba_function.NUMPY_MIN_BATCH_SIZE * 2)]
+        pairs += [[10, 400], [0, -1], [-8, 0.5]]
+        ops = [operations[i % len(operations)] for i in range(len(pairs) - 3)] + ['power'] * 3
+        status, body = self.calculate(operation=ops, pairs=pairs)
+        self.assertEqual(status, 200)
+        expected = [lamdba_function.evaluate(op, float(a), float(b)) for op, (a, b) in zip(ops, pairs)]
+        expected = [result if isinstance(result, str) else 'Your result is ' + str(result) for result in expected]
+        self.assertEqual(body['results'], expected)
+
+    def test_results_do_not_depend_on_batch_size(self):
+        # Pairs for which np.power and math.pow round differently
+        pairs = [[1 / 3, 2], [8.474337369372327, -0.997984524845581], [7.6377461897661405, 4.4082309060776055]]
+        pairs += [[1 + i / 1000, 0.5 + i / 7] for i in range(lamdba_function.NUMPY_MIN_BATCH_SIZE)]
+        _, body = self.calculate(operation='power', pairs=pairs)
+        lamdba_function._cache.clear()
+        for (num1, num2), result in zip(pairs, body['results']):
+            self.assertEqual(self.calculate(operation='power', num1=num1, num2=num2), (200, result))
+
+    def test_bad_batches(self):
+        cases = (
+            ({'pairs': [[1, 'x']]}, 'Error: Operands must be numbers'),
+            ({'pairs': [[1]]}, 'Error: Operands must be numbers'),
+            ({'num1': [1, 2], 'num2': [1]}, 'Error: num1 and num2 must be the same length'),
+            ({'pairs': []}, f'Error: A batch holds between 1 and {lamdba_function.MAX_BATCH_SIZE} calculations'),
+            ({'pairs': [[1, 2]], 'operation': 'modulo'}, 'Error: Invalid operation'),
+            ({'pairs': [[1, 2]], 'operation': ['add', 'add']},
+             'Error: operation must be one name or a list with one per calculation'),
+        )
+        for fields, error in cases:
+            self.assertEqual(self.calculate(**fields), (400, error))
+
+
+class BatchWriteTest(CalculatorTestCase):
+    """Batch results are written with metered BatchWriteItem calls, retrying what is left"""
+
+    PAIRS = [[i, 1] for i in range(60)]
+
+    def stored_all(self):
+        return self.stored() == sorted(str(float(i + 1)) for i in range(60))
+
+    def test_results_are_written_in_chunks(self):
+        with mock.patch.object(aws_clients, 'batch_write_item', wraps=aws_clients.batch_write_item) as write:
+            self.assertEqual(self.calculate(operation='add', pairs=self.PAIRS)[0], 200)
+        self.assertEqual([len(call.kwargs['RequestItems']['PowerOfMathDatabase']) for call in write.call_args_list],
+                         [25, 25, 10])
+        self.assertTrue(self.stored_all())
+
+    def test_unprocessed_writes_are_retried(self):
+        self.db.unprocessed_rate = 0.5
+        with mock.patch('time.sleep') as sleep:
+            self.assertEqual(self.calculate(operation='add', pairs=self.PAIRS)[0], 200)
+        self.assertTrue(sleep.called)
+        self.assertTrue(self.stored_all())
+
+    def test_unwritten_results_are_not_cached(self):
+        self.db.unprocessed_rate = 1
+        with mock.patch('time.sleep'):
+            status, body = self.calculate(operation='add', pairs=self.PAIRS)
+        self.assertEqual((status, body['results'][0]), (200, 'Your result is 1.0'))
+        self.assertEqual((self.stored(), len(lamdba_function._cache)), ([], 0))
+        self.db.unprocessed_rate = 0
+        self.calculate(operation='add', pairs=self.PAIRS)
+        self.assertTrue(self.stored_all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from support import MemoryTestCase
+
+import campaign_progress_lambda
+import session_tokens
+
+
+class CampaignAdvanceTest(MemoryTestCase):
+    """Progress only ever moves one level up, in a single conditional write"""
+
+    def setUp(self):
+        super().setUp()
+        self.users = self.table('ArcadeUsers')
+        self.users.put_item(Item={'username': 'alice', 'password': 'x', 'campaign_progress': 0})
+
+    def advance(self, level, **fields):
+        return self.call(campaign_progress_lambda.lambda_handler,
+                         dict(fields, action='update_progress', username='alice', level=level))
+
+    def progress(self):
+        return int(self.users.get_item(Key={'username': 'alice'})['Item']['campaign_progress'])
+
+    def test_advances_one_level_at_a_time(self):
+        for level in (1, 2, 3):
+            status, body = self.advance(level)
+            self.assertEqual(status, 200)
+            self.assertEqual(body['campaign_progress'], level)
+        self.assertEqual(self.progress(), 3)
+
+    def test_cannot_skip_levels(self):
+        status, body = self.advance(2)
+        self.assertEqual(status, 400)
+        self.assertEqual(body['current_progress'], 0)
+        self.assertEqual(self.progress(), 0)
+
+    def test_repeat_and_regress_leave_progress_unchanged(self):
+        self.advance(1)
+        self.advance(2)
+        for level in (2, 1):
+            status, body = self.advance(level)
+            self.assertEqual(status, 200)
+            self.assertEqual(body['message'], 'Progress unchanged')
+        self.assertEqual(self.progress(), 2)
+
+    def test_user_without_progress_starts_at_level_one(self):
+        self.users.put_item(Item={'username': 'bob', 'password': 'x'})
+        status, body = self.call(campaign_progress_lambda.lambda_handler,
+                                 {'action': 'update_progress', 'username': 'bob', 'level': 1})
+        self.assertEqual((status, body['campaign_progress']), (200, 1))
+
+    def test_unknown_user_is_not_created(self):
+        status, _ = self.call(campaign_progress_lambda.lambda_handler,
+                              {'action': 'update_progress', 'username': 'ghost', 'level': 1})
+        self.assertEqual(status, 404)
+        self.assertNotIn('Item', self.users.get_item(Key={'username': 'ghost'}))
+
+    def test_token_identifies_the_player_and_is_refreshed(self):
+        token = session_tokens.issue('alice', 0)
+        status, body = self.call(campaign_progress_lambda.lambda_handler,
+                                 {'action': 'update_progress', 'token': token, 'level': 1})
+        self.assertEqual(status, 200)
+        self.assertEqual(session_tokens.verify(body['token'])['cp'], 1)
+
+    def test_token_for_another_player_is_rejected(self):
+        token = session_tokens.issue('mallory', 0)
+        status, _ = self.advance(1, token=token)
+        self.assertEqual(status, 401)
+        self.assertEqual(self.progress(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
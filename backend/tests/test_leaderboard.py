@@ -0,0 +1,101 @@
+import unittest
+
+from support import MemoryTestCase
+
+import leaderboard
+import paging
+import snake_score_lambda
+
+
+class LeaderboardInputTest(MemoryTestCase):
+    """Malformed scores and cursors are rejected with 400, never 500"""
+
+    def get(self, **fields):
+        return self.call(snake_score_lambda.lambda_handler, dict(fields, action='get_leaderboard'))
+
+    def test_score_must_be_an_integer(self):
+        for mode in ('rank', 'around'):
+            for score in ('abc', [1], {'a': 1}, 10 ** 40):
+                status, body = self.get(mode=mode, score=score)
+                self.assertEqual((status, body['error']), (400, 'Score must be an integer'))
+        self.assertEqual(self.get(mode='rank', score='12')[0], 200)
+
+    def forged(self, key, rank=11):
+        board = leaderboard.board_keys()[0]
+        return paging.encode_token({'boards': {board: key}, '_rank': rank})
+
+    def test_cursor_start_keys_are_checked(self):
+        board = leaderboard.board_keys()[0]
+        good = {'board': board, 'score': 5, 'player_id': 'ann', 'timestamp': 1000}
+        for key in ({'anything': 'at all'},
+                    dict(good, board=leaderboard.board_keys()[1]),
+                    dict(good, score='5'),
+                    dict(good, timestamp=True),
+                    dict(good, player_id=7),
+                    dict(good, extra=1),
+                    [good]):
+            status, body = self.get(cursor=self.forged(key))
+            self.assertEqual((status, body['error']), (400, 'Invalid cursor'))
+        self.assertEqual(self.get(cursor=self.forged(good, rank=0))[0], 400)
+        self.assertEqual(self.get(cursor=self.forged(good))[0], 200)
+        self.assertEqual(self.get(cursor=self.forged(None))[0], 200)
+
+
+class RankedLeaderboardTest(MemoryTestCase):
+    """Ranks, pages and neighbourhoods agree with a plain sort of every saved score"""
+
+    # Ties, and scores on each side of the fine (100) and coarse (10000) counter boundaries
+    SCORES = [0, 0, 1, 7, 99, 100, 100, 101, 199, 250, 9999, 10000, 10000, 10001,
+              123456, 999999, 99999999] + list(range(500, 2500, 100))
+
+    def setUp(self):
+        super().setUp()
+        status, _ = self.call(snake_score_lambda.lambda_handler, {
+            'action': 'save_scores',
+            'scores': [{'player_id': f'p{i}', 'score': score} for i, score in enumerate(self.SCORES)]
+        })
+        self.assertEqual(status, 200)
+
+    def get(self, **fields):
+        status, body = self.call(snake_score_lambda.lambda_handler, dict(fields, action='get_leaderboard'))
+        self.assertEqual(status, 200, body)
+        return body
+
+    def test_rank_counts_every_higher_score(self):
+        for score in (-1, 0, 1, 50, 99, 100, 101, 150, 9999, 10000, 10001, 99999999, 10 ** 20):
+            expected = 1 + sum(saved > score for saved in self.SCORES)
+            self.assertEqual(self.get(mode='rank', score=score)['rank'], expected, score)
+
+    def test_player_rank_uses_their_best(self):
+        body = self.get(mode='rank', player_id='p5')
+        self.assertEqual((body['score'], body['rank']), (100, 1 + sum(saved > 100 for saved in self.SCORES)))
+
+    def test_pages_walk_every_score_once_in_order(self):
+        for limit in (1, 3, 10, 100):
+            scores, ranks, cursor = [], [], None
+            for _ in range(len(self.SCORES) + 1):
+                body = self.get(limit=limit, cursor=cursor) if cursor else self.get(limit=limit)
+                self.assertLessEqual(len(body['entries']), limit)
+                scores += [entry['score'] for entry in body['entries']]
+                ranks += [entry['rank'] for entry in body['entries']]
+                cursor = body['next_cursor']
+                if not cursor:
+                    break
+            self.assertIsNone(cursor)
+            self.assertEqual(scores, sorted(self.SCORES, reverse=True), limit)
+            self.assertEqual(ranks, list(range(1, len(self.SCORES) + 1)), limit)
+
+    def test_around_lists_the_neighbouring_scores(self):
+        for score, radius in ((100, 2), (0, 3), (10000, 1), (99999999, 4), (5000, 5)):
+            body = self.get(mode='around', score=score, radius=radius)
+            above = sorted(saved for saved in self.SCORES if saved > score)[:radius][::-1]
+            below = sorted((saved for saved in self.SCORES if saved <= score), reverse=True)[:radius + 1]
+            self.assertEqual(body['rank'], 1 + sum(saved > score for saved in self.SCORES))
+            self.assertEqual([entry['score'] for entry in body['entries']], above + below, score)
+            first_rank = body['rank'] - len(above)
+            self.assertEqual([entry['rank'] for entry in body['entries']],
+                             list(range(first_rank, first_rank + len(above) + len(below))))
+
+
+if __name__ == '__main__':
+    unittest.main()
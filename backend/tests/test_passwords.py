@@ -0,0 +1,69 @@
+import unittest
+
+from support import MemoryTestCase
+
+import auth_lambda
+import passwords
+
+
+class PasswordHashTest(unittest.TestCase):
+    """Salted scrypt hashes, and upgrades of plaintext and cheaper ones"""
+
+    def test_hash_verifies_only_its_password(self):
+        stored = passwords.hash_password('hunter2')
+        scheme, n, r, p, salt, key = stored.split('$')
+        self.assertEqual((scheme, int(n), int(r), int(p)), ('scrypt', passwords.cost(), 8, 1))
+        self.assertEqual(passwords.verify('hunter2', stored), (True, False))
+        self.assertEqual(passwords.verify('hunter3', stored), (False, False))
+
+    def test_hashes_are_salted(self):
+        self.assertNotEqual(passwords.hash_password('hunter2'), passwords.hash_password('hunter2'))
+
+    def test_cheaper_hash_needs_rehash(self):
+        stored = passwords.hash_password('hunter2', n=passwords.cost() // 2)
+        self.assertEqual(passwords.verify('hunter2', stored), (True, True))
+        self.assertEqual(passwords.verify('wrong', stored), (False, False))
+
+    def test_plaintext_is_accepted_and_needs_rehash(self):
+        self.assertEqual(passwords.verify('hunter2', 'hunter2'), (True, True))
+        self.assertEqual(passwords.verify('hunter3', 'hunter2'), (False, False))
+
+    def test_malformed_hash_never_matches(self):
+        for stored in ('scrypt$', 'scrypt$x$8$1$AAAA$AAAA', 'scrypt$1024$8$1$AAAA'):
+            self.assertEqual(passwords.verify('scrypt$', stored), (False, False))
+
+    def test_dummy_hash_is_made_once(self):
+        self.assertIs(passwords.dummy_hash(), passwords.dummy_hash())
+        self.assertEqual(passwords.verify('', passwords.dummy_hash()), (False, False))
+
+    def test_calibration_stays_in_bounds(self):
+        self.assertEqual(passwords.calibrate(budget=0), passwords.MIN_COST)
+        self.assertEqual(passwords.calibrate(budget=1000, memory_mb=10 ** 6), passwords.MAX_COST)
+        cost = passwords.calibrate(budget=1000, memory_mb=64)
+        self.assertLessEqual(128 * passwords.SCRYPT_R * cost, 64 * 1024 * 1024 // 4)
+
+
+class LoginRehashTest(MemoryTestCase):
+    """Logging in replaces a plaintext password with a hash"""
+
+    def login(self, password):
+        return self.call(auth_lambda.lambda_handler, {'action': 'login', 'username': 'ann', 'password': password})
+
+    def test_plaintext_is_upgraded_on_login(self):
+        users = self.table('ArcadeUsers')
+        users.put_item(Item={'username': 'ann', 'password': 'hunter2'})
+        self.assertEqual(self.login('hunter3')[0], 401)
+        self.assertEqual(users.get_item(Key={'username': 'ann'})['Item']['password'], 'hunter2')
+        self.assertEqual(self.login('hunter2')[0], 200)
+        stored = users.get_item(Key={'username': 'ann'})['Item']['password']
+        self.assertTrue(stored.startswith('scrypt$'))
+        self.assertEqual(passwords.verify('hunter2', stored), (True, False))
+        self.assertEqual(self.login('hunter2')[0], 200)
+
+    def test_unknown_user_is_rejected_like_a_wrong_password(self):
+        status, body = self.login('hunter2')
+        self.assertEqual((status, body['error']), (401, 'Invalid username or password'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from support import MemoryTestCase
+
+import period_leaderboards
+import snake_score_lambda
+
+
+def at(day):
+    """time.time() at noon UTC on a YYYY-MM-DD day"""
+    return datetime.strptime(day, '%Y-%m-%d').replace(hour=12, tzinfo=timezone.utc).timestamp()
+
+
+class PeriodBoardTest(MemoryTestCase):
+    """Daily and weekly boards keep each window's best TOP_K scores"""
+
+    def save(self, day, scores, player='ann'):
+        with mock.patch('time.time', return_value=at(day)):
+            status, _ = self.call(snake_score_lambda.lambda_handler, {
+                'action': 'save_scores', 'scores': [{'player_id': player, 'score': s} for s in scores]
+            })
+        self.assertEqual(status, 200)
+
+    def board(self, period, date=None):
+        fields = {'action': 'get_leaderboard', 'period': period}
+        if date:
+            fields['date'] = date
+        status, body = self.call(snake_score_lambda.lambda_handler, fields)
+        self.assertEqual(status, 200, body)
+        return body
+
+    def scores(self, body):
+        return [entry['score'] for entry in body['entries']]
+
+    def test_daily_board_keeps_the_top_scores(self):
+        # 2024-03-04 is a Monday; the 6th and 7th are in the same ISO week
+        self.save('2024-03-06', range(1, 16))
+        body = self.board('daily', '2024-03-06')
+        self.assertEqual(body['window'], 20240306)
+        self.assertEqual(self.scores(body), list(range(15, 5, -1)))
+        self.assertEqual([entry['rank'] for entry in body['entries']], list(range(1, 11)))
+        self.assertEqual({entry['player_id'] for entry in body['entries']}, {'ann'})
+
+    def test_windows_are_separate(self):
+        self.save('2024-03-06', [10, 20])
+        self.save('2024-03-07', [30])
+        self.save('2024-03-11', [40])
+        self.assertEqual(self.scores(self.board('daily', '2024-03-06')), [20, 10])
+        self.assertEqual(self.scores(self.board('daily', '2024-03-07')), [30])
+        self.assertEqual(self.scores(self.board('weekly', '2024-03-04')), [30, 20, 10])
+        self.assertEqual(self.board('weekly', '2024-03-10')['window'], 202410)
+        self.assertEqual(self.scores(self.board('weekly', '2024-03-11')), [40])
+        self.assertEqual(self.board('daily', '2024-03-05')['entries'], [])
+
+    def test_default_date_is_today(self):
+        self.save(datetime.now(timezone.utc).strftime('%Y-%m-%d'), [5])
+        self.assertEqual(self.scores(self.board('daily')), [5])
+
+    def test_scores_below_a_full_board_skip_the_read(self):
+        self.save('2024-03-06', range(100, 110))
+        with mock.patch.object(period_leaderboards, '_record_in_window',
+                               wraps=period_leaderboards._record_in_window) as record:
+            self.save('2024-03-06', [50, 100])
+            record.assert_not_called()
+            self.save('2024-03-06', [105])
+            self.assertEqual(record.call_count, 2)
+        self.assertEqual(self.scores(self.board('daily', '2024-03-06')),
+                         [109, 108, 107, 106, 105, 105, 104, 103, 102, 101])
+
+    def test_bad_requests(self):
+        cases = (
+            ({'period': 'daily', 'date': '06/03/2024'}, 'Invalid date. Use YYYY-MM-DD'),
+            ({'period': 'daily', 'date': 20240306}, 'Invalid date. Use YYYY-MM-DD'),
+            ({'period': 'monthly'}, 'Invalid period. Use "all", "daily" or "weekly"'),
+            ({'period': 'weekly', 'mode': 'rank', 'score': 5}, 'Daily and weekly boards only support mode "top"'),
+        )
+        for fields, error in cases:
+            status, body = self.call(snake_score_lambda.lambda_handler, dict(fields, action='get_leaderboard'))
+            self.assertEqual((status, body['error']), (400, error))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+import unittest
+
+from support import MemoryTestCase
+
+import pong_score_lambda
+import score_export
+import score_service
+import snake_score_lambda
+
+
+class ExportResumeTest(MemoryTestCase):
+    """Following resume tokens exports every saved row exactly once"""
+
+    SCORES = 23
+
+    def setUp(self):
+        super().setUp()
+        status, _ = self.call(snake_score_lambda.lambda_handler, {
+            'action': 'save_scores',
+            'scores': [{'player_id': f'p{i % 4}', 'score': i} for i in range(self.SCORES)]
+        })
+        self.assertEqual(status, 200)
+
+    def export(self, **fields):
+        status, body = self.call(snake_score_lambda.lambda_handler, dict(fields, action='export_scores'))
+        self.assertEqual(status, 200, body)
+        return body
+
+    def chunks(self, **fields):
+        """Every chunk of one export, following its resume tokens"""
+        chunks = [self.export(**fields)]
+        while chunks[-1]['resume_token']:
+            self.assertLessEqual(len(chunks), self.SCORES)
+            fields['resume_token'] = chunks[-1]['resume_token']
+            chunks.append(self.export(**fields))
+        return chunks
+
+    def test_ndjson_chunks(self):
+        chunks = self.chunks(limit=5)
+        self.assertEqual([chunk['rows'] for chunk in chunks], [5, 5, 5, 5, 3])
+        rows = [json.loads(line) for chunk in chunks for line in chunk['data'].splitlines()]
+        self.assertEqual(sorted(row['score'] for row in rows), list(range(self.SCORES)))
+        self.assertEqual(len({(row['player_id'], row['timestamp']) for row in rows}), self.SCORES)
+        self.assertTrue(all('board' not in row for row in rows))
+
+    def test_csv_header_only_in_first_chunk(self):
+        chunks = self.chunks(format='csv', limit=10)
+        header = ','.join(score_export.columns_for(score_service.GAMES['snake']))
+        lines = [chunk['data'].splitlines() for chunk in chunks]
+        self.assertEqual(lines[0][0], header)
+        self.assertTrue(all(header not in chunk for chunk in lines[1:]))
+        rows = list(csv.DictReader(io.StringIO(''.join(chunk['data'] for chunk in chunks))))
+        self.assertEqual(sorted(int(row['score']) for row in rows), list(range(self.SCORES)))
+
+    def test_segments_split_the_rows(self):
+        rows = []
+        for segment in range(3):
+            for chunk in self.chunks(segment=segment, segments=3, limit=4):
+                rows += [json.loads(line) for line in chunk['data'].splitlines()]
+        self.assertEqual(sorted(row['score'] for row in rows), list(range(self.SCORES)))
+
+    def test_match_rows(self):
+        self.call(pong_score_lambda.lambda_handler, {'action': 'record_game', 'game_id': 'match-0001', 'result': 'WIN',
+                                                     'player_score': 11, 'ai_score': 3})
+        status, body = self.call(pong_score_lambda.lambda_handler, {'action': 'export_scores'})
+        self.assertEqual((status, body['rows'], body['resume_token']), (200, 1, None))
+        self.assertEqual(json.loads(body['data'])['result'], 'WIN')
+
+    def test_bad_requests(self):
+        cases = (
+            ({'resume_token': 'not a token'}, 'Invalid resume token'),
+            ({'resume_token': 'WzFd'}, 'Invalid resume token'),
+            ({'segment': 3, 'segments': 3}, 'segment must be between 0 and segments - 1'),
+            ({'segments': 'many'}, None),
+        )
+        for fields, error in cases:
+            status, body = self.call(snake_score_lambda.lambda_handler, dict(fields, action='export_scores'))
+            self.assertEqual(status, 400, fields)
+            if error:
+                self.assertEqual(body['error'], error)
+        status, body = self.call(snake_score_lambda.lambda_handler, {'action': 'export_scores', 'format': 'xml'})
+        self.assertEqual(status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
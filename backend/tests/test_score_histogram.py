@@ -0,0 +1,95 @@
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from support import MemoryTestCase
+
+import score_histogram
+import snake_score_lambda
+
+
+class DistributionRequestTest(MemoryTestCase):
+    """Only a malformed day is reported as one"""
+
+    def distribution(self, **fields):
+        return self.call(snake_score_lambda.lambda_handler, dict(fields, action='get_score_distribution'))
+
+    def test_malformed_day_is_rejected(self):
+        for day in ('yesterday', '2024-13-01', 20240101, ['2024-01-01']):
+            status, body = self.distribution(day=day)
+            self.assertEqual((status, body['error']), (400, 'Invalid day. Use YYYY-MM-DD'))
+
+    def test_day_is_echoed(self):
+        status, body = self.distribution(day='2024-01-01')
+        self.assertEqual((status, body['day'], body['count']), (200, '2024-01-01', 0))
+
+    def test_bad_stored_data_is_a_server_error(self):
+        self.table('SnakeScores').put_item(Item={'player_id': score_histogram.HISTOGRAM_PARTITION + '#0',
+                                                 'timestamp': score_histogram.ALL_TIME, 'score_count': 'many'})
+        status, body = self.distribution()
+        self.assertEqual(status, 500)
+        self.assertNotIn('Invalid day', body['error'])
+
+
+def at(day):
+    """time.time() at noon UTC on a YYYY-MM-DD day"""
+    return datetime.strptime(day, '%Y-%m-%d').replace(hour=12, tzinfo=timezone.utc).timestamp()
+
+
+class DistributionTest(MemoryTestCase):
+    """Saved scores are counted into the all-time and per-day histograms"""
+
+    DAYS = {
+        '2024-03-06': [0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233, 377, 610, 987],
+        '2024-03-07': [1000, 1000, 5000, 99999999],
+    }
+
+    def setUp(self):
+        super().setUp()
+        for day, scores in self.DAYS.items():
+            with mock.patch('time.time', return_value=at(day)):
+                status, _ = self.call(snake_score_lambda.lambda_handler, {
+                    'action': 'save_scores', 'scores': [{'player_id': 'ann', 'score': s} for s in scores]
+                })
+            self.assertEqual(status, 200)
+
+    def distribution(self, **fields):
+        status, body = self.call(snake_score_lambda.lambda_handler, dict(fields, action='get_score_distribution'))
+        self.assertEqual(status, 200, body)
+        return body
+
+    def assert_describes(self, body, scores):
+        self.assertEqual(body['count'], len(scores))
+        self.assertEqual(body['mean'], round(sum(scores) / len(scores), 2))
+        self.assertEqual(sum(bucket['count'] for bucket in body['buckets']), len(scores))
+        for bucket in body['buckets']:
+            inside = [s for s in scores if bucket['min'] <= s <= bucket['max']]
+            self.assertEqual(bucket['count'], len(inside), bucket)
+        ordered = sorted(scores)
+        for p in score_histogram.PERCENTILES:
+            # The estimate lies in the bucket holding the true percentile score
+            true = ordered[max(0, -(-p * len(ordered) // 100) - 1)]
+            lower, upper = score_histogram.bucket_bounds(score_histogram.bucket_for(true))
+            self.assertTrue(lower - 0.01 <= body[f'p{p}'] <= upper + 0.01, (p, true, body[f'p{p}']))
+
+    def test_all_time(self):
+        self.assert_describes(self.distribution(), [s for scores in self.DAYS.values() for s in scores])
+
+    def test_each_day(self):
+        for day, scores in self.DAYS.items():
+            body = self.distribution(day=day)
+            self.assertEqual(body['day'], day)
+            self.assert_describes(body, scores)
+
+    def test_empty_day(self):
+        body = self.distribution(day='2024-03-08')
+        self.assertEqual((body['count'], body['mean'], body['buckets'], body['p50']), (0, 0, [], 0))
+
+    def test_buckets_cover_every_score_once(self):
+        for score in range(0, 5000):
+            lower, upper = score_histogram.bucket_bounds(score_histogram.bucket_for(score))
+            self.assertTrue(lower <= max(score, 0) < upper, score)
+
+
+if __name__ == '__main__':
+    unittest.main()
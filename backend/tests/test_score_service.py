@@ -0,0 +1,314 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import MemoryTestCase
+
+import auth_lambda
+import player_stats
+import score_index
+import score_service
+import session_tokens
+import pong_score_lambda
+import snake_score_lambda
+
+
+class TokenAttributionTest(MemoryTestCase):
+    """A score is only verified, and only credited to a player, by a session token"""
+
+    def saved_items(self):
+        return [item for item in self.table('SnakeScores').scan()['Items']
+                if not score_index.is_reserved_item(item)]
+
+    def test_token_sets_player_and_verified(self):
+        token = session_tokens.issue('alice')
+        status, _ = self.call(snake_score_lambda.lambda_handler,
+                              {'action': 'save_score', 'score': 10, 'token': token})
+        self.assertEqual(status, 200)
+        [item] = self.saved_items()
+        self.assertEqual(item['player_id'], 'alice')
+        self.assertTrue(item['verified'])
+
+    def test_token_overrides_claimed_player_id(self):
+        token = session_tokens.issue('alice')
+        self.call(snake_score_lambda.lambda_handler,
+                  {'action': 'save_score', 'score': 10, 'player_id': 'mallory', 'token': token})
+        [item] = self.saved_items()
+        self.assertEqual(item['player_id'], 'alice')
+
+    def test_body_cannot_claim_verification(self):
+        status, _ = self.call(snake_score_lambda.lambda_handler, {
+            'action': 'save_score', 'score': 10, 'player_id': 'mallory',
+            'verified_player': 'mallory', 'verified': True
+        })
+        self.assertEqual(status, 200)
+        [item] = self.saved_items()
+        self.assertEqual(item['player_id'], 'mallory')
+        self.assertNotIn('verified', item)
+
+    def test_batch_with_token_is_attributed(self):
+        token = session_tokens.issue('alice')
+        status, body = self.call(snake_score_lambda.lambda_handler, {
+            'action': 'save_scores', 'token': token,
+            'scores': [{'score': 1, 'player_id': 'mallory'}, {'score': 2}]
+        })
+        self.assertEqual(status, 200)
+        self.assertEqual([result['status'] for result in body['results']], ['saved', 'saved'])
+        items = self.saved_items()
+        self.assertEqual({item['player_id'] for item in items}, {'alice'})
+        self.assertTrue(all(item['verified'] for item in items))
+
+    def test_invalid_token_is_rejected(self):
+        status, _ = self.call(snake_score_lambda.lambda_handler,
+                              {'action': 'save_score', 'score': 10, 'token': 'forged.token'})
+        self.assertEqual(status, 401)
+        self.assertEqual(self.saved_items(), [])
+
+    def test_expired_token_is_rejected(self):
+        token = session_tokens.issue('alice', now=time.time() - session_tokens.SESSION_TOKEN_TTL - 1)
+        status, _ = self.call(snake_score_lambda.lambda_handler,
+                              {'action': 'save_score', 'score': 10, 'token': token})
+        self.assertEqual(status, 401)
+
+
+class HighScoreSeedingTest(MemoryTestCase):
+    """The high-score backfill seeds the record from scores saved before it existed"""
+
+    def setUp(self):
+        super().setUp()
+        # Scores saved before the high-score record existed
+        table = self.table('SnakeScores')
+        for index, (player_id, score) in enumerate([('ann', 50), ('bob', 900), ('cat', 300)]):
+            table.put_item(Item={'player_id': player_id, 'timestamp': 1000 + index,
+                                 'score': score, 'game_date': '2024-01-01 00:00:00 +0000'})
+
+    def high_score(self):
+        score_service._high_score_cache.clear()
+        status, body = self.call(snake_score_lambda.lambda_handler, {'action': 'get_high_score'})
+        self.assertEqual(status, 200)
+        return body['high_score'], body.get('player_id')
+
+    def test_reads_never_scan(self):
+        with mock.patch.object(self.table('SnakeScores').__class__, 'scan', side_effect=AssertionError('scan')):
+            self.assertEqual(self.high_score(), (0, None))
+            self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 100, 'player_id': 'dan'})
+            self.assertEqual(self.high_score(), (100, 'dan'))
+
+    def test_backfill_seeds_the_best_existing_score(self):
+        best = score_index.backfill(self.table('SnakeScores'))
+        self.assertEqual(best['player_id'], 'bob')
+        self.assertEqual(self.high_score(), (900, 'bob'))
+        self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 100, 'player_id': 'dan'})
+        self.assertEqual(self.high_score(), (900, 'bob'))
+
+    def test_backfill_keeps_a_better_record(self):
+        self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 1000, 'player_id': 'dan'})
+        score_index.backfill(self.table('SnakeScores'))
+        self.assertEqual(self.high_score(), (1000, 'dan'))
+
+    def test_update_high_score_reports_only_a_new_best(self):
+        table = self.table('SnakeScores')
+        self.assertTrue(score_index.update_high_score(table, 'dan', 100, 2000, ''))
+        self.assertTrue(score_index.update_high_score(table, 'eve', 950, 2001, ''))
+        self.assertFalse(score_index.update_high_score(table, 'fay', 900, 2002, ''))
+        self.assertFalse(score_index.update_high_score(table, 'gus', 950, 2003, ''))
+        self.assertEqual(score_index.read_high_score(table)['player_id'], 'eve')
+
+
+class SaveValidationTest(MemoryTestCase):
+    """Malformed player ids and out-of-range scores are rejected with 400"""
+
+    def save(self, **fields):
+        return self.call(snake_score_lambda.lambda_handler, dict(fields, action='save_score'))
+
+    def test_player_id_must_be_a_short_string(self):
+        for player_id in (5, ['ann'], {'id': 'ann'}, 'x' * 65):
+            status, body = self.save(score=10, player_id=player_id)
+            self.assertEqual((status, body['error']), (400, 'Invalid player_id'))
+        self.assertEqual(self.save(score=10, player_id='x' * 64)[0], 200)
+
+    def test_score_must_be_in_range(self):
+        for score in (-1, 2 ** 64, score_service.MAX_SCORE + 1, 'abc', [1], float('1e400')):
+            self.assertEqual(self.save(score=score, player_id='ann')[0], 400)
+        self.assertEqual(self.save(score=10, player_id='ann', snake_length=2 ** 64)[0], 400)
+        self.assertEqual(self.save(score=score_service.MAX_SCORE, player_id='ann')[0], 200)
+
+    def test_batch_marks_bad_records_invalid(self):
+        status, body = self.call(snake_score_lambda.lambda_handler, {
+            'action': 'save_scores',
+            'scores': [{'score': 1, 'player_id': 5}, {'score': 2 ** 64}, {'score': 3}]
+        })
+        self.assertEqual(status, 200)
+        self.assertEqual([result['status'] for result in body['results']], ['invalid', 'invalid', 'saved'])
+
+    def test_match_scores_must_be_in_range(self):
+        status, _ = self.call(pong_score_lambda.lambda_handler, {
+            'action': 'record_game', 'game_id': 'match-0001', 'player_score': 2 ** 64, 'ai_score': 0})
+        self.assertEqual(status, 400)
+
+
+class IndexUpdateTest(MemoryTestCase):
+    """Derived indexes follow saves, and failing to update them never fails a stored score"""
+
+    def saved_scores(self):
+        return [item['score'] for item in self.table('SnakeScores').scan()['Items']
+                if not score_index.is_reserved_item(item)]
+
+    def test_single_save_updates_every_index(self):
+        self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 40, 'player_id': 'ann'})
+        self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 70, 'player_id': 'ann'})
+        _, stats = self.call(snake_score_lambda.lambda_handler, {'action': 'get_player_stats', 'player_id': 'ann'})
+        self.assertEqual((stats['games_played'], stats['best']), (2, 70))
+        _, rank = self.call(snake_score_lambda.lambda_handler,
+                            {'action': 'get_leaderboard', 'mode': 'rank', 'score': 40})
+        self.assertEqual(rank['rank'], 2)
+        _, distribution = self.call(snake_score_lambda.lambda_handler, {'action': 'get_score_distribution'})
+        self.assertEqual(distribution['count'], 2)
+        _, daily = self.call(snake_score_lambda.lambda_handler, {'action': 'get_leaderboard', 'period': 'daily'})
+        self.assertEqual([entry['score'] for entry in daily['entries']], [70, 40])
+
+    def test_failed_index_update_still_saves(self):
+        with mock.patch.object(player_stats, 'record_games', side_effect=RuntimeError('throttled')):
+            status, _ = self.call(snake_score_lambda.lambda_handler,
+                                  {'action': 'save_score', 'score': 10, 'player_id': 'ann'})
+            self.assertEqual(status, 200)
+            status, body = self.call(snake_score_lambda.lambda_handler,
+                                     {'action': 'save_scores', 'scores': [{'score': 20, 'player_id': 'bob'}]})
+            self.assertEqual((status, body['results'][0]['status']), (200, 'saved'))
+        self.assertEqual(sorted(self.saved_scores()), [10, 20])
+        _, high_score = self.call(snake_score_lambda.lambda_handler, {'action': 'get_high_score'})
+        self.assertEqual(high_score['high_score'], 20)
+
+
+class HubSummaryTest(MemoryTestCase):
+    """Slow reads are reported unavailable without holding up later summaries"""
+
+    def setUp(self):
+        super().setUp()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 10, 'player_id': 'ann'})
+
+    def summary(self):
+        status, body = self.call(snake_score_lambda.lambda_handler,
+                                 {'action': 'get_hub_summary', 'player_id': 'ann'})
+        self.assertEqual(status, 200)
+        return body
+
+    def test_stuck_reads_do_not_starve_later_summaries(self):
+        def stuck(table, player_id):
+            self.release.wait(5)
+
+        with mock.patch.object(score_service, 'HUB_READ_TIMEOUT', 0.2), \
+                mock.patch.object(score_service.leaderboard, 'get_player_best', side_effect=stuck):
+            for _ in range(4):
+                body = self.summary()
+                self.assertIn('snake:personal_best', body['unavailable'])
+                self.assertEqual(body['high_scores']['snake']['high_score'], 10)
+                self.assertNotIn('snake:high_score', body['unavailable'])
+
+
+class ReservedPlayerIdTest(MemoryTestCase):
+    """Player ids that could name a bookkeeping item are refused everywhere"""
+
+    RESERVED = ('__high_score__', '__rank_top__#0', '__histogram__#0', 'anonymous#3', 'bob#1')
+
+    def test_save_rejects_reserved_ids(self):
+        for player_id in self.RESERVED:
+            status, body = self.call(snake_score_lambda.lambda_handler,
+                                     {'action': 'save_score', 'score': 10, 'player_id': player_id})
+            self.assertEqual((status, body['error']), (400, 'Invalid player_id'))
+        self.assertEqual(self.table('SnakeScores').scan()['Items'], [])
+
+    def test_rejected_ids_leave_reads_working(self):
+        self.call(snake_score_lambda.lambda_handler, {'action': 'save_score', 'score': 10, 'player_id': 'ann'})
+        for player_id in self.RESERVED:
+            self.call(snake_score_lambda.lambda_handler,
+                      {'action': 'save_score', 'score': 5, 'player_id': player_id})
+        status, body = self.call(snake_score_lambda.lambda_handler,
+                                 {'action': 'get_leaderboard', 'mode': 'rank', 'score': 5})
+        self.assertEqual((status, body['rank']), (200, 2))
+        status, body = self.call(snake_score_lambda.lambda_handler, {'action': 'get_score_distribution'})
+        self.assertEqual((status, body['count']), (200, 1))
+
+    def test_token_for_reserved_username_cannot_save(self):
+        token = session_tokens.issue('__high_score__')
+        status, _ = self.call(snake_score_lambda.lambda_handler,
+                              {'action': 'save_score', 'score': 10, 'token': token})
+        self.assertEqual(status, 400)
+
+    def test_reads_reject_reserved_ids(self):
+        for body in ({'action': 'get_player_stats', 'player_id': '__high_score__'},
+                     {'action': 'get_leaderboard', 'mode': 'rank', 'player_id': '__high_score__'},
+                     {'action': 'get_hub_summary', 'player_id': '__rank_top__#0'}):
+            self.assertEqual(self.call(snake_score_lambda.lambda_handler, body)[0], 400)
+
+    def test_register_rejects_reserved_usernames(self):
+        status, _ = self.call(auth_lambda.lambda_handler,
+                              {'action': 'register', 'username': '__high_score__', 'password': 'secret'})
+        self.assertEqual(status, 400)
+
+    def test_summary_update_gives_up_instead_of_spinning(self):
+        # A summary that neither update condition can match
+        table = self.table('SnakeScores')
+        table.put_item(Item=dict(player_stats.summary_key('ann'), games_played=1))
+        item = {'player_id': 'ann', 'timestamp': 1000, 'score': 10, 'game_date': ''}
+        with self.assertRaises(RuntimeError):
+            player_stats.record_games(table, [item])
+
+
+class RecordGameTest(MemoryTestCase):
+    """record_game is idempotent per game_id and never rewrites a finished match"""
+
+    GAME_ID = 'match-0001'
+
+    def record(self, result='IN_PROGRESS', player_score=1, ai_score=0, **fields):
+        body = dict(fields, action='record_game', game_id=self.GAME_ID, result=result,
+                    player_score=player_score, ai_score=ai_score)
+        return self.call(pong_score_lambda.lambda_handler, body)
+
+    def stored(self):
+        return self.table('PongScores').get_item(Key={'game_id': self.GAME_ID})['Item']
+
+    def test_retried_final_result_is_a_duplicate(self):
+        self.assertEqual(self.record('WIN', 11, 3)[0], 200)
+        status, body = self.record('WIN', 11, 3)
+        self.assertEqual(status, 200)
+        self.assertTrue(body['duplicate'])
+        self.assertEqual(len(self.table('PongScores').scan()['Items']), 1)
+
+    def test_different_final_result_is_rejected(self):
+        self.record('WIN', 11, 3)
+        self.assertEqual(self.record('LOSS', 3, 11)[0], 409)
+        self.assertEqual(self.stored()['result'], 'WIN')
+
+    def test_in_progress_after_finish_is_rejected(self):
+        self.record('WIN', 11, 3, seq=5)
+        self.assertEqual(self.record('IN_PROGRESS', 12, 3, seq=6)[0], 409)
+        self.assertEqual(self.record('IN_PROGRESS', 12, 3)[0], 409)
+        self.assertEqual(self.stored()['player_score'], 11)
+
+    def test_stale_sequence_never_overwrites(self):
+        self.record(player_score=5, seq=5)
+        score_service._match_flushes.clear()  # as if another container took the next update
+        status, body = self.record(player_score=3, seq=3)
+        self.assertEqual(status, 200)
+        self.assertTrue(body['stale'])
+        self.assertEqual(self.stored()['player_score'], 5)
+
+    def test_coalesced_state_is_flushed_after_the_window(self):
+        self.record(player_score=1, seq=1)
+        status, body = self.record(player_score=2, seq=2)
+        self.assertTrue(body['coalesced'])
+        self.assertEqual(self.stored()['player_score'], 1)
+
+        score_service._match_flushes[('pong', self.GAME_ID)]['at'] -= score_service.MATCH_FLUSH_WINDOW
+        self.call(pong_score_lambda.lambda_handler, {'action': 'record_game', 'game_id': 'match-0002',
+                                                     'player_score': 0, 'ai_score': 0})
+        self.assertEqual(self.stored()['player_score'], 2)
+        self.assertEqual(self.stored()['seq'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()